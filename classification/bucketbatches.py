@@ -0,0 +1,30 @@
+import numpy as np
+
+def length_buckets(lengths, batch_size, rng):
+    """
+    The case indices in batches of cases with similar length: the cases are sorted by
+    length (random order among equal lengths) and cut into batches, the batches are shuffled.
+    """
+    lengths = np.asarray(lengths)
+    shuffled = rng.permutation(len(lengths))
+    by_length = shuffled[np.argsort(lengths[shuffled], kind='mergesort')]
+    batches = [by_length[i:i + batch_size] for i in range(0, len(by_length), batch_size)]
+    return [batches[i] for i in rng.permutation(len(batches))]
+
+def bucketed_batch_generator(lengths, batch_size, make_batch, seed=23):
+    """
+    Endless generator for Keras fit_generator (samples_per_epoch = len(lengths)): each epoch
+    yields make_batch(indices) for new length buckets. make_batch pads only to the longest
+    case of the batch, so short cases do not spend timesteps on padding.
+    """
+    rng = np.random.RandomState(seed)
+    while True:
+        for indices in length_buckets(lengths, batch_size, rng):
+            yield make_batch(indices)
+
+def trailing_lengths(codes):
+    """ number of codes of each row of a 'pre' padded id matrix (padding id 0) """
+    codes = np.asarray(codes)
+    nonzero = codes != 0
+    first = np.where(nonzero.any(axis=1), nonzero.argmax(axis=1), codes.shape[1])
+    return codes.shape[1] - first
@@ -0,0 +1,20 @@
+import keras
+from instrumentation import begin_span, end_span
+
+class EpochSpans(keras.callbacks.Callback):
+    """ records one span per training epoch in the trace of the run, with the samples per second """
+    def __init__(self, num_samples):
+        self.num_samples = num_samples
+        self.span = None
+
+    def on_epoch_begin(self, epoch, logs={}):
+        self.span = begin_span('epoch-' + str(epoch), samples=self.num_samples)
+
+    def on_epoch_end(self, epoch, logs={}):
+        span = self.span
+        end_span()
+        if span.wall > 0:
+            span.set('samples-per-second', self.num_samples / span.wall)
+        for key in ['loss', 'val_loss']:
+            if logs.get(key) != None:
+                span.set(key, float(logs.get(key)))
@@ -3,55 +3,21 @@ mpl.use('Agg')
 from mpl_toolkits.axes_grid1 import host_subplot
 import matplotlib.pyplot as plt
 import numpy as np
+from classification.evaluationengine import Evaluation
+from instrumentation import span
 
-def adjust_score(model, scaler, X_test, classes, targets_test, excludes_test):
-    if scaler != None:
-        X_test = scaler.transform(X_test)
-    # adapt here if the model has multiple outputs. Append '[0]'
-    probabs = model.predict(X_test, verbose=0)
-   
-    score = 0.0
-    for i in range(0, probabs.shape[0]):
-        classes_sorted = probabs[i].argsort()[::-1]
-        result = None
-        best = 0
-        while result == None:
-            temp_result = classes[classes_sorted[best]]
-            if temp_result in excludes_test[i]:
-                best += 1
-            else:
-                result = temp_result
-        if result == targets_test[i]:
-            score += 1.0
-    
-    score /= len(targets_test)
+def evaluate(model, scaler, X_test, classes, targets_test, excludes_test):
+    """ predicts the test set once. Pass the result to adjust_score and the plots. """
+    with span('evaluate', samples=len(targets_test)):
+        return Evaluation.predict(model, scaler, X_test, classes, targets_test, excludes_test)
+
+def adjust_score(evaluation):
+    score = evaluation.score()
     print("New adjusted score " + str(score))
     return score
 
-def plot_oracle(config, task, model, scaler, X_test, classes, targets_test, excludes_test):   
-    oracle = [0] * len(classes)
-    if scaler != None:
-        X_test = scaler.transform(X_test)
-    # adapt here if the model has multiple outputs. Append '[0]'
-    probabs = model.predict(X_test, verbose=0)
-    for i in range(0, probabs.shape[0]):
-        classes_sorted = probabs[i].argsort()[::-1]
-        adjusted_classes_sorted = []
-        for j in range(0, min(20, classes_sorted.shape[0])):
-            classname = classes[classes_sorted[j]]
-            if classname not in excludes_test[i]:
-                adjusted_classes_sorted.append(classname)
-        best = 0
-        while best < len(adjusted_classes_sorted):
-            if adjusted_classes_sorted[best] == targets_test[i]:
-                oracle[best] += 1
-                break
-            else:
-                best += 1
-        
-    
-    oracle = [sum(oracle[0:i]) for i in range(1, len(oracle)+1)]
-    oracle = [x/len(targets_test) for x in oracle]
+def plot_oracle(config, task, evaluation):   
+    oracle = evaluation.oracle(20)
     
     host = host_subplot(111)
     host.set_xlabel('Ranks')
@@ -65,37 +31,8 @@ def plot_oracle(config, task, model, scaler, X_test, classes, targets_test, excl
     plt.close()
     return oracle
 
-def plot_classification_confidence_histograms(config, task, model, scaler, X_test, classes, targets_test, excludes_test):    
-    best_confidence_hist = [0 for i in range(101)]
-    true_confidence_hist = [0 for i in range(101)]
-    if scaler != None:
-        X_test = scaler.transform(X_test)
-    probabs = model.predict(X_test, verbose=0)
-    for i in range(0, probabs.shape[0]):
-        classes_sorted = probabs[i].argsort()[::-1]
-        adjusted_classes_and_probabs_sorted = []
-        for j in range(0,classes_sorted.shape[0]):
-            classname = classes[classes_sorted[j]]
-            probab = probabs[i][classes_sorted[j]]
-            if classname not in excludes_test[i]:
-                adjusted_classes_and_probabs_sorted.append((classname, probab))
-        probab = adjusted_classes_and_probabs_sorted[0][1]
-        
-        try:
-            best_confidence_hist[int(round(100*probab))] += 1
-        except ValueError:
-            return
-        best = 0
-        while best < len(adjusted_classes_and_probabs_sorted):
-            if adjusted_classes_and_probabs_sorted[best][0] == targets_test[i]:
-                probab = adjusted_classes_and_probabs_sorted[best][1]
-                try:
-                    true_confidence_hist[int(round(100*probab))] += 1
-                except ValueError:
-                    return
-                break
-            else:
-                best += 1
+def plot_classification_confidence_histograms(config, task, evaluation):    
+    best_confidence_hist, true_confidence_hist = evaluation.confidence_histograms()
     
     host = host_subplot(111)
     host.set_xlabel('Confidence')
@@ -116,6 +53,7 @@ def plot_classification_confidence_histograms(config, task, model, scaler, X_tes
     
     plt.title('Best Confidence Hist')
     plt.savefig(config['base_folder'] + 'classification/best_confidence_hist_' + task + '.png')
+    plt.close()
     print("Saving true confidence histogram to " + config['base_folder'] + 'classification/best_confidence_hist_' + task + '.png')   
     
 def plot_histogram(config, data, name, bins=100):
@@ -0,0 +1,125 @@
+import numpy as np
+import scipy.sparse
+
+class Evaluation:
+    """
+    Evaluation of a classifier on a test set. The test set is predicted once,
+    the excluded codes of each instance are a sparse boolean mask over the class
+    indices and excluded classes never count as a prediction.
+    All measures are computed block wise on the probability matrix.
+    """
+    def __init__(self, probabs, classes, targets_test, excludes_test, block_size=4096):
+        self.probabs = np.asarray(probabs)
+        self.classes = classes
+        self.block_size = block_size
+        class_index = {c : i for i, c in enumerate(classes)}
+        # -1 for targets that are not a class of the classifier
+        self.target_ids = np.array([class_index.get(target, -1) for target in targets_test], dtype=np.int64)
+        self.exclude_mask = exclude_mask(excludes_test, class_index)
+        
+    @classmethod
+    def predict(cls, model, scaler, X_test, classes, targets_test, excludes_test):
+        if scaler != None:
+            X_test = scaler.transform(X_test)
+        # adapt here if the model has multiple outputs. Append '[0]'
+        return cls(model.predict(X_test, verbose=0), classes, targets_test, excludes_test)
+    
+    def __len__(self):
+        return len(self.target_ids)
+    
+    def blocks(self):
+        """ (rows, probabilities with -inf for the excluded classes, target ids) per block of instances """
+        for start in range(0, len(self), self.block_size):
+            rows = slice(start, min(start + self.block_size, len(self)))
+            masked = np.array(self.probabs[rows], dtype=np.float64)
+            masked[self.exclude_mask[rows].toarray()] = -np.inf
+            yield rows, masked, self.target_ids[rows]
+            
+    def best(self):
+        """ class index and probability of the most probable non excluded class per instance """
+        ids = np.empty(len(self), dtype=np.int64)
+        probabs = np.empty(len(self), dtype=np.float64)
+        for rows, masked, _ in self.blocks():
+            ids[rows] = masked.argmax(axis=1)
+            probabs[rows] = masked[np.arange(masked.shape[0]), ids[rows]]
+        return ids, probabs
+    
+    def score(self):
+        """ accuracy of the most probable non excluded class """
+        ids, _ = self.best()
+        return float(np.sum(ids == self.target_ids)) / len(self)
+    
+    def target_probabs(self):
+        """ probability of the target per instance, NaN if the target is excluded or unknown """
+        probabs = np.full(len(self), np.nan)
+        for rows, masked, target_ids in self.blocks():
+            known = np.flatnonzero(target_ids >= 0)
+            values = masked[known, target_ids[known]]
+            probabs[rows][known[np.isfinite(values)]] = values[np.isfinite(values)]
+        return probabs
+    
+    def ranks(self, max_rank=20):
+        """
+        Rank of the target among the non excluded classes of the max_rank most probable
+        classes (excluded classes included), -1 if the target is not among them.
+        """
+        ranks = np.full(len(self), -1, dtype=np.int64)
+        k = min(max_rank, len(self.classes))
+        for rows, masked, target_ids in self.blocks():
+            n = masked.shape[0]
+            top = np.argpartition(-self.probabs[rows], k - 1, axis=1)[:, :k]
+            order = np.argsort(-np.take_along_axis(self.probabs[rows], top, axis=1), axis=1, kind='stable')
+            top = np.take_along_axis(top, order, axis=1)
+            allowed = np.isfinite(np.take_along_axis(masked, top, axis=1))
+            # position of each class among the allowed ones
+            positions = np.cumsum(allowed, axis=1) - 1
+            hit = (top == target_ids[:, np.newaxis]) & allowed
+            found = hit.any(axis=1)
+            ranks[rows][found] = positions[np.arange(n)[found], hit[found].argmax(axis=1)]
+        return ranks
+    
+    def oracle(self, max_rank=20):
+        """ recognition rate for the first i ranks (cumulative), one value per class """
+        ranks = self.ranks(max_rank)
+        counts = np.bincount(ranks[ranks >= 0], minlength=len(self.classes))
+        return list(np.cumsum(counts) / len(self))
+    
+    def confidence_histograms(self):
+        """ histograms (101 bins of percent) of the best and of the target probability """
+        _, best_probabs = self.best()
+        target_probabs = self.target_probabs()
+        return percent_histogram(best_probabs), percent_histogram(target_probabs[~np.isnan(target_probabs)])
+    
+    
+def propose(probabs, classes, excludes, k=5):
+    """ 
+    The k most probable classes per instance that are not excluded, 
+    a list of (class, probability) pairs per instance.
+    """
+    probabs = np.array(probabs, dtype=np.float64)
+    mask = exclude_mask(excludes, {c : i for i, c in enumerate(classes)})
+    probabs[mask.toarray()] = -np.inf
+    k = min(k, len(classes))
+    top = np.argpartition(-probabs, k - 1, axis=1)[:, :k]
+    top_probabs = np.take_along_axis(probabs, top, axis=1)
+    order = np.argsort(-top_probabs, axis=1, kind='stable')
+    top = np.take_along_axis(top, order, axis=1)
+    top_probabs = np.take_along_axis(top_probabs, order, axis=1)
+    return [[(classes[c], float(p)) for c, p in zip(row, row_probabs) if np.isfinite(p)] 
+            for row, row_probabs in zip(top.tolist(), top_probabs.tolist())]
+
+def exclude_mask(excludes_test, class_index):
+    rows = []
+    columns = []
+    for i, excludes in enumerate(excludes_test):
+        for exclude in excludes:
+            if exclude in class_index:
+                rows.append(i)
+                columns.append(class_index[exclude])
+    return scipy.sparse.csr_matrix((np.ones(len(rows), dtype=bool), (rows, columns)), 
+                                   shape=(len(excludes_test), len(class_index)), dtype=bool)
+
+def percent_histogram(probabs):
+    probabs = np.asarray(probabs)
+    probabs = probabs[np.isfinite(probabs)]
+    return np.bincount(np.round(100 * probabs).astype(np.int64), minlength=101)
@@ -3,14 +3,17 @@ from sklearn.cross_validation import train_test_split
 
 from keras.models import Sequential
 from keras.layers import Dense, Dropout
-from keras.utils import np_utils
 from keras.callbacks import EarlyStopping
 from classification.LossHistoryVisualization import LossHistoryVisualisation
+from classification.epochspans import EpochSpans
+from instrumentation import span
 import json
+import numpy as np
 
 def train_and_evaluate_ffnn(config, X_train, X_test, y_train, y_test, output_dim, task):
-    y_train = np_utils.to_categorical(y_train, output_dim)
-    y_test = np_utils.to_categorical(y_test, output_dim)
+    # integer class ids as targets (sparse categorical cross-entropy), no one-hot matrix
+    y_train = sparse_targets(y_train)
+    y_test = sparse_targets(y_test)
     
     X_train, X_validation, y_train, y_validation = train_test_split(X_train, y_train, test_size=0.15, random_state=23)
     scaler = preprocessing.MaxAbsScaler().fit(X_train)
@@ -25,7 +28,7 @@ def train_and_evaluate_ffnn(config, X_train, X_test, y_train, y_test, output_dim
     model.add(Dense(output_dim, activation='softmax'))
     
     # sgd = SGD(lr=0.01, decay=1e-6, momentum=0.8, nesterov=True)
-    model.compile(loss='categorical_crossentropy',
+    model.compile(loss='sparse_categorical_crossentropy',
                   optimizer='adadelta',
                   metrics=['accuracy'])
     
@@ -35,12 +38,13 @@ def train_and_evaluate_ffnn(config, X_train, X_test, y_train, y_test, output_dim
     
     early_stopping = EarlyStopping(monitor='val_acc', patience=10)
     visualizer = LossHistoryVisualisation(config['base_folder'] + 'classification/epochs_' + task + '.png')
-    model.fit(X_train, y_train,
-              nb_epoch=100,
-              batch_size=128,
-              validation_data=(X_validation, y_validation),
-              verbose=2,
-              callbacks=[early_stopping, visualizer])
+    with span('train', samples=X_train.shape[0]):
+        model.fit(X_train, y_train,
+                  nb_epoch=100,
+                  batch_size=128,
+                  validation_data=(X_validation, y_validation),
+                  verbose=2,
+                  callbacks=[early_stopping, visualizer, EpochSpans(X_train.shape[0])])
     
     print("Prediction using FFNN..")
     score = model.evaluate(X_test, y_test, verbose=0)
@@ -49,3 +53,7 @@ def train_and_evaluate_ffnn(config, X_train, X_test, y_train, y_test, output_dim
     
     return [model, scaler, score[1]]
 
+
+def sparse_targets(y):
+    """ class ids as a column (the shape of the model output) for sparse_categorical_crossentropy """
+    return np.asarray(y, dtype=np.int32).reshape((-1, 1))
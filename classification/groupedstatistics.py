@@ -0,0 +1,79 @@
+import numpy as np
+
+class GroupedStatistics:
+    """
+    Statistics of values grouped by keys (e.g. the LOS per DRG). The keys are factorized
+    to group ids once and the values are sorted by group, so all statistics are computed
+    for all groups at once with bincount and cumulative sums instead of Python loops.
+    """
+    def __init__(self, keys, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.groups, group_ids = np.unique(np.asarray(keys), return_inverse=True)
+        group_ids = group_ids.reshape(-1)
+        self.counts = np.bincount(group_ids, minlength=len(self.groups))
+        self.sums = np.bincount(group_ids, weights=values, minlength=len(self.groups))
+        order = np.lexsort((values, group_ids))
+        self.sorted_values = values[order]
+        self.starts = np.zeros(len(self.groups), dtype=np.int64)
+        np.cumsum(self.counts[:-1], out=self.starts[1:])
+        self.values = values
+
+    def mean(self):
+        return self.sums / self.counts
+
+    def quantile(self, q):
+        """ q-quantile of each group, linear interpolation (as np.percentile) """
+        positions = self.starts + q * (self.counts - 1)
+        lower = np.floor(positions).astype(np.int64)
+        upper = np.ceil(positions).astype(np.int64)
+        fraction = positions - lower
+        return self.sorted_values[lower] * (1 - fraction) + self.sorted_values[upper] * fraction
+
+    def median(self):
+        return self.quantile(0.5)
+
+    def trimmed_mean(self, proportion=0.1):
+        """ mean without the proportion of smallest and largest values of each group (as scipy.stats.trim_mean) """
+        cut = np.floor(proportion * self.counts).astype(np.int64)
+        cumulative = np.concatenate([[0], np.cumsum(self.sorted_values)])
+        sums = cumulative[self.starts + self.counts - cut] - cumulative[self.starts + cut]
+        return sums / (self.counts - 2 * cut)
+
+    def statistic(self, name='mean', **params):
+        """ one of 'mean', 'median', 'trimmed_mean' (proportion) or 'quantile' (q) per group """
+        if name not in ['mean', 'median', 'trimmed_mean', 'quantile']:
+            raise ValueError('Unknown statistic ' + name)
+        return getattr(self, name)(**params)
+
+    def overall(self, name='mean', **params):
+        """ the statistic over all values, ignoring the groups """
+        return GroupedStatistics(np.zeros(len(self.values), dtype=np.int8), self.values).statistic(name, **params)[0]
+
+    def group_ids(self, keys):
+        """ group id of each key, -1 for keys that are not in the groups """
+        keys = np.asarray(keys)
+        if len(self.groups) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        ids = np.minimum(np.searchsorted(self.groups, keys), len(self.groups) - 1)
+        return np.where(self.groups[ids] == keys, ids, -1)
+
+    def predict(self, keys, name='mean', default=None, **params):
+        """ the statistic of the group of each key, default (the overall statistic) for unknown keys """
+        if default == None:
+            default = self.overall(name, **params)
+        ids = self.group_ids(keys)
+        statistics = np.append(self.statistic(name, **params), default)
+        # -1 picks the default at the end
+        return statistics[ids]
+
+
+def error_metrics(predictions, targets):
+    error = np.asarray(predictions, dtype=np.float64) - np.asarray(targets, dtype=np.float64)
+    return {'mse' : float(np.square(error).mean()),
+            'mae' : float(np.abs(error).mean()),
+            'mape' : float(np.abs(error / targets).mean())}
+
+def grouped_baseline(keys_train, y_train, keys_test, y_test, name='mean', **params):
+    """ predictions of the test targets by the statistic of their group in the training set and their error metrics """
+    predictions = GroupedStatistics(keys_train, y_train).predict(keys_test, name, **params)
+    return predictions, error_metrics(predictions, y_test)
@@ -0,0 +1,82 @@
+import numpy as np
+from multiprocessing import Pool
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import accuracy_score, f1_score
+
+from reader.sparsehierarchical.prefixfeatures import PrefixFeatureVocabulary
+
+def scan(reader):
+    """
+    One pass over the training set: the prefix features of all codes and the classes.
+    Both have to be known before the first partial_fit.
+    """
+    vocabulary = PrefixFeatureVocabulary()
+    classes = set()
+    for instance in reader.read_instances():
+        vocabulary.fit([instance.codes()])
+        classes.add(instance.gt)
+    return vocabulary, np.array(sorted(classes))
+
+def create_linear_model(loss='hinge', alpha=1e-5, seed=23):
+    # loss 'hinge' is a linear SVM, 'log' a logistic regression
+    return SGDClassifier(loss=loss, alpha=alpha, random_state=seed)
+
+def features_and_targets(batch, vocabulary):
+    return vocabulary.transform([instance.codes() for instance in batch], dtype=np.float64), np.array([instance.gt for instance in batch])
+
+def train_linear_model(model, reader, vocabulary, classes, batch_size=10000, epochs=3, cases=None, seed=23):
+    """
+    Trains the model with mini-batches of sparse prefix features streamed from the reader,
+    only one batch is in memory at a time. The instances of a batch are shuffled.
+    """
+    rng = np.random.RandomState(seed)
+    for epoch in range(epochs):
+        for batch in reader.read_batches(batch_size, cases):
+            X, y = features_and_targets(batch, vocabulary)
+            order = rng.permutation(len(y))
+            model.partial_fit(X[order], y[order], classes=classes)
+    return model
+
+def predict_linear_model(model, reader, vocabulary, batch_size=10000, cases=None):
+    """ targets and predictions of all instances """
+    targets = []
+    predictions = []
+    for batch in reader.read_batches(batch_size, cases):
+        X, y = features_and_targets(batch, vocabulary)
+        targets.append(y)
+        predictions.append(model.predict(X))
+    if len(targets) == 0:
+        return np.array([]), np.array([])
+    return np.concatenate(targets), np.concatenate(predictions)
+
+def evaluate_fold(task):
+    """ trains on all but one fold of the cases and scores on this fold, runs in a worker process """
+    reader, vocabulary, classes, fold, num_folds, options = task
+    model = create_linear_model(options['loss'], options['alpha'], options['seed'])
+    train_linear_model(model, reader, vocabulary, classes, options['batch_size'], options['epochs'],
+                       lambda i: i % num_folds != fold, options['seed'])
+    targets, predictions = predict_linear_model(model, reader, vocabulary, options['batch_size'],
+                                                lambda i: i % num_folds == fold)
+    return {'fold' : fold,
+            'accuracy' : float(accuracy_score(targets, predictions)),
+            'f1_macro' : float(f1_score(targets, predictions, average='macro'))}
+
+def cross_validate_linear_model(reader, num_folds=5, num_workers=1, loss='hinge', alpha=1e-5,
+                                batch_size=10000, epochs=3, seed=23):
+    """
+    Cross validation of a linear model (SGD) over the hierarchical prefix features,
+    memory is bounded by the batch size and the feature vocabulary. The patient cases are
+    assigned to the folds round robin, so all instances of a case are in the same fold.
+    The folds are trained in parallel processes, each streams the training set itself.
+    Returns the scores per fold.
+    """
+    print("Scanning features and classes..")
+    vocabulary, classes = scan(reader)
+    print('Hierarchically coded features: ' + str(len(vocabulary)) + ', classes: ' + str(len(classes)))
+    options = {'loss' : loss, 'alpha' : alpha, 'batch_size' : batch_size, 'epochs' : epochs, 'seed' : seed}
+    tasks = [(reader, vocabulary, classes, fold, num_folds, options) for fold in range(num_folds)]
+    num_workers = max(1, min(num_workers, num_folds))
+    if num_workers > 1:
+        with Pool(num_workers) as pool:
+            return pool.map(evaluate_fold, tasks)
+    return [evaluate_fold(task) for task in tasks]
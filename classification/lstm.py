@@ -1,31 +1,42 @@
 import numpy as np
-from keras.utils import np_utils
 
 from sklearn.cross_validation import train_test_split
 from keras.models import Sequential
 from keras.layers.recurrent import LSTM
-from keras.layers.core import Dropout, Dense
+from keras.layers.core import Dropout, Dense, Masking
 import json
 from keras.callbacks import EarlyStopping
 from classification.LossHistoryVisualization import LossHistoryVisualisation
+from classification.bucketbatches import bucketed_batch_generator
+from classification.ffnn import sparse_targets
+from classification.epochspans import EpochSpans
+from instrumentation import span
 
 def train_and_evaluate_lstm(config, X_train, X_test, y_train, y_test, output_dim, task):
-    y_train = np_utils.to_categorical(y_train, output_dim)
-    y_test = np_utils.to_categorical(y_test, output_dim)
+    y_train = sparse_targets(y_train)
+    y_test = sparse_targets(y_test)
     
-    X_train = pad_sequences(X_train, maxlen=config['maxlen'], dim=len(X_train[0][0]))
-    X_test = pad_sequences(X_test, maxlen=config['maxlen'], dim=len(X_train[0][0]))
+    # X_train and X_test are reader.sequencevectors.raggedsequences.RaggedSequences
+    dim = X_train.vector_size
+    X_test = X_test.pad(config['maxlen'])
     
     X_train, X_validation, y_train, y_validation = train_test_split(X_train, y_train, test_size=0.15, random_state=23)
+    X_validation = X_validation.pad(config['maxlen'])
+    # the training batches are only padded to their longest case (see bucketbatches)
+    lengths = np.minimum(X_train.lengths(), config['maxlen'])
+    def make_batch(indices):
+        return (X_train[indices].pad(lengths[indices].max()), y_train[indices])
    
     # TODO normalization
     
     model = Sequential()
-    model.add(LSTM(output_dim=128, input_dim=X_train.shape[2], input_length=config['maxlen'], activation='sigmoid', inner_activation='hard_sigmoid'))
+    # the timesteps are variable, padded timesteps are masked
+    model.add(Masking(mask_value=0., input_shape=(None, dim)))
+    model.add(LSTM(output_dim=128, activation='sigmoid', inner_activation='hard_sigmoid'))
     model.add(Dropout(0.5))
     model.add(Dense(output_dim, activation='softmax'))
     
-    model.compile(loss='categorical_crossentropy',
+    model.compile(loss='sparse_categorical_crossentropy',
                   optimizer=config['optimizer'],
                   metrics=['accuracy'])
     
@@ -35,12 +46,13 @@ def train_and_evaluate_lstm(config, X_train, X_test, y_train, y_test, output_dim
     
     early_stopping = EarlyStopping(monitor='val_acc', patience=10)
     visualizer = LossHistoryVisualisation(config['base_folder'] + 'classification/epochs_' + task + '.png')
-    model.fit(X_train, y_train,
-              nb_epoch=100,
-              batch_size=64,
-              validation_data=(X_validation, y_validation),
-              verbose=2,
-              callbacks=[early_stopping, visualizer])
+    with span('train', samples=len(lengths)):
+        model.fit_generator(bucketed_batch_generator(lengths, 64, make_batch),
+                  samples_per_epoch=len(lengths),
+                  nb_epoch=100,
+                  validation_data=(X_validation, y_validation),
+                  verbose=2,
+                  callbacks=[early_stopping, visualizer, EpochSpans(len(lengths))])
     
     print("Prediction using LSTM..")
     score = model.evaluate(X_test, y_test, verbose=0)
@@ -62,7 +74,7 @@ def pad_sequences(sequences, maxlen=None, dim=1, dtype='float32',
     if maxlen is None:
         maxlen = np.max(lengths)
 
-    x = (np.ones((nb_samples, maxlen, dim)) * value).astype(dtype)
+    x = np.full((nb_samples, maxlen, dim), value, dtype=dtype)
     for idx, s in enumerate(sequences):
         if truncating == 'pre':
             trunc = s[-maxlen:]
@@ -70,6 +82,8 @@ def pad_sequences(sequences, maxlen=None, dim=1, dtype='float32',
             trunc = s[:maxlen]
         else:
             raise ValueError("Truncating type '%s' not understood" % padding)
+        if len(trunc) == 0:
+            continue
 
         if padding == 'post':
             x[idx, :len(trunc)] = trunc
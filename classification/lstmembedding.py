@@ -2,7 +2,6 @@ import numpy as np
 import json
 from sklearn.cross_validation import train_test_split
 
-from keras.utils import np_utils
 from keras.layers import Dropout, Dense, Input, LSTM, Embedding, merge
 from keras.models import Model
 from keras.utils.visualize_util import plot
@@ -11,12 +10,16 @@ import os
 
 from keras.callbacks import EarlyStopping
 from classification.LossHistoryVisualization import LossHistoryVisualisation
+from classification.bucketbatches import bucketed_batch_generator, trailing_lengths
+from classification.ffnn import sparse_targets
+from classification.epochspans import EpochSpans
+from instrumentation import span
 
 
 def train_and_evaluate_lstm_with_embedding(config, codes_train, codes_test, demo_train, demo_test, y_train, y_test, output_dim, task, vocab, vector_by_token, vector_by_code):
     if task != 'los':
-        y_train = np_utils.to_categorical(y_train, output_dim)
-        y_test = np_utils.to_categorical(y_test, output_dim)
+        y_train = sparse_targets(y_train)
+        y_test = sparse_targets(y_test)
     
     
     codes_train, codes_validation, demo_train, demo_validation, y_train, y_validation = train_test_split(codes_train, demo_train, y_train, test_size=0.15, random_state=23)
@@ -30,8 +33,14 @@ def train_and_evaluate_lstm_with_embedding(config, codes_train, codes_test, demo
         embedding_weights[index,:] = vector_by_token[word] if config['use-all-tokens-in-embedding'] or word not in vector_by_code else vector_by_code[word]
        
 
-    codes_input = Input(shape=(config['maxlen'],), dtype='int32', name='codes_input')
-    embedding = Embedding(n_symbols, config['word2vec-dim-size'], input_length=config['maxlen'], 
+    # the codes are 'pre' padded to maxlen, the training batches are cut to their longest case (see bucketbatches)
+    lengths = trailing_lengths(codes_train)
+    def make_batch(indices):
+        length = max(1, lengths[indices].max())
+        return ({'codes_input' : codes_train[indices, -length:], 'demo_input' : demo_train[indices]}, {'output' : y_train[indices]})
+
+    codes_input = Input(shape=(None,), dtype='int32', name='codes_input')
+    embedding = Embedding(n_symbols, config['word2vec-dim-size'], 
                              mask_zero=True, weights=[embedding_weights])(codes_input)
     node = embedding
     for i, layer in enumerate(config['lstm-layers']):
@@ -60,7 +69,7 @@ def train_and_evaluate_lstm_with_embedding(config, codes_train, codes_test, demo
                   metrics=[additional_metric_name, 'mse'])
     else:
         additional_metric_name = 'accuracy'
-        model.compile(loss={'output' : 'categorical_crossentropy'},
+        model.compile(loss={'output' : 'sparse_categorical_crossentropy'},
                   optimizer=config['optimizer'],
                   metrics=[additional_metric_name])
     
@@ -75,12 +84,13 @@ def train_and_evaluate_lstm_with_embedding(config, codes_train, codes_test, demo
     
     early_stopping = EarlyStopping(monitor='val_loss' if task == 'los' else 'val_acc', patience=10)
     visualizer = LossHistoryVisualisation(config['base_folder'] + 'classification/epochs_' + task + '.png', additional_metric_name='val_' + additional_metric_name)
-    model.fit({'codes_input':codes_train, 'demo_input':demo_train}, {'output':y_train},
-              nb_epoch=50,
-              validation_data=({'codes_input':codes_validation, 'demo_input':demo_validation}, {'output':y_validation}),
-              batch_size=64,
-              verbose=2,
-              callbacks=[early_stopping, visualizer])
+    with span('train', samples=len(lengths)):
+        model.fit_generator(bucketed_batch_generator(lengths, 64, make_batch),
+                  samples_per_epoch=len(lengths),
+                  nb_epoch=50,
+                  validation_data=({'codes_input':codes_validation, 'demo_input':demo_validation}, {'output':y_validation}),
+                  verbose=2,
+                  callbacks=[early_stopping, visualizer, EpochSpans(len(lengths))])
     
     print("Prediction using LSTM..")
     score = model.evaluate({'codes_input':codes_test, 'demo_input':demo_test}, {'output':y_test}, verbose=0)
@@ -0,0 +1,89 @@
+import os
+import json
+import shutil
+import numpy as np
+from sklearn import preprocessing
+
+from reader.vocabulary import Vocabulary, LabelEncoder
+from embedding.embeddingstore import write_lines
+
+# fitted parameters of the MaxAbsScalers
+SCALER_ATTRIBUTES = ['max_abs_', 'scale_', 'n_samples_seen_']
+
+def bundle_folder(config, task):
+    """ folder of the ModelBundle of a task """
+    return config['base_folder'] + 'classification/' + config['classifier'] + '_' + task + '/'
+
+class ModelBundle:
+    """
+    A trained model of a task with everything needed to use it on new cases,
+    without reading the catalogs or the training data again. A bundle folder contains
+      bundle.json   classifier, task, embedding store version and the scaler parameters
+      model.json    Keras architecture (model.to_json())
+      weights.npz   Keras weights (model.get_weights()), arrays w0, w1, ..
+      model.pkl     instead of model.json and weights.npz for scikit-learn models (random forest)
+      classes.txt   one class per line, line number = output index of the model
+      vocab.txt     vocabulary of the input sequences (only for the sequence reader)
+    """
+    def __init__(self, classifier, task, model, classes, scaler=None, demo_scaler=None, vocab=None, embedding_version=None):
+        self.classifier = classifier
+        self.task = task
+        self.model = model
+        self.classes = LabelEncoder([str(c) for c in classes])
+        self.scaler = scaler
+        self.demo_scaler = demo_scaler
+        self.vocab = vocab
+        self.embedding_version = embedding_version
+    
+    def save(self, folder):
+        # written to a temporary folder first, a bundle is never read half written
+        temp_folder = folder.rstrip('/') + '.tmp'
+        if os.path.exists(temp_folder):
+            shutil.rmtree(temp_folder)
+        os.makedirs(temp_folder)
+        json.dump({'classifier' : self.classifier, 'task' : self.task, 'embedding-version' : self.embedding_version,
+                   'scaler' : scaler_parameters(self.scaler), 'demo-scaler' : scaler_parameters(self.demo_scaler)}, 
+                  open(os.path.join(temp_folder, 'bundle.json'), 'w'), indent=4, sort_keys=True)
+        if hasattr(self.model, 'to_json'):
+            with open(os.path.join(temp_folder, 'model.json'), 'w') as out_file:
+                out_file.write(self.model.to_json())
+            weights = self.model.get_weights()
+            np.savez(os.path.join(temp_folder, 'weights.npz'), **{'w' + str(i) : w for i, w in enumerate(weights)})
+        else:
+            from sklearn.externals import joblib
+            joblib.dump(self.model, os.path.join(temp_folder, 'model.pkl'))
+        write_lines(os.path.join(temp_folder, 'classes.txt'), self.classes)
+        if self.vocab != None:
+            self.vocab.save(os.path.join(temp_folder, 'vocab.txt'))
+        if os.path.exists(folder):
+            shutil.rmtree(folder)
+        os.rename(temp_folder, folder)
+    
+    @classmethod
+    def load(cls, folder):
+        info = json.load(open(os.path.join(folder, 'bundle.json'), 'r'))
+        if os.path.exists(os.path.join(folder, 'model.json')):
+            from keras.models import model_from_json
+            model = model_from_json(open(os.path.join(folder, 'model.json'), 'r').read())
+            weights = np.load(os.path.join(folder, 'weights.npz'))
+            model.set_weights([weights['w' + str(i)] for i in range(len(weights.files))])
+        else:
+            from sklearn.externals import joblib
+            model = joblib.load(os.path.join(folder, 'model.pkl'))
+        vocab = Vocabulary.load(os.path.join(folder, 'vocab.txt')) if os.path.exists(os.path.join(folder, 'vocab.txt')) else None
+        return cls(info['classifier'], info['task'], model, LabelEncoder.load(os.path.join(folder, 'classes.txt')), 
+                   scaler_from_parameters(info['scaler']), scaler_from_parameters(info['demo-scaler']), vocab, info['embedding-version'])
+    
+
+def scaler_parameters(scaler):
+    if scaler == None:
+        return None
+    return {name : np.asarray(getattr(scaler, name)).tolist() for name in SCALER_ATTRIBUTES if hasattr(scaler, name)}
+
+def scaler_from_parameters(parameters):
+    if parameters == None:
+        return None
+    scaler = preprocessing.MaxAbsScaler()
+    for name, value in parameters.items():
+        setattr(scaler, name, np.array(value) if isinstance(value, list) else value)
+    return scaler
@@ -0,0 +1,26 @@
+import unittest
+import numpy as np
+
+from classification.bucketbatches import length_buckets, bucketed_batch_generator, trailing_lengths
+
+class TestBucketBatches(unittest.TestCase):
+    def test_buckets(self):
+        lengths = np.array([1, 5, 2, 5, 1, 3, 2, 4, 1])
+        batches = length_buckets(lengths, 3, np.random.RandomState(0))
+        self.assertListEqual(sorted(np.concatenate(batches).tolist()), list(range(len(lengths))))
+        self.assertListEqual(sorted([sorted(lengths[batch].tolist()) for batch in batches]), [[1, 1, 1], [2, 2, 3], [4, 5, 5]])
+    
+    def test_generator(self):
+        lengths = np.arange(10)
+        generator = bucketed_batch_generator(lengths, 4, lambda indices: indices)
+        # two epochs
+        seen = [next(generator) for _ in range(6)]
+        self.assertListEqual(sorted(np.concatenate(seen[:3]).tolist()), list(range(10)))
+        self.assertListEqual(sorted(np.concatenate(seen[3:]).tolist()), list(range(10)))
+    
+    def test_trailing_lengths(self):
+        codes = np.array([[0, 0, 3], [1, 2, 3], [0, 0, 0], [0, 5, 0]])
+        self.assertListEqual(trailing_lengths(codes).tolist(), [1, 3, 0, 2])
+
+if __name__ == '__main__':
+    unittest.main()
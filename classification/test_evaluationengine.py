@@ -0,0 +1,32 @@
+import unittest
+import numpy as np
+from classification.evaluationengine import Evaluation, propose
+
+class TestEvaluation(unittest.TestCase):
+    def setUp(self):
+        probabs = np.array([[0.5, 0.3, 0.2],
+                            [0.1, 0.6, 0.3],
+                            [0.2, 0.2, 0.6]])
+        # the most probable class is excluded for the first instance
+        self.evaluation = Evaluation(probabs, ['a', 'b', 'c'], ['b', 'c', 'x'], [['a'], [], ['b']], block_size=2)
+        
+    def test_score(self):
+        self.assertAlmostEqual(self.evaluation.score(), 1.0 / 3)
+        
+    def test_oracle(self):
+        np.testing.assert_array_equal(self.evaluation.ranks(), [0, 1, -1])
+        np.testing.assert_allclose(self.evaluation.oracle(), [1.0 / 3, 2.0 / 3, 2.0 / 3])
+        
+    def test_confidence_histograms(self):
+        best, true = self.evaluation.confidence_histograms()
+        self.assertEqual(best[30], 1)
+        self.assertEqual(best[60], 2)
+        self.assertEqual(true.sum(), 2)
+        self.assertEqual(true[30], 2)
+        
+    def test_propose(self):
+        proposals = propose(self.evaluation.probabs, ['a', 'b', 'c'], [['a'], [], ['b', 'c']], k=2)
+        self.assertListEqual(proposals, [[('b', 0.3), ('c', 0.2)], [('b', 0.6), ('c', 0.3)], [('a', 0.2)]])
+
+if __name__ == '__main__':
+    unittest.main()
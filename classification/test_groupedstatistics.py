@@ -0,0 +1,33 @@
+import unittest
+import numpy as np
+from scipy import stats
+
+from classification.groupedstatistics import GroupedStatistics, grouped_baseline
+
+class TestGroupedStatistics(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(3)
+        self.keys = rng.choice(['901A', '901B', 'F62C', 'Z01A'], 200)
+        self.values = rng.randint(1, 30, 200).astype(np.float64)
+        self.statistics = GroupedStatistics(self.keys, self.values)
+        
+    def test_statistics(self):
+        for i, group in enumerate(self.statistics.groups):
+            values = self.values[self.keys == group]
+            self.assertEqual(self.statistics.counts[i], len(values))
+            self.assertAlmostEqual(self.statistics.mean()[i], values.mean())
+            self.assertAlmostEqual(self.statistics.median()[i], np.median(values))
+            self.assertAlmostEqual(self.statistics.quantile(0.9)[i], np.percentile(values, 90))
+            self.assertAlmostEqual(self.statistics.trimmed_mean(0.1)[i], stats.trim_mean(values, 0.1))
+    
+    def test_baseline(self):
+        keys_test = np.array(['F62C', 'X99Z', '901A'])
+        y_test = np.array([3.0, 5.0, 10.0])
+        predictions, metrics = grouped_baseline(self.keys, self.values, keys_test, y_test, 'median')
+        self.assertListEqual(predictions.tolist(), [np.median(self.values[self.keys == 'F62C']), np.median(self.values), 
+                                                    np.median(self.values[self.keys == '901A'])])
+        self.assertAlmostEqual(metrics['mae'], np.abs(predictions - y_test).mean())
+        self.assertAlmostEqual(metrics['mape'], (np.abs(predictions - y_test) / y_test).mean())
+
+if __name__ == '__main__':
+    unittest.main()
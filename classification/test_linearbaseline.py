@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from classification.linearbaseline import scan, cross_validate_linear_model
+from reader.sparsehierarchical.drgreader import DRGReader, DRGTaskReader
+
+def csv_row(i, pdx, diags, procs):
+    diags = diags + [''] * (DRGReader.MAX_ADDITIONAL_DIAGNOSES - len(diags))
+    procs = [proc + ':20150101' for proc in procs] + [''] * (DRGReader.MAX_PROCEDURES - len(procs))
+    return ';'.join([str(i), '50', '0', '0', 'M', '01', '00', '3', '0', '0', pdx] + diags + procs)
+
+class TestLinearBaseline(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'cases.csv')
+        with open(self.filename, 'w') as out_file:
+            for i in range(40):
+                # the PDX can be told from the procedure
+                if (i // 2) % 2 == 0:
+                    print(csv_row(i, 'A01', ['B2'], ['8812']), file=out_file)
+                else:
+                    print(csv_row(i, 'C02', ['B2', 'B31'], ['0001']), file=out_file)
+            print(csv_row(40, '', ['B2'], []), file=out_file)
+            print(csv_row(41, 'A01', ['B2', 'B31', 'B2'], ['8812', '8812']), file=out_file)
+    
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+    
+    def test_task_instances(self):
+        instances = list(DRGTaskReader(self.filename, 'sdx').read_instances(lambda i: i == 2))
+        self.assertEqual([(instance.diags, instance.procs, instance.gt) for instance in instances], 
+                         [(['B31', 'C02'], ['0001'], 'B2'), (['B2', 'C02'], ['0001'], 'B31')])
+        # all occurrences of a repeated code are left out, as by FlatVectorizedPCReader
+        instances = list(DRGTaskReader(self.filename, 'sdx').read_instances(lambda i: i == 41))
+        self.assertEqual([(instance.diags, instance.gt) for instance in instances], 
+                         [(['B31', 'A01'], 'B2'), (['B2', 'B2', 'A01'], 'B31'), (['B31', 'A01'], 'B2')])
+        instances = list(DRGTaskReader(self.filename, 'srg').read_instances(lambda i: i == 41))
+        self.assertEqual([(instance.procs, instance.gt) for instance in instances], [([], '8812'), ([], '8812')])
+        vocabulary, classes = scan(DRGTaskReader(self.filename, 'pdx'))
+        self.assertListEqual(classes.tolist(), ['A01', 'C02'])
+        self.assertIn('881', vocabulary.feature_names())
+        
+    def test_cross_validation(self):
+        scores = cross_validate_linear_model(DRGTaskReader(self.filename, 'pdx'), num_folds=2, batch_size=7)
+        self.assertEqual([score['fold'] for score in scores], [0, 1])
+        for score in scores:
+            self.assertEqual(score['accuracy'], 1.0)
+
+if __name__ == '__main__':
+    unittest.main()
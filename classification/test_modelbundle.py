@@ -0,0 +1,75 @@
+import unittest
+import tempfile
+import os
+import sys
+import json
+import types
+from unittest import mock
+import numpy as np
+from sklearn import preprocessing
+from classification.modelbundle import ModelBundle, scaler_parameters, scaler_from_parameters
+from reader.vocabulary import Vocabulary
+
+class KerasLikeModel:
+    def to_json(self):
+        return json.dumps({'class_name' : 'Sequential'})
+    
+    def get_weights(self):
+        return [np.ones((3, 2), dtype=np.float32), np.zeros(2, dtype=np.float32)]
+    
+    def set_weights(self, weights):
+        self.weights = weights
+
+def keras_models_stub():
+    """ keras.models with a model_from_json for the KerasLikeModel (keras may not be installed) """
+    models = types.ModuleType('keras.models')
+    models.model_from_json = lambda model_json: KerasLikeModel()
+    modules = {'keras.models' : models}
+    if 'keras' not in sys.modules:
+        try:
+            import keras
+        except ImportError:
+            modules['keras'] = types.ModuleType('keras')
+    return modules
+
+class TestModelBundle(unittest.TestCase):
+    def test_scaler_parameters(self):
+        X = np.array([[1.0, -4.0], [2.0, 2.0]])
+        scaler = preprocessing.MaxAbsScaler().fit(X)
+        restored = scaler_from_parameters(json.loads(json.dumps(scaler_parameters(scaler))))
+        np.testing.assert_allclose(restored.transform(X), scaler.transform(X))
+        self.assertEqual(scaler_from_parameters(scaler_parameters(None)), None)
+        
+    def test_save(self):
+        folder = os.path.join(tempfile.mkdtemp(), 'lstm-embedding_pdx/')
+        bundle = ModelBundle('lstm-embedding', 'pdx', KerasLikeModel(), ['A00', 'B20'], vocab=Vocabulary(['x']), embedding_version=2)
+        bundle.save(folder)
+        self.assertTrue(os.path.exists(os.path.join(folder, 'model.json')))
+        weights = np.load(os.path.join(folder, 'weights.npz'))
+        np.testing.assert_array_equal(weights['w0'], np.ones((3, 2)))
+        self.assertEqual(json.load(open(os.path.join(folder, 'bundle.json')))['embedding-version'], 2)
+        self.assertListEqual(list(Vocabulary.load(os.path.join(folder, 'vocab.txt'))), ['mask', 'x'])
+
+    def test_load(self):
+        folder = os.path.join(tempfile.mkdtemp(), 'ffnn_sdx/')
+        X = np.array([[1.0, -4.0], [2.0, 2.0]])
+        scaler = preprocessing.MaxAbsScaler().fit(X)
+        demo_scaler = preprocessing.MaxAbsScaler().fit(-3 * X)
+        ModelBundle('ffnn', 'sdx', KerasLikeModel(), ['D40', 'A00', 'B20'], scaler, demo_scaler, 
+                    vocab=Vocabulary(['y', 'x']), embedding_version=3).save(folder)
+        
+        with mock.patch.dict(sys.modules, keras_models_stub()):
+            bundle = ModelBundle.load(folder)
+        self.assertEqual(bundle.classifier, 'ffnn')
+        self.assertEqual(bundle.task, 'sdx')
+        self.assertEqual(bundle.embedding_version, 3)
+        # the classes keep the order of the model outputs
+        self.assertListEqual(list(bundle.classes), ['D40', 'A00', 'B20'])
+        self.assertListEqual(bundle.classes.transform(['A00', 'D40']).tolist(), [1, 0])
+        self.assertListEqual(list(bundle.vocab), ['mask', 'y', 'x'])
+        np.testing.assert_array_equal(bundle.model.weights[0], np.ones((3, 2)))
+        np.testing.assert_allclose(bundle.scaler.transform(X), scaler.transform(X))
+        np.testing.assert_allclose(bundle.demo_scaler.transform(X), demo_scaler.transform(X))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import numpy as np
+from collections.abc import Mapping
+
+from vectorize import read_vectors, unitvec, unitvecs
+
+class EmbeddingStore:
+    """
+    Binary, memory-mappable form of the word2vec output and the code tokenizations.
+    A store folder contains
+      vocab.txt           one token per line, line number = row in vectors.npy
+      vectors.npy         normalized float32 token vectors
+      codes.txt           one code per line, line number = row in code_offsets.npy
+      code_offsets.npy    CSR offsets into code_token_rows.npy (number of codes + 1)
+      code_token_rows.npy rows in vectors.npy of all tokens of all codes
+      code_sums.npy       for each code the (unnormalized) sum of all its token vectors
+      version.json        version of the store and the keys of the incremental updates 
+                          applied to it (optional, see word2vectrainer.update_embedding_store)
+    It is compiled once with compile_embedding_store and opened with np.memmap afterwards,
+    so consumers get views into the mapped matrices instead of per-token copies.
+    """
+    FILES = ['vocab.txt', 'vectors.npy', 'codes.txt', 'code_offsets.npy', 'code_token_rows.npy', 'code_sums.npy']
+    
+    def __init__(self, vocab, vectors, codes, code_offsets, code_token_rows, code_sums, version=1, updates=[]):
+        self.vocab = vocab
+        self.token_index = {token : i for i, token in enumerate(vocab)}
+        self.vectors = vectors
+        self.codes = codes
+        self.code_index = {code : i for i, code in enumerate(codes)}
+        self.code_offsets = code_offsets
+        self.code_token_rows = code_token_rows
+        self.code_sums = code_sums
+        self.vector_size = vectors.shape[1]
+        self.version = version
+        self.updates = list(updates)
+        
+        # dict-like views for the existing consumers of read_vectors and read_code_vectors
+        self.vector_by_token = TokenVectors(self)
+        self.vectors_by_code = CodeTokenVectors(self)
+        self.vector_by_code = CodeVectors(self)
+        self.tokens_by_code = CodeTokens(self)
+    
+    @classmethod
+    def open(cls, folder, mmap_mode='r'):
+        vocab = read_lines(os.path.join(folder, 'vocab.txt'))
+        codes = read_lines(os.path.join(folder, 'codes.txt'))
+        load = lambda name: np.load(os.path.join(folder, name), mmap_mode=mmap_mode)
+        version = {'version' : 1, 'updates' : []}
+        if os.path.exists(os.path.join(folder, 'version.json')):
+            version = json.load(open(os.path.join(folder, 'version.json'), 'r'))
+        return cls(vocab, load('vectors.npy'), codes, load('code_offsets.npy'), 
+                   load('code_token_rows.npy'), load('code_sums.npy'), version['version'], version['updates'])
+    
+    def save(self, folder):
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        write_lines(os.path.join(folder, 'vocab.txt'), self.vocab)
+        write_lines(os.path.join(folder, 'codes.txt'), self.codes)
+        np.save(os.path.join(folder, 'vectors.npy'), self.vectors)
+        np.save(os.path.join(folder, 'code_offsets.npy'), self.code_offsets)
+        np.save(os.path.join(folder, 'code_token_rows.npy'), self.code_token_rows)
+        np.save(os.path.join(folder, 'code_sums.npy'), self.code_sums)
+        json.dump({'version' : self.version, 'updates' : self.updates}, open(os.path.join(folder, 'version.json'), 'w'), indent=4)
+        
+    @classmethod
+    def exists(cls, folder):
+        return all([os.path.exists(os.path.join(folder, name)) for name in cls.FILES])
+    
+    def token_rows(self, code):
+        i = self.code_index[code]
+        return self.code_token_rows[self.code_offsets[i]:self.code_offsets[i + 1]]
+    
+    def normalized_code_vectors(self):
+        """ matrix with one normalized vector per code (same order as self.codes) """
+        return unitvecs(self.code_sums).astype(np.float32)
+    
+    
+class TokenVectors(Mapping):
+    """ vector by token. Values are views into the (memory mapped) vector matrix. """
+    def __init__(self, store):
+        self.store = store
+    
+    def __getitem__(self, token):
+        return self.store.vectors[self.store.token_index[token]]
+    
+    def __contains__(self, token):
+        return token in self.store.token_index
+    
+    def __iter__(self):
+        return iter(self.store.vocab)
+    
+    def __len__(self):
+        return len(self.store.vocab)
+    
+class CodeTokenVectors(Mapping):
+    """ 
+    for each code the vectors of its tokens (first vector is the code token).
+    Also exposes the code index and the summed code vectors of the store.
+    """
+    def __init__(self, store):
+        self.store = store
+        self.code_index = store.code_index
+        self.code_sums = store.code_sums
+    
+    def __getitem__(self, code):
+        return self.store.vectors[self.store.token_rows(code)]
+    
+    def __contains__(self, code):
+        return code in self.store.code_index
+    
+    def __iter__(self):
+        return iter(self.store.codes)
+    
+    def __len__(self):
+        return len(self.store.codes)
+    
+class CodeVectors(CodeTokenVectors):
+    """ for each code the normalized sum of all vectors of its tokens """
+    def __getitem__(self, code):
+        return unitvec(self.store.code_sums[self.store.code_index[code]])
+    
+class CodeTokens(CodeTokenVectors):
+    """ for each code its tokens. Empty tokens were resolved to '</s>' when compiling. """
+    def __getitem__(self, code):
+        return [self.store.vocab[row] for row in self.store.token_rows(code)]
+    
+
+def compile_embedding_store(vector_file, code_token_file, folder, encoding="utf-8"):
+    """
+    Parses the word2vec text output and the code tokenizations once
+    and writes them as an EmbeddingStore to the given folder.
+    """
+    vector_by_token = read_vectors(vector_file, encoding=encoding)
+    vector_size = max([len(v) for v in vector_by_token.values()])
+    # the first line of the word2vec output is the header "vocab_size vector_size"
+    vocab = [token for token, v in vector_by_token.items() if len(v) == vector_size]
+    vectors = np.empty((len(vocab), vector_size), dtype=np.float32)
+    for i, token in enumerate(vocab):
+        vectors[i] = vector_by_token[token]
+    store = store_from_arrays(vocab, vectors, read_code_tokens(code_token_file, encoding))
+    store.save(folder)
+    return store
+    
+def store_from_arrays(vocab, vectors, tokens_by_code):
+    """ 
+    Builds an in memory EmbeddingStore from a vocabulary, the matching 
+    normalized vectors and the tokens of each code (dict or list of pairs).
+    """
+    token_index = {token : i for i, token in enumerate(vocab)}
+    items = tokens_by_code.items() if isinstance(tokens_by_code, dict) else tokens_by_code
+    codes = []
+    code_offsets = [0]
+    code_token_rows = []
+    for code, tokens in items:
+        codes.append(code)
+        for token in tokens:
+            # empty token
+            token = '</s>' if token == '' else token
+            code_token_rows.append(token_index[token])
+        code_offsets.append(len(code_token_rows))
+    code_offsets = np.array(code_offsets, dtype=np.int64)
+    code_token_rows = np.array(code_token_rows, dtype=np.int32)
+    code_sums = np.zeros((len(codes), vectors.shape[1]), dtype=np.float32)
+    if len(code_token_rows) > 0:
+        non_empty = code_offsets[:-1] < code_offsets[1:]
+        code_sums[non_empty] = np.add.reduceat(vectors[code_token_rows], code_offsets[:-1][non_empty], axis=0)
+    return EmbeddingStore(list(vocab), vectors, codes, code_offsets, code_token_rows, code_sums)
+
+def read_code_tokens(code_token_file, encoding="utf-8"):
+    tokens_by_code = []
+    with open(code_token_file, 'rb') as fin:
+        for line in fin:
+            ts = line.decode(encoding).strip().split(' ')
+            tokens_by_code.append((ts[0], ts))
+    return tokens_by_code
+
+def open_embedding_store(vector_file, code_token_file, folder):
+    """
+    Opens the store in the given folder. The store is (re)compiled first
+    if it does not exist or is older than the vector or the token file.
+    There is no vector file if the store was trained in-process (see word2vectrainer).
+    """
+    inputs = [filename for filename in [vector_file, code_token_file] if os.path.exists(filename)]
+    if not EmbeddingStore.exists(folder) or \
+            os.path.getmtime(os.path.join(folder, 'code_sums.npy')) < max([os.path.getmtime(filename) for filename in inputs]):
+        print("Compile embedding store to " + folder)
+        compile_embedding_store(vector_file, code_token_file, folder)
+    return EmbeddingStore.open(folder)
+        
+def read_lines(filename):
+    with open(filename, 'r', encoding='utf-8') as in_file:
+        return [line.rstrip('\n') for line in in_file]
+    
+def write_lines(filename, lines):
+    with open(filename, 'w', encoding='utf-8') as out_file:
+        for line in lines:
+            print(line, file=out_file)
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import unittest
+import tempfile
+import os
+import numpy as np
+from embedding.embeddingstore import EmbeddingStore, compile_embedding_store
+from vectorize import read_vectors, read_code_vectors
+
+class TestEmbeddingStore(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.vector_file = os.path.join(self.folder, 'vectors.csv')
+        self.token_file = os.path.join(self.folder, 'all_tokens.csv')
+        with open(self.vector_file, 'w') as f:
+            f.write('4 3\n</s> 0.1 0.2 0.3\nICD_A00 1.0 0.0 0.0\nbacteria 0.0 3.0 0.0\nCHOP_01 0.0 0.0 -2.0\n')
+        with open(self.token_file, 'w') as f:
+            f.write('ICD_A00 bacteria\nCHOP_01  bacteria\n')
+        
+    def test_compile_and_open(self):
+        compile_embedding_store(self.vector_file, self.token_file, os.path.join(self.folder, 'store'))
+        store = EmbeddingStore.open(os.path.join(self.folder, 'store'))
+        vector_by_token = read_vectors(self.vector_file)
+        res = read_code_vectors(vector_by_token, self.token_file)
+        
+        self.assertEqual(len(store.vocab), 4)
+        self.assertEqual(store.version, 1)
+        self.assertTrue(isinstance(store.vectors, np.memmap))
+        np.testing.assert_allclose(store.vector_by_token['bacteria'], vector_by_token['bacteria'])
+        self.assertListEqual(store.tokens_by_code['CHOP_01'], ['CHOP_01', '</s>', 'bacteria'])
+        for code in ['ICD_A00', 'CHOP_01']:
+            np.testing.assert_allclose(store.vectors_by_code[code], res['vectors'][code])
+            np.testing.assert_allclose(store.vector_by_code[code], res['vector_by_code'][code], rtol=1e-6)
+    
+    def test_version(self):
+        folder = os.path.join(self.folder, 'store')
+        store = compile_embedding_store(self.vector_file, self.token_file, folder)
+        store.version = 2
+        store.updates = ['abc']
+        store.save(folder)
+        store = EmbeddingStore.open(folder)
+        self.assertEqual(store.version, 2)
+        self.assertListEqual(store.updates, ['abc'])
+            
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import unittest
+import tempfile
+import os
+import numpy as np
+from embedding.embeddingstore import EmbeddingStore
+try:
+    # only needed for the "gensim" word2vec-backend
+    import gensim
+    from embedding.word2vectrainer import continue_word2vec, continue_word2vec_model, train_embedding_store, update_embedding_store
+except ImportError:
+    gensim = None
+
+@unittest.skipIf(gensim == None, 'gensim is not installed')
+class TestWord2VecTrainer(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.token_file = os.path.join(self.folder, 'all_tokens.csv')
+        self.store_folder = os.path.join(self.folder, 'store') + '/'
+        self.write_tokens(['ICD_A00 bacteria infection', 'CHOP_01 surgery infection'])
+        self.config = {'word2vec-dim-size' : 8, 'word2vec-cbow' : True, 'num-cores' : 1, 'all-tokens' : self.token_file,
+                       'shuffle-word2vec-traindata' : False, 'num-shuffles' : 1, 'use_demographic_tokens' : False}
+        
+    def write_tokens(self, lines):
+        with open(self.token_file, 'w', encoding='utf-8') as out_file:
+            for line in lines:
+                print(line, file=out_file)
+        
+    def test_continue_keeps_known_vectors(self):
+        vocab = ['bacteria', 'infection']
+        vectors = np.array([[1, 0, 0, 0, 0, 0, 0, 0], [0, 0.6, 0.8, 0, 0, 0, 0, 0]], dtype=np.float32)
+        sentences = [['bacteria', 'virus', 'infection'], ['virus', 'infection']] * 20
+        new_vocab, new_vectors = continue_word2vec(vocab, vectors, sentences, self.config)
+        self.assertListEqual(new_vocab, ['bacteria', 'infection', 'virus'])
+        self.assertEqual(new_vectors.dtype, np.float32)
+        np.testing.assert_array_equal(new_vectors[:2], vectors)
+        self.assertAlmostEqual(float(np.linalg.norm(new_vectors[2])), 1.0, places=5)
+        
+    def test_locked_rows(self):
+        vocab = ['bacteria', 'infection']
+        vectors = np.array([[1, 0, 0, 0, 0, 0, 0, 0], [0, 0.6, 0.8, 0, 0, 0, 0, 0]], dtype=np.float32)
+        sentences = [['bacteria', 'virus', 'infection'], ['virus', 'infection', 'bacteria']] * 50
+        model = continue_word2vec_model(vocab, vectors, sentences, self.config)
+        # the known rows are locked (vectors_lockf), only the new token is trained
+        np.testing.assert_array_equal(model.wv[vocab], vectors)
+        self.assertTrue(np.any(model.wv.vectors_lockf > 0))
+        
+    def test_update_embedding_store(self):
+        previous = train_embedding_store(self.config, None, self.store_folder)
+        self.assertEqual(previous.version, 1)
+        previous = EmbeddingStore.open(self.store_folder, mmap_mode=None)
+        
+        self.write_tokens(['ICD_A00 bacteria infection', 'CHOP_01 surgery infection', 'ICD_B00 virus infection'])
+        store = update_embedding_store(self.config, None, self.store_folder, 'update-1')
+        self.assertEqual(store.version, 2)
+        self.assertListEqual(store.updates, ['update-1'])
+        
+        store = EmbeddingStore.open(self.store_folder)
+        self.assertEqual(store.version, 2)
+        # the known tokens keep their rows and vectors, the new tokens are appended
+        self.assertListEqual(store.vocab[:len(previous.vocab)], previous.vocab)
+        self.assertIn('virus', store.vocab[len(previous.vocab):])
+        np.testing.assert_array_equal(store.vectors[:len(previous.vocab)], previous.vectors)
+        self.assertIn('ICD_B00', store.codes)
+        self.assertListEqual(store.tokens_by_code['ICD_B00'], ['ICD_B00', 'virus', 'infection'])
+        for code in previous.codes:
+            np.testing.assert_allclose(store.vector_by_code[code], previous.vector_by_code[code], rtol=1e-6)
+        
+        archive = EmbeddingStore.open(self.store_folder.rstrip('/') + '.v1/')
+        self.assertEqual(archive.version, 1)
+        self.assertListEqual(archive.codes, previous.codes)
+        
+        # an update that is already applied is skipped
+        self.assertEqual(update_embedding_store(self.config, None, self.store_folder, 'update-1').version, 2)
+        self.assertFalse(os.path.exists(self.store_folder.rstrip('/') + '.v2/'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import numpy as np
+
+from vectorize import Word2VecSentences, unitvecs
+from embedding.embeddingstore import EmbeddingStore, store_from_arrays, read_code_tokens
+
+def create_word2vec_model(config):
+    """
+    gensim (only needed for the "gensim" word2vec-backend) word2vec model with the 
+    settings of the word2vec binary call in the pipeline.
+    """
+    from gensim.models import Word2Vec
+    cbow = config['word2vec-cbow']
+    return Word2Vec(vector_size=config['word2vec-dim-size'], sg=0 if cbow else 1, 
+                    # defaults of the word2vec binary
+                    alpha=0.05 if cbow else 0.025, window=5, negative=5, hs=0, sample=1e-3, epochs=5,
+                    min_count=1, workers=config['num-cores'])
+
+def train_word2vec(sentences, config):
+    """ trains word2vec in-process, returns the vocabulary and the normalized float32 vectors """
+    model = create_word2vec_model(config)
+    model.build_vocab(sentences)
+    model.train(sentences, total_examples=model.corpus_count, epochs=model.epochs)
+    return list(model.wv.index_to_key), unitvecs(model.wv.vectors).astype(np.float32)
+
+def continue_word2vec_model(vocab, vectors, sentences, config):
+    """ the word2vec model with the given vectors (locked) trained further on sentences """
+    model = create_word2vec_model(config)
+    # the frequencies in the previous corpus are not known
+    model.build_vocab_from_freq({token : 1 for token in vocab})
+    rows = [model.wv.get_index(token) for token in vocab]
+    model.wv.vectors[rows] = vectors
+    model.build_vocab(sentences, update=True)
+    trainable = np.ones(len(model.wv.index_to_key), dtype=np.float32)
+    trainable[rows] = 0.0
+    model.wv.vectors_lockf = trainable
+    model.train(sentences, total_examples=model.corpus_count, epochs=model.epochs)
+    return model
+
+def continue_word2vec(vocab, vectors, sentences, config):
+    """
+    Trains vectors for the tokens of sentences that are not in vocab. The given vectors
+    are loaded into the model and stay unchanged, so the new vectors live in the same space.
+    Returns the vocabulary with the new tokens appended and the matching vectors.
+    """
+    model = continue_word2vec_model(vocab, vectors, sentences, config)
+    known = set(vocab)
+    new_tokens = [token for token in model.wv.index_to_key if token not in known]
+    new_vectors = np.empty((len(new_tokens), vectors.shape[1]), dtype=np.float32)
+    if len(new_tokens) > 0:
+        new_vectors[:] = unitvecs(model.wv[new_tokens])
+    return list(vocab) + new_tokens, np.concatenate([np.asarray(vectors, dtype=np.float32), new_vectors])
+
+def word2vec_sentences(config, train_file, only_codes=None):
+    return Word2VecSentences(train_file, config['all-tokens'],
+                             do_shuffle=config['shuffle-word2vec-traindata'],
+                             use_n_times=config['num-shuffles'],
+                             use_demographic_tokens=config['use_demographic_tokens'],
+                             only_codes=only_codes)
+
+def train_embedding_store(config, train_file, folder):
+    """
+    Trains word2vec on the corpus streamed from the code tokenizations and the patient cases
+    of train_file (None: only the code tokenizations) and writes the EmbeddingStore.
+    No corpus or vector text file is written.
+    """
+    vocab, vectors = train_word2vec(word2vec_sentences(config, train_file), config)
+    store = store_from_arrays(vocab, vectors, read_code_tokens(config['all-tokens']))
+    store.save(folder)
+    return store
+
+def update_embedding_store(config, train_file, folder, update_key):
+    """
+    Incremental update of the EmbeddingStore in folder for new catalog versions or new
+    training data: only the tokenizations of new or changed codes and the patient cases
+    of train_file (e.g. the new months, None: no cases) are trained on. The vectors of 
+    the known tokens are kept, so existing code vectors do not change.
+    The previous version is kept in <folder>.v<version>/. An update_key (a hash over the
+    update inputs) already applied to the store is skipped.
+    """
+    previous = EmbeddingStore.open(folder, mmap_mode=None)
+    if update_key in previous.updates:
+        print("Skip embedding update, already applied to version " + str(previous.version))
+        return previous
+    tokens_by_code = read_code_tokens(config['all-tokens'])
+    changed = set([code for code, tokens in tokens_by_code if code not in previous.code_index or 
+                   previous.tokens_by_code[code] != ['</s>' if token == '' else token for token in tokens]])
+    print("Update embedding store version " + str(previous.version) + " with " + str(len(changed)) + " new or changed codes")
+    vocab, vectors = continue_word2vec(previous.vocab, previous.vectors, word2vec_sentences(config, train_file, changed), config)
+    
+    archive = folder.rstrip('/') + '.v' + str(previous.version) + '/'
+    if not os.path.exists(archive):
+        shutil.copytree(folder, archive)
+    store = store_from_arrays(vocab, vectors, tokens_by_code)
+    store.version = previous.version + 1
+    store.updates = previous.updates + [update_key]
+    store.save(folder)
+    return store
@@ -0,0 +1,179 @@
+import cProfile
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+try:
+    import resource
+except ImportError:
+    # not available on Windows, the peak RSS is not reported there
+    resource = None
+
+def peak_rss():
+    """ peak resident set size of the process in bytes, None if unknown """
+    if resource == None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class Span:
+    """ a stage or sub stage of a run with its wall time, CPU time, peak RSS and item counts """
+    def __init__(self, name, counts={}):
+        self.name = name
+        self.counts = dict(counts)
+        self.children = []
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.rss_start = peak_rss()
+        self.wall = None
+        self.cpu = None
+        self.rss = None
+        self.traced = None
+
+    def count(self, key, n=1):
+        self.counts[key] = self.counts.get(key, 0) + n
+
+    def set(self, key, value):
+        self.counts[key] = value
+
+    def finish(self):
+        self.wall = time.perf_counter() - self.wall_start
+        self.cpu = time.process_time() - self.cpu_start
+        self.rss = peak_rss()
+        if tracemalloc.is_tracing():
+            self.traced = tracemalloc.get_traced_memory()
+
+    def to_json(self):
+        span = {'name' : self.name, 'wall-seconds' : self.wall, 'cpu-seconds' : self.cpu,
+                'peak-rss-bytes' : self.rss, 'counts' : self.counts}
+        if self.rss != None and self.rss_start != None:
+            # growth of the peak RSS during this span
+            span['peak-rss-growth-bytes'] = self.rss - self.rss_start
+        if self.traced != None:
+            span['traced-bytes'], span['traced-peak-bytes'] = self.traced
+        if len(self.children) > 0:
+            span['children'] = [child.to_json() for child in self.children]
+        return span
+
+
+class Tracer:
+    """
+    Nested spans of one run (e.g. the pipeline: tokenization, word2vec, reading, training
+    and evaluation of each task). On finish the spans are written to trace_file as JSON.
+    Optionally the whole run is profiled with cProfile (stats in profile_file) and the
+    allocations are traced with tracemalloc (traced memory per span, top allocations in the trace).
+    """
+    def __init__(self, name='run', trace_file=None, profile_file=None, trace_memory=False):
+        self.trace_file = trace_file
+        self.profile_file = profile_file
+        self.trace_memory = trace_memory
+        self.profiler = None
+        self.root = Span(name)
+        self.stack = [self.root]
+
+    def start(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        if self.profile_file != None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.root = Span(self.root.name)
+        self.stack = [self.root]
+        return self
+
+    def begin(self, name, **counts):
+        span = Span(name, counts)
+        self.stack[-1].children.append(span)
+        self.stack.append(span)
+        return span
+
+    def end(self):
+        self.stack.pop().finish()
+
+    @contextmanager
+    def span(self, name, **counts):
+        span = self.begin(name, **counts)
+        try:
+            yield span
+        finally:
+            # spans left open by an exception in a nested stage are closed as well
+            while self.stack[-1] is not span:
+                self.end()
+            self.end()
+
+    def current(self):
+        return self.stack[-1]
+
+    def finish(self):
+        while len(self.stack) > 1:
+            self.end()
+        self.root.finish()
+        trace = {'trace' : self.root.to_json()}
+        if self.profiler != None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile_file)
+            trace['profile-file'] = self.profile_file
+        if tracemalloc.is_tracing():
+            statistics = tracemalloc.take_snapshot().statistics('lineno')[:25]
+            trace['top-allocations'] = [{'line' : str(s.traceback), 'bytes' : s.size, 'count' : s.count} for s in statistics]
+            tracemalloc.stop()
+        if self.trace_file != None:
+            with open(self.trace_file + '.tmp', 'w') as out_file:
+                json.dump(trace, out_file, indent=4, sort_keys=True)
+            os.replace(self.trace_file + '.tmp', self.trace_file)
+            print('Trace of the run: ' + self.trace_file)
+        return trace
+
+
+# the tracer of the current run, spans outside of a traced run are recorded but never written
+tracer = Tracer()
+
+def span(name, **counts):
+    """ e.g. with span('read', task='pdx') as s: ... s.count('instances', n) """
+    return tracer.span(name, **counts)
+
+def current_span():
+    return tracer.current()
+
+def begin_span(name, **counts):
+    """ opens a span that is closed by end_span, for stages that do not fit a with block (e.g. Keras callbacks) """
+    return tracer.begin(name, **counts)
+
+def end_span():
+    tracer.end()
+
+def start_trace(config, name):
+    """
+    Starts tracing a run as configured: 'trace' writes base_folder/trace_<name>.json,
+    'profile' writes cProfile stats to base_folder/profile_<name>.prof and 'trace-memory'
+    traces the allocations with tracemalloc (slows the run down).
+    """
+    base_folder = config['base_folder']
+    return start_tracer(name, base_folder + 'trace_' + name + '.json' if config['trace'] else None,
+                        base_folder + 'profile_' + name + '.prof' if config['profile'] else None,
+                        config['trace-memory'])
+
+def start_tracer(name, trace_file=None, profile_file=None, trace_memory=False):
+    """ starts tracing a run without a config, e.g. of a command line tool. Call finish on the returned tracer. """
+    global tracer
+    tracer = Tracer(name, trace_file, profile_file, trace_memory).start()
+    return tracer
+
+def traced(name):
+    """ decorator for the run(config) functions of the entry points, the run is traced as configured """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def run(config, *args, **kwargs):
+            if not os.path.exists(config['base_folder']):
+                os.makedirs(config['base_folder'])
+            run_tracer = start_trace(config, name)
+            try:
+                return fn(config, *args, **kwargs)
+            finally:
+                run_tracer.finish()
+        return run
+    return decorator
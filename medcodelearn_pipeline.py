@@ -4,25 +4,153 @@ from subprocess import call
 import json
 from json import encoder
 from sklearn.cross_validation import train_test_split
-from sklearn.externals import joblib
 import numpy as np
 
 from reader.flatvectors.pcreaderflatvectorized import FlatVectorizedPCReader
 from classification.random_forest import train_and_evaluate_random_forest
 from classification.ffnn import train_and_evaluate_ffnn
-from classification.evaluation import adjust_score, plot_oracle, plot_classification_confidence_histograms
+from classification.evaluation import evaluate, adjust_score, plot_oracle, plot_classification_confidence_histograms
 from reader.sequencevectors.pcreadersequencevectorized import SequenceVectorizedPCReader
-from classification.lstm import train_and_evaluate_lstm, pad_sequences
+from classification.lstm import train_and_evaluate_lstm
 from classification.lstmembedding import train_and_evaluate_lstm_with_embedding
 from load_config import load_config
 from reader.sequence.pcreadersequence import SequencePCReader
-import keras.preprocessing.sequence
 
 encoder.FLOAT_REPR = lambda o: format(o, '.8f')
 
-from vectorize import read_code_vectors, read_vectors, create_word2vec_training_data
+from vectorize import create_word2vec_training_data
+from embedding.embeddingstore import open_embedding_store, compile_embedding_store, EmbeddingStore
+from embedding.word2vectrainer import train_embedding_store, update_embedding_store
+from stagecache import StageCache
+from classification.modelbundle import ModelBundle, bundle_folder
+from reader.casestore import CaseStore
+from reader.vocabulary import LabelEncoder
+from types import SimpleNamespace
+from instrumentation import traced, span
 
 
+# config keys each cached stage depends on (see StageCache)
+TOKENIZATION_CONFIG_KEYS = ['use-descriptions', 'tokenizer-german-split-compound-words', 'use-textblob-de',
+                            'only-fr-descriptions', 'only-it-descriptions', 'only-de-fr-descriptions', 'only-de-it-descriptions',
+                            'only-fr-it-descriptions', 'only-de-fr-it-descriptions']
+CORPUS_CONFIG_KEYS = ['shuffle-word2vec-traindata', 'num-shuffles', 'use_demographic_tokens']
+WORD2VEC_CONFIG_KEYS = ['word2vec-cbow', 'word2vec-dim-size']
+READER_CONFIG_KEYS = ['demo-variables', 'use_demographic_tokens', 'use-all-tokens-in-embedding', 'maxlen']
+MODEL_CONFIG_KEYS = ['classifier', 'lstm-layers', 'lstm-activation', 'lstm-init', 'lstm-inner-activation', 'lstm-inner-init', 
+                     'optimizer', 'outlayer-init', 'maxlen', 'word2vec-dim-size', 'use-all-tokens-in-embedding', 'demo-variables']
+
+def create_stage_cache(config):
+    return StageCache(config['cache-folder'], config['use-cache'])
+
+def vectorize_catalogs(config, cache):
+    """ 
+    Tokenization, word2vec training corpus and word2vec vectors (compiled to the embedding store).
+    Each stage is skipped if the cache holds its artifacts for the same inputs.
+    """
+    base_folder = config['base_folder']
+    
+    print("Tokenize catalogs..")
+    if not os.path.exists(base_folder + 'tokenization'):
+        os.makedirs(base_folder + 'tokenization')
+    key = cache.key('tokenization', config, TOKENIZATION_CONFIG_KEYS, 
+                    [config['drg-catalog'], config['chop-catalog'], config['icd-catalog']])
+    with span('tokenization'):
+        cache.run('tokenization', key, 
+                  [config['drg-tokenizations'], config['chop-tokenizations'], config['icd-tokenizations'], config['all-tokens'], config['all-vocab']], 
+                  lambda: tokenize_catalogs(config))
+    
+    print("Vectorize catalogs..")
+    if not os.path.exists(base_folder + 'vectorization'):
+        os.makedirs(base_folder + 'vectorization')
+    store_files = [os.path.join(config['embedding-store'], name) for name in EmbeddingStore.FILES + ['version.json']]
+    train_file = config['training-set-word2vec'] if config['use-training-data-for-word2vec'] else None
+    train_inputs = [config['all-tokens']] + ([train_file] if train_file != None else [])
+    if config['word2vec-incremental'] and EmbeddingStore.exists(config['embedding-store']):
+        # continue training the existing store on the new codes and the training data 
+        # (e.g. only the new months) instead of training from scratch
+        key = cache.key('word2vec-update', config, CORPUS_CONFIG_KEYS + WORD2VEC_CONFIG_KEYS + ['use-training-data-for-word2vec'], train_inputs)
+        with span('word2vec-update'):
+            update_embedding_store(config, train_file, config['embedding-store'], key)
+        return
+    if config['word2vec-backend'] == 'gensim':
+        # in-process training on the corpus streamed from the training data, 
+        # neither the corpus nor the vectors are written as text files
+        key = cache.key('word2vec-gensim', config, CORPUS_CONFIG_KEYS + WORD2VEC_CONFIG_KEYS + ['use-training-data-for-word2vec'], train_inputs)
+        with span('word2vec-gensim'):
+            cache.run('word2vec-gensim', key, store_files, lambda: train_embedding_store(config, train_file, config['embedding-store']))
+        return
+    
+    word2vec_trainset = config['all-tokens']
+    if config['use-training-data-for-word2vec']:
+        word2vec_trainset = base_folder + 'vectorization/train.txt'
+        key = cache.key('word2vec-corpus', config, CORPUS_CONFIG_KEYS, [config['training-set-word2vec'], config['all-tokens']])
+        with span('word2vec-corpus'):
+            cache.run('word2vec-corpus', key, [word2vec_trainset],
+                      lambda: create_word2vec_training_data(config['training-set-word2vec'], config['all-tokens'], 
+                                                            word2vec_trainset,
+                                                            do_shuffle=config['shuffle-word2vec-traindata'],
+                                                            use_n_times=config['num-shuffles'],
+                                                            use_demographic_tokens=config['use_demographic_tokens'],
+                                                            num_workers=config['num-cores']))
+    
+    def train_word2vec():
+        call(["word2vec", "-train", word2vec_trainset, "-binary",
+               "0", "-cbow", '1' if config['word2vec-cbow'] else '0', "-output", config['all-vectors'],
+                "-size", str(config['word2vec-dim-size']), "-save-vocab",
+                config['word2vec-vocab'], "-min-count", "1", "-threads", str(config['num-cores'])])
+        compile_embedding_store(config['all-vectors'], config['all-tokens'], config['embedding-store'])
+    key = cache.key('word2vec', config, WORD2VEC_CONFIG_KEYS, [word2vec_trainset, config['all-tokens']])
+    with span('word2vec'):
+        cache.run('word2vec', key, 
+                  [config['all-vectors'], config['word2vec-vocab']] + store_files, 
+                  train_word2vec)
+
+def load_case_store(config, cache, vectors_by_code):
+    """ the training set parsed once and shared by the readers of all tasks (see CaseStore) """
+    key = cache.key('cases', config, [], 
+                    [config['training-set'], config['training-set-drgs']] + [os.path.join(config['embedding-store'], name) for name in EmbeddingStore.FILES])
+    with span('cases') as cases_span:
+        case_store = cache.load('cases', key)
+        if case_store != None:
+            print("Skip parsing the training set, using cached cases " + key)
+        else:
+            case_store = CaseStore.from_csv(config['training-set'], vectors_by_code, config['training-set-drgs'])
+            cache.save('cases', key, case_store)
+        cases_span.set('cases', len(case_store))
+        cases_span.set('invalid-pdx', case_store.invalid_pdx)
+    return case_store
+
+def read_task(config, cache, task, vectors_by_code, tokens_by_code, vocab, case_store):
+    """ reads the instances of a task. The reader output is cached for the same training data, vectors and options. """
+    reader_type = config['classifier'] if config['classifier'] in ['lstm', 'lstm-embedding'] else 'flat'
+    key = cache.key('reader', config, READER_CONFIG_KEYS, 
+                    [config['training-set'], config['training-set-drgs']] + [os.path.join(config['embedding-store'], name) for name in EmbeddingStore.FILES],
+                    [task, reader_type])
+    output = cache.load('reader', key)
+    if output != None:
+        print("Skip reading, using cached reader output " + key)
+        return SimpleNamespace(**output), key
+    
+    if reader_type == 'lstm':
+        reader = SequenceVectorizedPCReader(config['training-set'])
+    elif reader_type == 'lstm-embedding':
+        reader = SequencePCReader(config['training-set'])
+        reader.tokens_by_code = tokens_by_code
+        reader.vocab = vocab
+        reader.use_demographic_tokens = config['use_demographic_tokens']
+        reader.use_all_tokens = config['use-all-tokens-in-embedding']
+        reader.maxlen = config['maxlen']
+    else:
+        reader = FlatVectorizedPCReader(config['training-set'])
+    reader.case_store = case_store
+    reader.read_from_file(vectors_by_code, task, drg_out_file=config['training-set-drgs'], demo_variables_to_use=config['demo-variables'])
+    output = {'code_type' : reader.code_type, 'data' : reader.data, 'targets' : reader.targets, 'excludes' : reader.excludes, 
+              'demo_data' : reader.demo_data, 'drgs' : reader.drgs, 'vocab' : reader.vocab if reader_type == 'lstm-embedding' else None,
+              'demo_scaler' : getattr(reader, 'demo_scaler', None)}
+    cache.save('reader', key, output)
+    return SimpleNamespace(**output), key
+
+@traced('pipeline')
 def run (config):
     base_folder = config['base_folder']
     
@@ -30,115 +158,101 @@ def run (config):
         print("You can't select more than one language option.")
         return   
     
+    cache = create_stage_cache(config)
     if not config['skip-word2vec']:
-        print("Tokenize catalogs..")
-        if not os.path.exists(base_folder + 'tokenization'):
-            os.makedirs(base_folder + 'tokenization')
-        tokenize_catalogs(config)
-        
-        print("Vectorize catalogs..")
-        if not os.path.exists(base_folder + 'vectorization'):
-            os.makedirs(base_folder + 'vectorization')
-        word2vec_trainset = config['all-tokens']
-        if config['use-training-data-for-word2vec']:
-            create_word2vec_training_data(config['training-set-word2vec'], config['all-tokens'], 
-                                          base_folder + 'vectorization/train.txt',
-                                          do_shuffle=config['shuffle-word2vec-traindata'],
-                                          use_n_times=config['num-shuffles'],
-                                          use_demographic_tokens=config['use_demographic_tokens'])
-            word2vec_trainset = base_folder + 'vectorization/train.txt'
-        call(["word2vec", "-train", word2vec_trainset, "-binary",
-               "0", "-cbow", '1' if config['word2vec-cbow'] else '0', "-output", config['all-vectors'],
-                "-size", str(config['word2vec-dim-size']), "-save-vocab",
-                config['word2vec-vocab'], "-min-count", "1", "-threads", str(config['num-cores'])])
+        vectorize_catalogs(config, cache)
     
     print("\nRead vectors. Assign vectors to codes..")
     # one vector for each token in the vocabulary
-    vector_by_token = read_vectors(config['all-vectors'])
+    with span('embedding-store'):
+        store = open_embedding_store(config['all-vectors'], config['all-tokens'], config['embedding-store'])
+    vector_by_token = store.vector_by_token
     vocab = vector_by_token.keys()
     
     if config['store-everything']:
         json.dump({k: v.tolist() for k, v in vector_by_token.items()}, open(config['all-vectors'] + '.json','w'), indent=4, sort_keys=True)
 
-    res = read_code_vectors(vector_by_token, config['all-tokens'])
-    
     # for each code a list of vectors of its tokens
-    vectors_by_code = res['vectors']
+    vectors_by_code = store.vectors_by_code
     # for each code a list of its tokens
-    tokens_by_code = res['tokens']
+    tokens_by_code = store.tokens_by_code
     # for each code a vector that is the normalized sum of all vectors from all tokens from this code.
-    vector_by_code = res['vector_by_code']
+    vector_by_code = store.vector_by_code
     
     if config['store-everything']:
         json.dump({k: v.tolist() for k, v in vectors_by_code.items()}, open(config['code-vectors'],'w'), sort_keys=True)
-        json.dump(tokens_by_code, open(config['code-tokens'],'w'), indent=4, sort_keys=True)
+        json.dump({k: list(v) for k, v in tokens_by_code.items()}, open(config['code-tokens'],'w'), indent=4, sort_keys=True)
     
     if not os.path.exists(base_folder + 'classification'):
         os.makedirs(base_folder + 'classification')
     total_score = 0.0 
     tasks = ['pdx', 'sdx', 'srg', 'drg']   
+    case_store = load_case_store(config, cache, vectors_by_code)
     for task in tasks:
-        print('\n==== ' + task + ' ====')
-        reader = None
-        if config['classifier'] == 'lstm':
-            reader = SequenceVectorizedPCReader(config['training-set'])
-        elif config['classifier'] == 'lstm-embedding':
-            reader = SequencePCReader(config['training-set'])
-            reader.tokens_by_code = tokens_by_code
-            reader.vocab = vocab
-            reader.use_demographic_tokens = config['use_demographic_tokens']
-            reader.use_all_tokens = config['use-all-tokens-in-embedding']
-        else:
-            reader = FlatVectorizedPCReader(config['training-set'])
-        reader.read_from_file(vectors_by_code, task, drg_out_file=config['training-set-drgs'], demo_variables_to_use=config['demo-variables'])
-        codes = reader.data
-        targets = reader.targets
-        excludes = reader.excludes
-        demo_data = reader.demo_data
-        classes = list(set(targets))
-        y = np.zeros(len(codes), dtype=np.uint)
-        for i, target in enumerate(targets):
-            y[i] = classes.index(target)
-        codes_train, codes_test, demo_train, demo_test, y_train, y_test, _, targets_test, _, excludes_test = train_test_split(codes, demo_data, y, targets, excludes, test_size=0.33, random_state=42)
-        output_dim = len(set(targets))
-        print('Number of classes: ' + str(output_dim))
+        with span(task):
+            print('\n==== ' + task + ' ====')
+            with span('read') as read_span:
+                reader, reader_key = read_task(config, cache, task, vectors_by_code, tokens_by_code, vocab, case_store)
+                read_span.set('instances', len(reader.targets))
+            # only the score of a trained model is cached. Train again if the model has to be stored.
+            model_key = cache.key('model', config, MODEL_CONFIG_KEYS, [], [reader_key])
+            cached_result = None if config['store-everything'] else cache.load('model', model_key)
+            if cached_result != None:
+                print("Skip training, using cached score " + model_key + ": " + str(cached_result['score']))
+                total_score += cached_result['score']
+                continue
+        
+            codes = reader.data
+            targets = reader.targets
+            excludes = reader.excludes
+            demo_data = reader.demo_data
+            classes = LabelEncoder(targets)
+            y = classes.transform(targets)
+            codes_train, codes_test, demo_train, demo_test, y_train, y_test, _, targets_test, _, excludes_test = train_test_split(codes, demo_data, y, targets, excludes, test_size=0.33, random_state=42)
+            output_dim = len(classes)
+            print('Number of classes: ' + str(output_dim))
         
-        model, score = None, 0
-        if config['classifier'] == 'random-forest':
-            print("Training data dimensionality: " + str(codes.shape))
-            print('Train Random Forest for ' + reader.code_type + ' classification task..')
-            model, score = train_and_evaluate_random_forest(config, codes_train, codes_test, y_train, y_test)
-        elif config['classifier'] == 'ffnn':
-            print("Training data dimensionality: " + str(codes.shape))
-            print('Train Feed Forward Neural Net for ' + reader.code_type + ' classification task..')
-            model, scaler, score = train_and_evaluate_ffnn(config, codes_train, codes_test, y_train, y_test, output_dim, task)
-            score = adjust_score(model, scaler, codes_test, classes, targets_test, excludes_test)
-            plot_oracle(config, task, model, scaler, codes_test, classes, targets_test, excludes_test)
-            plot_classification_confidence_histograms(config, task, model, scaler, codes_test, classes, targets_test, excludes_test)
-        elif config['classifier'] == 'lstm':
-            print("Training data dimensionality: " + str(len(codes)) + " | " + str(len(codes[0])) + " | " + str(len(codes[0][0])))
-            print('Train LSTM Neural Net for ' + reader.code_type + ' classification task..')
-            model, scaler, score = train_and_evaluate_lstm(config, codes_train, codes_test, y_train, y_test, output_dim, task)
-            codes_test = pad_sequences(codes_test, maxlen=config['maxlen'], dim=len(codes_train[0][0]))
-            score = adjust_score(model, scaler, codes_test, classes, targets_test, excludes_test)
-        elif config['classifier'] == 'lstm-embedding':
-            print("Training data dimensionality: " + str(len(codes)) + " | " + str(len(codes[0])))
-            print('Train LSTM Neural Net with Embedding for ' + reader.code_type + ' classification task..')
-            vocab = reader.vocab
-            codes_train = keras.preprocessing.sequence.pad_sequences(codes_train, maxlen=config['maxlen'], dtype='int', truncating='pre')
-            codes_test = keras.preprocessing.sequence.pad_sequences(codes_test, maxlen=config['maxlen'], dtype='int', truncating='pre')
+            model, scaler, score = None, None, 0
+            if config['classifier'] == 'random-forest':
+                print("Training data dimensionality: " + str(codes.shape))
+                print('Train Random Forest for ' + reader.code_type + ' classification task..')
+                model, score = train_and_evaluate_random_forest(config, codes_train, codes_test, y_train, y_test)
+            elif config['classifier'] == 'ffnn':
+                print("Training data dimensionality: " + str(codes.shape))
+                print('Train Feed Forward Neural Net for ' + reader.code_type + ' classification task..')
+                model, scaler, score = train_and_evaluate_ffnn(config, codes_train, codes_test, y_train, y_test, output_dim, task)
+                evaluation = evaluate(model, scaler, codes_test, classes, targets_test, excludes_test)
+                score = adjust_score(evaluation)
+                plot_oracle(config, task, evaluation)
+                plot_classification_confidence_histograms(config, task, evaluation)
+            elif config['classifier'] == 'lstm':
+                print("Training data dimensionality: " + str(len(codes)) + " | " + str(len(codes[0])) + " | " + str(len(codes[0][0])))
+                print('Train LSTM Neural Net for ' + reader.code_type + ' classification task..')
+                model, scaler, score = train_and_evaluate_lstm(config, codes_train, codes_test, y_train, y_test, output_dim, task)
+                codes_test = codes_test.pad(config['maxlen'])
+                score = adjust_score(evaluate(model, scaler, codes_test, classes, targets_test, excludes_test))
+            elif config['classifier'] == 'lstm-embedding':
+                print("Training data dimensionality: " + str(len(codes)) + " | " + str(len(codes[0])))
+                print('Train LSTM Neural Net with Embedding for ' + reader.code_type + ' classification task..')
+                # keep vocab (all word2vec tokens) for the readers of the next tasks
+                sequence_vocab = reader.vocab
+                sequence_vocab.save(base_folder + 'classification/vocab_' + task + '.txt')
                  
-            model, score = train_and_evaluate_lstm_with_embedding(config, codes_train, codes_test, demo_train, demo_test, y_train, y_test, output_dim, task, vocab, 
-                                                                  vector_by_token,
-                                                                  vector_by_code)
-            input_test = {'codes_input':codes_test, 'demo_input':demo_test}
-            score = adjust_score(model, None, input_test, classes, targets_test, excludes_test)
-            plot_oracle(config, task, model, None, input_test, classes, targets_test, excludes_test)
-            plot_classification_confidence_histograms(config, task, model, None, input_test, classes, targets_test, excludes_test)
+                model, score = train_and_evaluate_lstm_with_embedding(config, codes_train, codes_test, demo_train, demo_test, y_train, y_test, output_dim, task, sequence_vocab, 
+                                                                      vector_by_token,
+                                                                      vector_by_code)
+                input_test = {'codes_input':codes_test, 'demo_input':demo_test}
+                evaluation = evaluate(model, None, input_test, classes, targets_test, excludes_test)
+                score = adjust_score(evaluation)
+                plot_oracle(config, task, evaluation)
+                plot_classification_confidence_histograms(config, task, evaluation)
 
-        total_score += score
-        if config['store-everything']:
-            joblib.dump(model, base_folder + 'classification/' + config['classifier'] + '.pkl')
+            total_score += score
+            cache.save('model', model_key, {'score' : score})
+            if config['store-everything']:
+                # everything needed to propose codes for new cases with this model (see serving.codeproposer)
+                ModelBundle(config['classifier'], task, model, classes, scaler, getattr(reader, 'demo_scaler', None), 
+                            reader.vocab, store.version).save(bundle_folder(config, task))
     
     total_score /= len(tasks)
     print('Total average score over all tasks: ' + str(total_score))
@@ -1,4 +1,5 @@
-from medcodelearn_pipeline import run
+from sweep import run_sweep
+import copy
 import json
 import os
 import matplotlib as mpl
@@ -23,15 +24,15 @@ if __name__ == '__main__':
     
     json.dump(config, open(base_folder + 'configuration.json','w'), indent=4, sort_keys=True)    
     
-    scores = []
-    params = []
+    trials = []
     for i in range(1, 250, 10):
-        print("Validate parameter " + str(i))
-        config['lstm-layers'][0]['output-size'] = i
-        score = run(config)
-        scores.append(score)
-        params.append(i)
-        plot_scores(params, scores)
+        lstm_layers = copy.deepcopy(config['lstm-layers'])
+        lstm_layers[0]['output-size'] = i
+        trials.append((str(i), {'lstm-layers' : lstm_layers}))
+    results = run_sweep(config, trials, base_folder + 'parameter_validation.jsonl')
+    
+    params = [i for i, score in zip(range(1, 250, 10), results) if score != None]
+    scores = [score for score in results if score != None]
     
     print(params)    
     print(scores)
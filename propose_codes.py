@@ -0,0 +1,70 @@
+import sys
+import json
+import queue
+import threading
+from optparse import OptionParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from serving.codeproposer import CodeProposer, parse_rows, TASKS
+from serving.microbatcher import MicroBatcher
+
+def serve_stdin(batcher):
+    """ one patient case per line from stdin, one JSON line with its proposals per case to stdout (in order) """
+    results = queue.Queue()
+    def output():
+        while True:
+            future = results.get()
+            if future == None:
+                break
+            try:
+                for result in future.result():
+                    print(json.dumps(result), flush=True)
+            except Exception as e:
+                print(json.dumps({'error' : str(e)}), flush=True)
+    printer = threading.Thread(target=output)
+    printer.start()
+    for line in sys.stdin:
+        if line.strip() != '':
+            results.put(batcher.submit(parse_rows([line])))
+    results.put(None)
+    printer.join()
+
+def serve_http(batcher, port):
+    """ POST requests with patient cases (one per line) as body, answered with a JSON list of proposals """
+    class ProposalHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8')
+            try:
+                status, response = 200, batcher.submit(parse_rows([line for line in body.splitlines() if line.strip() != ''])).result()
+            except Exception as e:
+                status, response = 400, {'error' : str(e)}
+            data = json.dumps(response).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+    
+    server = ThreadingHTTPServer(('127.0.0.1', port), ProposalHandler)
+    print('Serving code proposals on http://127.0.0.1:' + str(port) + '/', file=sys.stderr)
+    server.serve_forever()
+
+if __name__ == '__main__':
+    parser = OptionParser(usage="Usage: python propose_codes.py [-c configuration.json] [-t pdx,sdx,srg,drg] [-k 5] [-p port]\n" + 
+                          "   Reads patient cases in the format of the training set from stdin or, with a port, from HTTP POST requests.\n" +
+                          "   The models have to be stored by the pipeline (store-everything).")
+    parser.add_option("-c", "--config", dest="config", default='configuration.json', help="specify configuration file")
+    parser.add_option("-t", "--tasks", dest="tasks", default=','.join(TASKS), help="tasks to propose codes for")
+    parser.add_option("-k", dest="k", type="int", default=5, help="number of proposals per task")
+    parser.add_option("-p", "--port", dest="port", type="int", default=None, help="serve HTTP on this port instead of stdin")
+    parser.add_option("-b", "--batch-size", dest="batch_size", type="int", default=256, help="maximal number of cases per batch")
+    (options, args) = parser.parse_args()
+    
+    config = json.load(open(options.config, 'r'))
+    print("Loading models..", file=sys.stderr)
+    proposer = CodeProposer(config, options.tasks.split(','))
+    batcher = MicroBatcher(lambda rows: proposer.propose(rows, options.k), options.batch_size)
+    if options.port != None:
+        serve_http(batcher, options.port)
+    else:
+        serve_stdin(batcher)
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import csv
+import numpy as np
+from reader.sparsehierarchical.drgreader import DRGReader
+
+class CaseStore:
+    """
+    The patient cases of a training set, parsed once and stored column wise:
+    the case ids, the demographic columns (as in the CSV), the PDX and padded
+    ICD and CHOP code id matrices (-1 = no code). Code ids are rows in self.codes 
+    (e.g. 'ICD_A000') and self.names (e.g. 'A000').
+    Only codes with vectors are kept and cases with an invalid PDX are skipped,
+    exactly like FlatVectorizedPCReader.parse_row does.
+    A store is shared by the readers of all tasks (see FlatVectorizedPCReader.case_store).
+    """
+    DEMOGRAPHIC_FIELDS = ['ageYears', 'ageDays', 'admWeight', 'sex', 'adm', 'sep', 'los', 'sdf', 'hmv']
+    
+    def __init__(self):
+        self.codes = []
+        self.names = []
+        self.code_ids = {}
+        self.invalid_pdx = 0
+        self.drg_by_id = None
+        
+    @classmethod
+    def from_csv(cls, filename, vectors_by_code, drg_out_file=None):
+        store = cls()
+        ids = []
+        demographics = {field : [] for field in cls.DEMOGRAPHIC_FIELDS}
+        pdxs = []
+        diags_by_case = []
+        procs_by_case = []
+        with open(filename, 'r') as csvFile:
+            reader = csv.DictReader(csvFile, fieldnames=DRGReader.FIELDNAMES, restkey=DRGReader.RESTKEY, delimiter=';')
+            for row in reader:
+                pdx = row['pdx'].replace('.', '')
+                # do not use this patient case if the PDX is non existent or invalid
+                if pdx == '' or 'ICD_' + pdx not in vectors_by_code:
+                    store.invalid_pdx += 1
+                    continue
+                diagproc = row[DRGReader.RESTKEY]
+                diags = diagproc[0:DRGReader.MAX_ADDITIONAL_DIAGNOSES]
+                procs = [x.split(':')[0] for x in diagproc[DRGReader.MAX_ADDITIONAL_DIAGNOSES:DRGReader.MAX_ADDITIONAL_DIAGNOSES+DRGReader.MAX_PROCEDURES]]
+                diags = ['ICD_' + d.replace('.', '').upper() for d in diags if d != '']
+                procs = ['CHOP_' + p.replace('.', '').upper() for p in procs if p != '']
+                
+                ids.append(row['id'])
+                for field in cls.DEMOGRAPHIC_FIELDS:
+                    demographics[field].append(row[field])
+                pdxs.append(store.code_id('ICD_' + pdx, len('ICD_')))
+                diags_by_case.append([store.code_id(d, len('ICD_')) for d in diags if d in vectors_by_code])
+                procs_by_case.append([store.code_id(p, len('CHOP_')) for p in procs if p in vectors_by_code])
+                
+        store.ids = np.array(ids)
+        store.demographics = {field : np.array(values) for field, values in demographics.items()}
+        store.pdx = np.array(pdxs, dtype=np.int32)
+        store.diags = pad_code_ids(diags_by_case)
+        store.procs = pad_code_ids(procs_by_case)
+        if drg_out_file != None:
+            store.drg_by_id = read_drg_output(drg_out_file)
+        return store
+    
+    def code_id(self, code, prefix_length):
+        if code not in self.code_ids:
+            self.code_ids[code] = len(self.codes)
+            self.codes.append(code)
+            self.names.append(code[prefix_length:])
+        return self.code_ids[code]
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def cases(self):
+        """ 
+        (row, pdx, diags, procs) for each case, row holds the id and the demographic
+        fields, the codes are without prefix (as in FlatVectorizedPCReader.get_instances).
+        """
+        names = self.names
+        columns = [(field, self.demographics[field].tolist()) for field in self.DEMOGRAPHIC_FIELDS]
+        ids = self.ids.tolist()
+        pdxs = self.pdx.tolist()
+        for i in range(len(ids)):
+            row = {field : values[i] for field, values in columns}
+            row['id'] = ids[i]
+            diags = [names[c] for c in self.diags[i].tolist() if c >= 0]
+            procs = [names[c] for c in self.procs[i].tolist() if c >= 0]
+            yield row, names[pdxs[i]], diags, procs
+    
+
+def pad_code_ids(code_ids_by_case):
+    width = max([len(code_ids) for code_ids in code_ids_by_case] + [0])
+    padded = np.full((len(code_ids_by_case), width), -1, dtype=np.int32)
+    for i, code_ids in enumerate(code_ids_by_case):
+        padded[i, :len(code_ids)] = code_ids
+    return padded
+
+def read_drg_output(drg_out_file):
+    drg_by_id = {}
+    with open(drg_out_file, 'r') as csvFile:
+        reader = csv.DictReader(csvFile, DRGReader.DRG_OUT_FIELDNAMES, delimiter=';')
+        for row in reader:
+            drg_by_id[row['id']] = row['drg']
+    return drg_by_id
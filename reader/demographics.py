@@ -0,0 +1,93 @@
+import numpy as np
+
+# codes of the admission and separation types of the one-hot demographic variables, e.g. 'adm-normal'
+ADM_CODES = {'normal' : '01', 'transfer' : '11', 'transfer-short' : '06', 'unknown' : '99'}
+SEP_CODES = {'normal' : '00', 'transfer' : '06', 'dead' : '07', 'doctor' : '04', 'unknown' : '99'}
+# bucket bounds of the demographic tokens WEIGHT_LT_<bound> (admission weight below the bound)
+# and HMV_GT_<bound> (hours of mechanical ventilation at least the bound)
+WEIGHT_BOUNDS = np.array([750, 1000, 1250, 1500, 2000, 2500, 10000])
+HMV_BOUNDS = np.array([0, 48, 60, 95, 180, 240, 480, 500])
+# the columns of the CSV rows the demographic variables and tokens are computed from
+DEMOGRAPHIC_COLUMNS = ['ageYears', 'ageDays', 'admWeight', 'sex', 'adm', 'sep', 'los', 'hmv']
+
+class DemographicColumns:
+    """
+    The demographic columns (ageYears, ageDays, admWeight, sex, adm, sep, los, hmv) of
+    many patient cases. Each column is parsed once into a typed array (when it is first used)
+    and the demographic variables of the readers and the demographic tokens of the
+    word2vec corpus are computed for all cases at once.
+    """
+    def __init__(self, columns):
+        # field -> values as in the CSV, e.g. CaseStore.demographics
+        self.columns = {field : np.asarray(values, dtype=str) for field, values in columns.items()}
+        self.numbers = {}
+
+    @classmethod
+    def from_rows(cls, rows, fields=DEMOGRAPHIC_COLUMNS):
+        return cls({field : [row[field] for row in rows] for field in fields if len(rows) == 0 or field in rows[0]})
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if len(self.columns) > 0 else 0
+
+    def numeric(self, field, dtype=np.float64):
+        if (field, dtype) not in self.numbers:
+            self.numbers[(field, dtype)] = self.columns[field].astype(dtype)
+        return self.numbers[(field, dtype)]
+
+    def feature(self, var):
+        """ one demographic variable (see reader.flatvectors.pcreaderflatvectorized.DEMO_VARIABLES) of all cases """
+        if var == 'sex':
+            return np.where(np.char.upper(self.columns['sex']) == 'M', 1.0, -1.0)
+        if var[0:3] in ['adm', 'sep']:
+            codes = ADM_CODES if var[0:3] == 'adm' else SEP_CODES
+            if var[4:] not in codes:
+                return np.zeros(len(self))
+            return (self.columns[var[0:3]] == codes[var[4:]]).astype(np.float64)
+        return self.numeric(var)
+
+    def features(self, variables, dtype=np.float32):
+        features = np.empty((len(self), len(variables)), dtype=dtype)
+        for i, var in enumerate(variables):
+            features[:, i] = self.feature(var)
+        return features
+
+    def token_matrix(self, skip_exit_data=False):
+        """ demographic tokens of each case, one column per kind of token, '' where a case has no such token """
+        days = self.numeric('ageDays', np.int64)
+        years = self.numeric('ageYears', np.int64)
+        weight = self.numeric('admWeight', np.int64)
+        hmv = self.numeric('hmv', np.int64)
+        columns = [prefixed('ADM_', self.columns['adm']), prefixed('SEX_', self.columns['sex']),
+                   prefixed('AGE_DAYS_', np.where(days < 30, days, days - days % 10), days > 0),
+                   prefixed('AGE_YEARS_', years, years > 0),
+                   prefixed('AGE_DECADE_', years - years % 10, years > 0)]
+        if not skip_exit_data:
+            columns.append(prefixed('SEP_', self.columns['sep']))
+            columns.append(prefixed('LOS_', np.minimum(self.numeric('los', np.int64), 50)))
+        # the first bound above the weight and the last bound not above the hmv
+        weight_bucket = np.digitize(weight, WEIGHT_BOUNDS)
+        columns.append(prefixed('WEIGHT_LT_', WEIGHT_BOUNDS[np.minimum(weight_bucket, len(WEIGHT_BOUNDS) - 1)],
+                                (weight > 0) & (weight_bucket < len(WEIGHT_BOUNDS))))
+        columns.append(prefixed('HMV_GT_', HMV_BOUNDS[np.maximum(np.digitize(hmv, HMV_BOUNDS) - 1, 0)], hmv > 0))
+        return np.stack(columns, axis=1) if len(self) > 0 else np.empty((0, len(columns)), dtype=str)
+
+    def token_ids(self, skip_exit_data=False):
+        """ the distinct demographic tokens and a matrix of their ids (one column per kind of token, -1 = no token) """
+        matrix = self.token_matrix(skip_exit_data)
+        tokens, ids = np.unique(matrix, return_inverse=True)
+        ids = ids.reshape(matrix.shape).astype(np.int32)
+        if len(tokens) > 0 and tokens[0] == '':
+            tokens, ids = tokens[1:], ids - 1
+        return tokens.tolist(), ids
+
+    def tokens(self, skip_exit_data=False):
+        """ the demographic tokens of each case (same as vectorize.demographic_tokens) """
+        tokens, ids = self.token_ids(skip_exit_data)
+        return [[tokens[i] for i in case_ids if i >= 0] for case_ids in ids.tolist()]
+
+
+def prefixed(prefix, values, present=None):
+    tokens = np.char.add(prefix, np.asarray(values).astype(str))
+    if present is None:
+        return tokens
+    return np.where(present, tokens, '')
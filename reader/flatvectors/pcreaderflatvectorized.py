@@ -1,15 +1,35 @@
 from reader.sparsehierarchical.drgreader import DRGReader
 import csv   
 import numpy as np      
-from vectorize import unitvec
+from collections import Counter
+from vectorize import unitvecs, summed_code_vectors, sum_code_vectors
+from reader.demographics import DemographicColumns
+from instrumentation import current_span
 
 
+DEMO_VARIABLES = ['admWeight', 'hmv', 'sex', 'los', 'ageYears', 
+                  'ageDays', 'adm-normal', 'adm-transfer', 
+                  'adm-transfer-short', 'adm-unknown',
+                  'sep-normal', 'sep-dead', 'sep-doctor',
+                  'sep-unknown', 'sep-transfer']
+
 class FlatVectorizedPCReader(DRGReader):
+    # a reader.casestore.CaseStore of the training set. If set, the cases are
+    # taken from the store instead of parsing the CSV file again for each task.
+    case_store = None
+    # scaler of the demographic variables of the sequence readers. It is fitted in finalize
+    # when reading the training data and reused by read_rows.
+    demo_scaler = None
+    # the instances are rows of one float32 matrix (needed to read them in chunks, see iter_chunks)
+    flat_input = True
+    
     def empty_input(self, dataset):
         return np.empty((len(dataset), self.vector_size), dtype=np.float32)
     
     def init(self):
-        self.vector_size = 2 * len(self.vectors_by_code[list(self.vectors_by_code.keys())[0]][0]) + len(self.demo_variables_to_use)
+        # for each code the summed vectors of all its tokens. Instances are assembled from these rows.
+        self.code_index, self.code_sums = summed_code_vectors(self.vectors_by_code)
+        self.vector_size = 2 * self.code_sums.shape[1] + len(self.demo_variables_to_use)
         self.word2vec_dims = self.vector_size - len(self.demo_variables_to_use)
     
     def finalize(self):
@@ -19,11 +39,88 @@ class FlatVectorizedPCReader(DRGReader):
     def read_from_file(self, vectors_by_code, 
                        code_type = 'pdx', 
                        drg_out_file = None,
-                       demo_variables_to_use= ['admWeight', 'hmv', 'sex', 'los', 'ageYears', 
-                                               'ageDays', 'adm-normal', 'adm-transfer', 
-                                               'adm-transfer-short', 'adm-unknown',
-                                               'sep-normal', 'sep-dead', 'sep-doctor',
-                                               'sep-unknown', 'sep-transfer']):
+                       demo_variables_to_use= DEMO_VARIABLES):
+        self.setup(vectors_by_code, code_type, drg_out_file, demo_variables_to_use)
+        self.demo_scaler = None
+        
+        dataset = []
+        for row, pdx, diags, procs in self.cases():
+            for instance in self.get_instances(row, pdx, diags, procs):
+                dataset.append(instance)
+                if self.drg_by_id != None:
+                    self.drgs.append(self.drg_by_id[row['id']])
+                    
+        self.build(dataset)
+        
+        if self.invalid_pdx > 0:
+            print('Skipped patient cases due to invalid PDX: ' + str(self.invalid_pdx))
+            
+        return {'data' : self.data, 'targets' : self.targets}          
+    
+    def read_rows(self, rows, vectors_by_code, 
+                  code_type = 'pdx',
+                  demo_variables_to_use= DEMO_VARIABLES):
+        """
+        Instances to propose codes for patient cases with unknown targets, e.g. for inference.
+        rows are dicts like the CSV rows of the training set. Each case gets one instance with
+        all its codes (without the PDX for the "pdx" task) and its codes are excluded.
+        The demographic scaler (and vocabulary) of the reader used for training must be set.
+        """
+        self.setup(vectors_by_code, code_type, None, demo_variables_to_use, with_targets=False)
+        cases = []
+        for row in rows:
+            # the encoded demographic variables are added to a copy of the row
+            row, pdx, diags, procs = self.parse_row(dict(row), require_pdx=False)
+            if code_type != 'pdx' and pdx != None:
+                diags = diags + [pdx]
+            cases.append((row, diags, procs))
+        dataset = [self.instance(row, diags, procs, None) for row, diags, procs in self.with_demographics(cases)]
+        self.build(dataset)
+        return {'data' : self.data, 'excludes' : self.excludes}
+    
+    def build(self, dataset):
+        self.data = self.empty_input(dataset)
+        self.fill_input(dataset)
+        self.demo_data = np.empty((len(dataset), len(self.demo_variables_to_use)), dtype=np.float32)
+        self.targets = []
+        self.excludes = []
+        
+        for i, instance in enumerate(dataset):
+            self.targets.append(instance[1])
+            self.excludes.append(instance[2])
+            if len(instance) > 3:
+                self.demo_data[i] = instance[3]
+            
+        self.finalize()
+    
+    def fill_input(self, dataset, block_size=10000):
+        # the instances only hold the code rows. Assemble the vectors block wise.
+        for start in range(0, len(dataset), block_size):
+            block = dataset[start:start + block_size]
+            self.assemble([instance[0] for instance in block], self.data[start:start + len(block)])
+    
+    def assemble(self, codes, out):
+        """
+        Writes the input vectors for many instances into out. codes holds for each
+        instance the ICD rows, the CHOP rows and the demographic values (see instance).
+        """
+        half = int(self.word2vec_dims / 2)
+        out[:, :half] = unitvecs(self.summed([c[0] for c in codes]))
+        out[:, half:self.word2vec_dims] = unitvecs(self.summed([c[1] for c in codes]))
+        out[:, self.word2vec_dims:] = np.array([c[2] for c in codes], dtype=np.float32).reshape((len(codes), len(self.demo_variables_to_use)))
+    
+    def summed(self, parts):
+        # either lists of code rows or already summed vectors (see leave_one_out_instances)
+        precomputed = np.array([isinstance(part, np.ndarray) for part in parts], dtype=bool)
+        if precomputed.all():
+            return np.array(parts, dtype=np.float32).reshape((len(parts), self.code_sums.shape[1]))
+        sums = np.empty((len(parts), self.code_sums.shape[1]), dtype=np.float32)
+        sums[~precomputed] = sum_code_vectors(self.code_sums, [part for part in parts if not isinstance(part, np.ndarray)])
+        if precomputed.any():
+            sums[precomputed] = np.array([part for part in parts if isinstance(part, np.ndarray)])
+        return sums
+    
+    def setup(self, vectors_by_code, code_type, drg_out_file, demo_variables_to_use, with_targets=True):
         # available demographic variables:
         # 'id', 'ageYears', 'ageDays', 'admWeight', 'sex', 'adm', 'sep', 'los', 'sdf', 'hmv'
         self.demo_variables_to_use = demo_variables_to_use
@@ -31,45 +128,179 @@ class FlatVectorizedPCReader(DRGReader):
         self.vectors_by_code = vectors_by_code
         self.invalid_pdx = 0
         self.drg_out_file = drg_out_file
+        self.drg_by_id = None
+        self.drgs = []
         
         self.init();
         
-        if self.code_type == 'drg' or self.code_type == 'los':
+        if with_targets and (self.code_type == 'drg' or self.code_type == 'los'):
             if self.drg_out_file == None:
                 raise ValueError('You must specify a corresponding DRG output file for the "drg" classification task')
-            self.drg_by_id = self.read_drg_output()
-        
-        dataset = []
-        self.drgs = []
+            if self.case_store != None and self.case_store.drg_by_id != None:
+                self.drg_by_id = self.case_store.drg_by_id
+            else:
+                self.drg_by_id = self.read_drg_output()
+    
+    def cases(self, block_size=10000):
+        """ 
+        (row, pdx, diags, procs) for each patient case with a valid PDX. The demographic 
+        variables of the cases are encoded for many cases at once (see encode_demographics).
+        """
+        if self.case_store != None:
+            self.invalid_pdx += self.case_store.invalid_pdx
+            encoded = self.encode_demographics(DemographicColumns(self.case_store.demographics))
+            for i, case in enumerate(self.case_store.cases()):
+                for key, values in encoded.items():
+                    case[0][key] = values[i]
+                yield case
+            return
+        block = []
+        num_rows = 0
+        for row in self.rows():
+            num_rows += 1
+            case = self.parse_row(row)
+            if case != None:
+                block.append(case)
+            if len(block) == block_size:
+                yield from self.with_demographics(block)
+                block = []
+        yield from self.with_demographics(block)
+        # counted in the span of the stage that reads the cases, e.g. 'read' of the pipeline
+        current_span().count('rows-parsed', num_rows)
+    
+    def with_demographics(self, cases):
+        if len(cases) > 0:
+            encoded = self.encode_demographics(DemographicColumns.from_rows([case[0] for case in cases]))
+            for i, case in enumerate(cases):
+                for key, values in encoded.items():
+                    case[0][key] = values[i]
+        return cases
+    
+    def encode_demographics(self, columns):
+        """ values per case that are added to the rows, 'demographic' holds the demographic variables to use """
+        return {'demographic' : columns.features(self.demo_variables_to_use)}
+    
+    def rows(self):
         with open(self.filename, 'r') as csvFile:
             reader = csv.DictReader(csvFile, fieldnames=self.FIELDNAMES, restkey=self.RESTKEY, delimiter=';')
             for row in reader:
-                for instance in self.get_instances_from_row(row):
-                    dataset.append(instance)
-                    if self.drg_by_id != None:
-                        self.drgs.append(self.drg_by_id[row['id']])
-                    
-                    
-        self.data = self.empty_input(dataset)
-        self.demo_data = np.empty((len(dataset), len(self.demo_variables_to_use)), dtype=np.float32)
-        self.targets = []
-        self.excludes = []
+                yield row
+    
+    def iter_chunks(self, vectors_by_code, 
+                    code_type = 'pdx', 
+                    drg_out_file = None,
+                    demo_variables_to_use= DEMO_VARIABLES,
+                    chunk_size=10000,
+                    out=None):
+        """
+        Streams the instances in chunks of chunk_size rows straight from the CSV rows
+        instead of collecting all instances first. Yields dicts with
+        'data' (float32 matrix, demographic variables in the last columns),
+        'demo_data' (view on the demographic columns of 'data'), 'targets', 'excludes'
+        and 'drgs' (only filled for the "drg" and "los" task). The last chunk may be smaller.
+        If out is given (a preallocated array or an np.memmap with enough rows)
+        the chunks are written into it consecutively and 'data' is a view on out.
+        """
+        if not self.flat_input:
+            raise TypeError('Reading in chunks is only supported for flat vector input, not by ' + type(self).__name__)
+        self.setup(vectors_by_code, code_type, drg_out_file, demo_variables_to_use)
         
-        for i, instance in enumerate(dataset):
-            self.data[i] = instance[0]
-            self.targets.append(instance[1])
-            self.excludes.append(instance[2])
-            if len(instance) > 3:
-                self.demo_data[i] = instance[3]
+        offset = 0
+        buffer = None
+        codes, targets, excludes, drgs = [], [], [], []
+        for row, pdx, diags, procs in self.cases():
+            for instance in self.get_instances(row, pdx, diags, procs):
+                if buffer is None:
+                    if out is None:
+                        buffer = np.empty((chunk_size, self.vector_size), dtype=np.float32)
+                    elif offset + chunk_size <= out.shape[0]:
+                        buffer = out[offset:offset + chunk_size]
+                    else:
+                        # the last chunk may only partially fit
+                        buffer = out[offset:]
+                    if buffer.shape[0] == 0:
+                        raise ValueError('Output array with ' + str(out.shape[0]) + ' rows is too small')
+                codes.append(instance[0])
+                targets.append(instance[1])
+                excludes.append(instance[2])
+                if self.drg_by_id != None:
+                    drgs.append(self.drg_by_id[row['id']])
+                if len(targets) == buffer.shape[0]:
+                    self.assemble(codes, buffer)
+                    yield self.chunk(buffer, targets, excludes, drgs)
+                    offset += len(targets)
+                    buffer = None
+                    codes, targets, excludes, drgs = [], [], [], []
+        
+        if len(targets) > 0:
+            self.assemble(codes, buffer[:len(targets)])
+            yield self.chunk(buffer[:len(targets)], targets, excludes, drgs)
         
         if self.invalid_pdx > 0:
             print('Skipped patient cases due to invalid PDX: ' + str(self.invalid_pdx))
             
-        self.finalize()
+    def chunk(self, data, targets, excludes, drgs):
+        return {'data' : data, 'demo_data' : data[:, self.word2vec_dims:],
+                'targets' : targets, 'excludes' : excludes, 'drgs' : drgs}
+    
+    def count_instances(self, vectors_by_code, code_type = 'pdx', drg_out_file = None):
+        """ number of instances for a task without building any vectors, e.g. to allocate an np.memmap """
+        self.setup(vectors_by_code, code_type, drg_out_file, [])
+        count = 0
+        for row, pdx, diags, procs in self.cases():
+            count += len(self.get_instances(row, pdx, diags, procs, lambda row, diags, procs, gt: None))
+        return count
+    
+    def read_into(self, out, vectors_by_code, 
+                  code_type = 'pdx', 
+                  drg_out_file = None,
+                  demo_variables_to_use= DEMO_VARIABLES,
+                  chunk_size=10000):
+        """
+        Like read_from_file but writes the data chunk by chunk into out
+        (a preallocated array or an np.memmap, see count_instances).
+        """
+        self.targets = []
+        self.excludes = []
+        n = 0
+        for chunk in self.iter_chunks(vectors_by_code, code_type, drg_out_file, demo_variables_to_use, chunk_size, out):
+            n += chunk['data'].shape[0]
+            self.targets.extend(chunk['targets'])
+            self.excludes.extend(chunk['excludes'])
+            self.drgs.extend(chunk['drgs'])
+        self.data = out[:n]
+        self.demo_data = self.data[:, self.word2vec_dims:]
+        return {'data' : self.data, 'targets' : self.targets}
+    
+    def generate_batches(self, vectors_by_code, classes,
+                         code_type = 'pdx', 
+                         drg_out_file = None,
+                         demo_variables_to_use= DEMO_VARIABLES,
+                         batch_size=128):
+        """
+        Endless generator of (data, class indices) batches, e.g. for Keras fit_generator.
+        Instances whose target is not in classes are skipped.
+        """
+        class_index = {c : i for i, c in enumerate(classes)}
+        while True:
+            for chunk in self.iter_chunks(vectors_by_code, code_type, drg_out_file, demo_variables_to_use, batch_size):
+                known = [i for i, target in enumerate(chunk['targets']) if target in class_index]
+                if len(known) == 0:
+                    continue
+                y = np.array([class_index[chunk['targets'][i]] for i in known], dtype=np.int32)
+                yield (chunk['data'][known], y)
             
-        return {'data' : self.data, 'targets' : self.targets}          
+    def get_instances_from_row(self, row, instance=None):
+        """ the instances of one CSV row (the reader must be set up, e.g. by read_from_file) """
+        # the encoded demographic variables are added to a copy of the row
+        case = self.parse_row(dict(row))
+        if case == None:
+            return []
+        row, pdx, diags, procs = self.with_demographics([case])[0]
+        return self.get_instances(row, pdx, diags, procs, instance)
     
-    def get_instances_from_row(self, row):
+    def parse_row(self, row, require_pdx=True):
+        """ (row, pdx, diags, procs) of a CSV row or None if the PDX is invalid (pdx is None if not require_pdx) """
         diagproc = row[self.RESTKEY]
         diags = diagproc[0:self.MAX_ADDITIONAL_DIAGNOSES]
         procs = map(lambda x: x.split(':')[0], diagproc[self.MAX_ADDITIONAL_DIAGNOSES:self.MAX_ADDITIONAL_DIAGNOSES+self.MAX_PROCEDURES])
@@ -83,79 +314,88 @@ class FlatVectorizedPCReader(DRGReader):
         # do not use this patient case if the PDX is non existent or invalid
         if pdx == '' or 'ICD_' + pdx not in self.vectors_by_code:
             self.invalid_pdx += 1
-            return []
-             
-        
+            if not require_pdx:
+                return row, None, diags, procs
+            return None
+        return row, pdx, diags, procs
+    
+    def get_instances(self, row, pdx, diags, procs, instance=None):
+        instance = instance or self.instance
         if self.code_type == 'pdx':
-            return [self.instance(row, diags, procs, pdx)]
-        elif self.code_type == 'sdx':
-            return [self.instance(row, [diag for diag in diags if diag != gt] + [pdx], procs, gt) for gt in diags]
-        elif self.code_type == 'srg':
-            return [self.instance(row, diags + [pdx], [proc for proc in procs if proc != gt], gt) for gt in procs]
+            return [instance(row, diags, procs, pdx)]
+        elif self.code_type == 'sdx' or self.code_type == 'srg':
+            if instance == self.instance:
+                return self.leave_one_out_instances(row, diags, procs, pdx)
+            return self.left_out_instances(row, diags, procs, pdx, instance)
         elif self.code_type == 'drg':
-            return [self.instance(row, diags + [pdx], procs, self.drg_by_id[row['id']])]
+            return [instance(row, diags + [pdx], procs, self.drg_by_id[row['id']])]
         elif self.code_type == 'los':
-            return [self.instance(row, diags + [pdx], procs, 'los')]
+            return [instance(row, diags + [pdx], procs, 'los')]
 
         raise ValueError('code_type should be one of "drg", "pdx", "sdx" or "srg" but was ' + self.code_type)
     
+    def left_out_instances(self, row, diags, procs, pdx, instance):
+        """ one instance per secondary diagnosis (sdx) or procedure (srg) without this code """
+        if self.code_type == 'sdx':
+            return [instance(row, [diag for diag in diags if diag != gt] + [pdx], procs, gt) for gt in diags]
+        return [instance(row, diags + [pdx], [proc for proc in procs if proc != gt], gt) for gt in procs]
+    
+    def leave_one_out_instances(self, row, diags, procs, pdx):
+        """
+        Same instances as left_out_instances, but the code vectors are summed only once per
+        patient case. The vector of each instance is this sum minus the left out code
+        (the vectors are normalized later in assemble).
+        """
+        all_diags = diags + [pdx]
+        diag_ids = [self.code_index['ICD_' + diag] for diag in all_diags]
+        proc_ids = [self.code_index['CHOP_' + proc] for proc in procs]
+        diag_sum = self.code_sums[diag_ids].sum(axis=0)
+        proc_sum = self.code_sums[proc_ids].sum(axis=0)
+        demographic = row['demographic']
+        
+        if self.code_type == 'sdx':
+            left_out, left_out_ids, total = diags, diag_ids[:-1], diag_sum
+        else:
+            left_out, left_out_ids, total = procs, proc_ids, proc_sum
+        if len(left_out) == 0:
+            return []
+        # all occurrences of the left out code are removed
+        counts = Counter(left_out)
+        multiplicity = np.array([counts[gt] for gt in left_out], dtype=np.float32)
+        sums = total[np.newaxis, :] - multiplicity[:, np.newaxis] * self.code_sums[left_out_ids]
+        
+        instances = []
+        for i, gt in enumerate(left_out):
+            if self.code_type == 'sdx':
+                excludes = [diag for diag in diags if diag != gt] + [pdx]
+                instances.append([(sums[i], proc_sum, demographic), gt, excludes])
+            else:
+                excludes = [proc for proc in procs if proc != gt]
+                instances.append([(diag_sum, sums[i], demographic), gt, excludes])
+        return instances
+    
     def instance(self, row, diags, procs, gt):
-        data = np.zeros(int(self.word2vec_dims / 2), dtype=np.float32)
+        # the vectors are assembled for many instances at once from the summed code vectors (see assemble)
         excludes = []
-        # sum over all vectors (first vector is the code token)
+        diag_ids = []
         for diag in diags:
             if self.code_type in ['pdx', 'sdx']:
                 excludes.append(diag)
-            for t in self.vectors_by_code['ICD_' + diag]:
-                data += t
-        data = unitvec(data)
+            diag_ids.append(self.code_index['ICD_' + diag])
         
-        data_procedures = np.zeros(int(self.word2vec_dims / 2), dtype=np.float32)
+        proc_ids = []
         for proc in procs:
             if self.code_type == 'srg':
                 excludes.append(proc)
-            for t in self.vectors_by_code['CHOP_' + proc]:
-                data_procedures += t
-                
-        data_procedures = unitvec(data_procedures)
-        data = np.append(data, data_procedures)
-        
-        data.resize(self.vector_size)
+            proc_ids.append(self.code_index['CHOP_' + proc])
         
-        for i, var in enumerate(self.demo_variables_to_use):
-            data[self.word2vec_dims + i] = self.convert_demographic_variable(row, var)
+        demographic = row['demographic']
         
-        return [data, gt, excludes]
+        return [(diag_ids, proc_ids, demographic), gt, excludes]
     
     def convert_demographic_variable(self, row, var):
-        value = row[var[0:3]] if var[0:3] in ['adm', 'sep'] else row[var]
-        if var == 'sex':
-            return 1.0 if value.upper() == 'M' else -1.0
-        if var[0:3] == 'adm':
-            if var[4:] == 'normal' and value == '01':
-                return 1.0
-            elif var[4:] == 'transfer' and value == '11':
-                return 1.0
-            elif var[4:] == 'transfer-short' and value== '06':
-                return 1.0
-            elif var[4:] == 'unknown' and value == '99':
-                return 1.0
-            else:
-                return 0.0
-        if var[0:3] == 'sep':
-            if var[4:] == 'normal' and value == '00':
-                return 1.0
-            elif var[4:] == 'transfer' and value == '06':
-                return 1.0
-            elif var[4:] == 'dead' and value== '07':
-                return 1.0
-            elif var[4:] == 'doctor' and value== '04':
-                return 1.0
-            elif var[4:] == 'unknown' and value == '99':
-                return 1.0
-            else:
-                return 0.0
-        return float(value)
+        """ one demographic variable of one case, see reader.demographics for many cases """
+        return float(DemographicColumns.from_rows([row], [var[0:3] if var[0:3] in ['adm', 'sep'] else var]).feature(var)[0])
     
     def read_drg_output(self):
         drg_by_id = {}
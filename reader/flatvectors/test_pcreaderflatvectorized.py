@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+import unittest
+import tempfile
+import os
+import numpy as np
+from reader.flatvectors.pcreaderflatvectorized import FlatVectorizedPCReader
+from reader.sequence.pcreadersequence import SequencePCReader
+from vectorize import unitvec
+
+DEMO_VARIABLES = ['sex', 'adm-normal', 'los']
+
+def write_cases(filename):
+    # demographic columns and PDX, secondary diagnoses, procedures
+    cases = [(['1', '32', '0', '2400', 'W', '99', '04', '51', '0', '0', 'A00'], ['D40', ''], ['C30:L', 'E11']),
+             (['2', '67', '0', '900', 'M', '01', '07', '2', '0', '0', 'ZZZ'], ['A00'], []),
+             (['3', '45', '0', '3000', 'M', '11', '00', '7', '0', '0', 'D40'], ['A00', 'A00', 'E11'], ['C30', 'E11', 'C30']),
+             (['4', '80', '0', '3100', 'W', '01', '00', '12', '0', '0', 'E11'], ['D40', 'A00', 'D40'], ['C.30', 'Z99'])]
+    with open(filename, 'w') as out_file:
+        for row, diags, procs in cases:
+            # 99 secondary diagnoses and 100 procedures
+            row = row + diags + [''] * (99 - len(diags)) + procs + [''] * (100 - len(procs))
+            print(';'.join(row), file=out_file)
+
+# the cases of write_cases with a valid PDX: PDX, secondary diagnoses, procedures and DEMO_VARIABLES
+VALID_CASES = [('A00', ['D40'], ['C30', 'E11'], [-1, 0, 51]),
+               ('D40', ['A00', 'A00', 'E11'], ['C30', 'E11', 'C30'], [1, 0, 7]),
+               ('E11', ['D40', 'A00', 'D40'], ['C30'], [-1, 1, 12])]
+
+def token_sum_instance(vectors_by_code, diags, procs, demographic):
+    """ the input vector summed token by token (as before the precomputed code sums) """
+    diag_sum = sum([t for diag in diags for t in vectors_by_code['ICD_' + diag]], np.zeros(2))
+    proc_sum = sum([t for proc in procs for t in vectors_by_code['CHOP_' + proc]], np.zeros(2))
+    return np.concatenate([unitvec(diag_sum), unitvec(proc_sum), demographic])
+
+class TestFlatVectorizedPCReader(unittest.TestCase):
+    def setUp(self):
+        self.filename = os.path.join(tempfile.mkdtemp(), 'cases.csv')
+        write_cases(self.filename)
+        self.vectors_by_code = {'ICD_A00' : [np.ones(2)], 'ICD_D40' : [np.array([1.0, -1.0])], 
+                                'ICD_E11' : [np.array([0.5, 2.0]), np.array([1.0, 0.0])],
+                                'CHOP_C30' : [np.array([-1.0, 3.0])], 'CHOP_E11' : [np.array([2.0, 1.0])]}
+        
+    def read_from_file(self, code_type):
+        reader = FlatVectorizedPCReader(self.filename)
+        reader.read_from_file(self.vectors_by_code, code_type, demo_variables_to_use=DEMO_VARIABLES)
+        return reader
+        
+    def test_iter_chunks(self):
+        for code_type in ['pdx', 'sdx', 'srg']:
+            expected = self.read_from_file(code_type)
+            self.assertGreater(len(expected.targets), 2)
+            chunks = list(FlatVectorizedPCReader(self.filename).iter_chunks(self.vectors_by_code, code_type, 
+                                                                              demo_variables_to_use=DEMO_VARIABLES, chunk_size=2))
+            self.assertTrue(all([len(chunk['targets']) == 2 for chunk in chunks[:-1]]))
+            self.assertListEqual([t for chunk in chunks for t in chunk['targets']], expected.targets)
+            self.assertListEqual([e for chunk in chunks for e in chunk['excludes']], expected.excludes)
+            np.testing.assert_array_equal(np.concatenate([chunk['data'] for chunk in chunks]), expected.data)
+            np.testing.assert_array_equal(chunks[0]['demo_data'], expected.data[:2, -len(DEMO_VARIABLES):])
+        
+    def test_read_into(self):
+        expected = self.read_from_file('sdx')
+        reader = FlatVectorizedPCReader(self.filename)
+        count = reader.count_instances(self.vectors_by_code, 'sdx')
+        self.assertEqual(count, len(expected.targets))
+        out = np.zeros((count + 1, expected.data.shape[1]), dtype=np.float32)
+        reader.read_into(out, self.vectors_by_code, 'sdx', demo_variables_to_use=DEMO_VARIABLES, chunk_size=2)
+        self.assertListEqual(reader.targets, expected.targets)
+        np.testing.assert_array_equal(reader.data, expected.data)
+        np.testing.assert_array_equal(out[count], 0)
+        
+        too_small = np.zeros((count - 1, expected.data.shape[1]), dtype=np.float32)
+        with self.assertRaises(ValueError):
+            reader.read_into(too_small, self.vectors_by_code, 'sdx', demo_variables_to_use=DEMO_VARIABLES, chunk_size=2)
+        
+    def test_generate_batches(self):
+        expected = self.read_from_file('sdx')
+        classes = sorted(set(expected.targets))[1:]
+        batches = FlatVectorizedPCReader(self.filename).generate_batches(self.vectors_by_code, classes, 'sdx', 
+                                                                         demo_variables_to_use=DEMO_VARIABLES, batch_size=2)
+        known = [i for i, target in enumerate(expected.targets) if target in classes]
+        data, y = [], []
+        while len(y) < len(known):
+            batch = next(batches)
+            data.append(batch[0])
+            y.extend(batch[1].tolist())
+        self.assertListEqual(y, [classes.index(expected.targets[i]) for i in known])
+        np.testing.assert_array_equal(np.concatenate(data), expected.data[known])
+        
+    def test_token_sums(self):
+        reader = self.read_from_file('pdx')
+        expected = [token_sum_instance(self.vectors_by_code, diags, procs, demographic) for _, diags, procs, demographic in VALID_CASES]
+        self.assertListEqual(reader.targets, [pdx for pdx, _, _, _ in VALID_CASES])
+        np.testing.assert_allclose(reader.data, expected, rtol=1e-6)
+        
+    def test_leave_one_out(self):
+        # all occurrences of the left out code are removed, also of repeated codes (e.g. A00 and C30 of the second case)
+        expected = {'sdx' : [(gt, token_sum_instance(self.vectors_by_code, [diag for diag in diags if diag != gt] + [pdx], procs, demographic),
+                              [diag for diag in diags if diag != gt] + [pdx])
+                             for pdx, diags, procs, demographic in VALID_CASES for gt in diags],
+                    'srg' : [(gt, token_sum_instance(self.vectors_by_code, diags + [pdx], [proc for proc in procs if proc != gt], demographic),
+                              [proc for proc in procs if proc != gt])
+                             for pdx, diags, procs, demographic in VALID_CASES for gt in procs]}
+        for code_type in ['sdx', 'srg']:
+            reader = self.read_from_file(code_type)
+            self.assertListEqual(reader.targets, [gt for gt, _, _ in expected[code_type]])
+            self.assertListEqual(reader.excludes, [excludes for _, _, excludes in expected[code_type]])
+            np.testing.assert_allclose(reader.data, [data for _, data, _ in expected[code_type]], rtol=1e-5, atol=1e-6)
+        
+    def test_instances_from_row(self):
+        reader = self.read_from_file('sdx')
+        rows = list(reader.rows())
+        self.assertListEqual(reader.get_instances_from_row(rows[1]), [])
+        instances = [instance for row in rows for instance in reader.get_instances_from_row(row)]
+        self.assertListEqual([instance[1] for instance in instances], reader.targets)
+        reader.fill_input(instances)
+        np.testing.assert_array_equal(reader.data, self.read_from_file('sdx').data)
+        self.assertNotIn('demographic', rows[0])
+        
+    def test_sequences_not_in_chunks(self):
+        with self.assertRaises(TypeError):
+            next(SequencePCReader(self.filename).iter_chunks(self.vectors_by_code, 'sdx'))
+
+if __name__ == '__main__':
+    unittest.main()
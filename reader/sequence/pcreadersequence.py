@@ -1,5 +1,6 @@
 from reader.flatvectors.pcreaderflatvectorized import FlatVectorizedPCReader
-from vectorize import demographic_tokens
+from reader.vocabulary import Vocabulary
+from itertools import chain
 import numpy as np
 from sklearn import preprocessing
 
@@ -8,40 +9,54 @@ class SequencePCReader(FlatVectorizedPCReader):
     tokens_by_code = None
     use_demographic_tokens = False
     vocab = None
+    # sequences are padded (and truncated at the front) to this length, None pads to the longest sequence
+    maxlen = None
+    # if set, the vocabulary of the sequences is not built from the data (e.g. for inference)
+    # and unknown tokens are dropped
+    fixed_vocab = False
+    flat_input = False
     
     def init(self):
         pass
     
     def finalize(self):
-        # replace codes with indices
-        input_set = set()
-        for sample in self.data:
-            for code in sample:
-                input_set.add(code)
-        self.vocab = ['mask'] + list(input_set)
-        for i, codes in enumerate(self.data):
-            code_indices = []
-            for code in codes:
-                code_indices.append(self.vocab.index(code))
-            self.data[i] = code_indices
+        # replace codes with indices in a padded int32 matrix
+        if self.fixed_vocab:
+            self.data = [[t for t in sequence if t in self.vocab] for sequence in self.data]
+        else:
+            self.vocab = Vocabulary(sorted(set(chain.from_iterable(self.data))))
+        self.data = self.vocab.encode(self.data, maxlen=self.maxlen, truncating='pre')
             
         # norm demo data
-        scaler = preprocessing.MaxAbsScaler().fit(self.demo_data)
-        self.demo_data = scaler.transform(self.demo_data)
+        if self.demo_scaler == None:
+            self.demo_scaler = preprocessing.MaxAbsScaler().fit(self.demo_data)
+        self.demo_data = self.demo_scaler.transform(self.demo_data)
+     
+    def encode_demographics(self, columns):
+        encoded = super().encode_demographics(columns)
+        if self.use_demographic_tokens:
+            encoded['demographic_tokens'] = columns.tokens(self.code_type == 'los')
+        return encoded
      
     def empty_input(self, dataset):
         # Use this if padding is done in the reader
         # return np.empty((len(dataset), 15, self.vector_size), dtype=np.float32)         
         return [None] * len(dataset)
     
+    def fill_input(self, dataset):
+        for i, instance in enumerate(dataset):
+            self.data[i] = instance[0]
+    
+    def leave_one_out_instances(self, row, diags, procs, pdx):
+        # the sequences do not sum over the codes. Build each instance on its own.
+        return self.left_out_instances(row, diags, procs, pdx, self.instance)
+    
     def instance(self, row, diags, procs, gt):
-        sequence = demographic_tokens(row, self.code_type == 'los') if self.use_demographic_tokens else []
+        sequence = row['demographic_tokens'] if self.use_demographic_tokens else []
         # remove tokens that have not been in the training set for word2vec
         sequence = [t for t in sequence if t in self.vocab]
         
-        demographic = np.zeros(len(self.demo_variables_to_use), dtype=np.float32)
-        for i, var in enumerate(self.demo_variables_to_use):
-            demographic[i] = self.convert_demographic_variable(row, var)
+        demographic = row['demographic']
         
         excludes = []
         for diag in diags:
@@ -1,57 +1,52 @@
 import numpy as np      
-from vectorize import unitvec
+from vectorize import unitvecs, summed_code_vectors
 from reader.flatvectors.pcreaderflatvectorized import FlatVectorizedPCReader
+from reader.sequencevectors.raggedsequences import RaggedSequences
 from sklearn import preprocessing
 
 # Sequence to Flat classification
 class SequenceVectorizedPCReader(FlatVectorizedPCReader):
+    flat_input = False
+    
     def init(self):
-        self.vector_size = len(self.vectors_by_code[list(self.vectors_by_code.keys())[0]][0]) + len(self.demo_variables_to_use)
+        # for each code the normalized sum of all its token vectors
+        self.code_index, code_sums = summed_code_vectors(self.vectors_by_code)
+        self.code_vectors = unitvecs(code_sums).astype(np.float32)
+        self.vector_size = self.code_vectors.shape[1] + len(self.demo_variables_to_use)
         self.word2vec_dims = self.vector_size - len(self.demo_variables_to_use)
-        self.demo_vars = []
     
     def finalize(self):
-        demos = np.empty((len(self.demo_vars), self.vector_size), dtype=np.float32)
-        for i, demo in enumerate(self.demo_vars):
-            demos[i] = demo
-        scaler = preprocessing.MaxAbsScaler().fit(demos)
-        demos = scaler.transform(demos) 
-        for i, demo in enumerate(demos):
-            self.data[i][0] = demo
+        if self.demo_scaler == None:
+            self.demo_scaler = preprocessing.MaxAbsScaler().fit(self.demo_data)
+        self.demo_data = self.demo_scaler.transform(self.demo_data).astype(np.float32)
+        self.data.demo = self.demo_data
      
     def empty_input(self, dataset):
-        # Use this if padding is done in the reader
-        # return np.empty((len(dataset), 15, self.vector_size), dtype=np.float32)         
-        return [None] * len(dataset)
+        return None
+    
+    def fill_input(self, dataset):
+        # the demographic variables are set in finalize
+        self.data = RaggedSequences.from_code_ids(self.code_vectors, [instance[0] for instance in dataset], 
+                                                  np.zeros((len(dataset), len(self.demo_variables_to_use)), dtype=np.float32))
+    
+    def leave_one_out_instances(self, row, diags, procs, pdx):
+        # the sequences do not sum over the codes. Build each instance on its own.
+        return self.left_out_instances(row, diags, procs, pdx, self.instance)
     
     def instance(self, row, diags, procs, gt):
-        sequence = []
-        demographic = np.zeros(self.vector_size, dtype=np.float32)
-        for i, var in enumerate(self.demo_variables_to_use):
-            demographic[self.word2vec_dims + i] = self.convert_demographic_variable(row, var)
-        sequence.append(demographic)
-        self.demo_vars.append(demographic)
+        # the code rows of the sequence, the demographic variables are stored once per sequence
+        demographic = row['demographic']
         
         excludes = []
+        code_ids = []
         for diag in diags:
-            data = np.zeros(self.word2vec_dims, dtype=np.float32)
             if self.code_type in ['pdx', 'sdx']:
                 excludes.append(diag)
-            for t in self.vectors_by_code['ICD_' + diag]:
-                data += t
-            data = unitvec(data)
-            data.resize(self.vector_size)
-            sequence.append(data)
+            code_ids.append(self.code_index['ICD_' + diag])
         
         for proc in procs:
-            data = np.zeros(self.word2vec_dims, dtype=np.float32)
             if self.code_type == 'srg':
                 excludes.append(proc)
-            for t in self.vectors_by_code['CHOP_' + proc]:
-                data += t
-            data = unitvec(data)
-            data.resize(self.vector_size)
-            sequence.append(data)  
+            code_ids.append(self.code_index['CHOP_' + proc])
         
-        return [sequence, gt, excludes]
-    
+        return [code_ids, gt, excludes, demographic]
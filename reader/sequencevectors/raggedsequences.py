@@ -0,0 +1,97 @@
+import numpy as np
+from reader.vocabulary import pad_flat_sequences
+
+class RaggedSequences:
+    """
+    The input sequences of the vectorized sequence reader without padding: the code vectors
+    of all sequences back to back in one float32 buffer (sequence i has the rows
+    values[offsets[i]:offsets[i + 1]]) and the demographic variables once per sequence (demo).
+    As LSTM input each sequence is one demographic timestep (zero code vector) followed by
+    one timestep per code (zero demographic variables), see pad.
+    Indexing with an integer gives these timesteps of one sequence, indexing with a slice
+    gives views and with an index array a copy of the selected sequences. len() and shape
+    make it usable with train_test_split.
+    """
+    def __init__(self, values, offsets, demo):
+        self.values = values
+        self.offsets = offsets
+        self.demo = demo
+        self.vector_size = values.shape[1] + demo.shape[1]
+
+    @classmethod
+    def from_code_ids(cls, code_vectors, code_ids_by_sequence, demo):
+        """ gathers the code vectors of all sequences in one step """
+        lengths = np.array([len(code_ids) for code_ids in code_ids_by_sequence], dtype=np.int64)
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        code_ids = np.fromiter((c for code_ids in code_ids_by_sequence for c in code_ids), dtype=np.int64, count=offsets[-1])
+        return cls(code_vectors[code_ids], offsets, demo)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def shape(self):
+        return (len(self), None, self.vector_size)
+
+    def lengths(self):
+        """ number of timesteps of each sequence, including the demographic timestep """
+        return np.diff(self.offsets) + 1
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple) and all([k is Ellipsis for k in key[1:]]):
+            key = key[0]
+        if isinstance(key, (int, np.integer)):
+            key = int(key) + len(self) if key < 0 else int(key)
+            if key < 0 or key >= len(self):
+                raise IndexError('sequence index out of range')
+            return self.timesteps(key)
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                stop = max(start, stop)
+                return RaggedSequences(self.values[self.offsets[start]:self.offsets[stop]],
+                                       self.offsets[start:stop + 1] - self.offsets[start], self.demo[start:stop])
+            key = np.arange(start, stop, step)
+        key = np.asarray(key)
+        if key.dtype == bool:
+            key = np.flatnonzero(key)
+        starts = self.offsets[key]
+        lengths = self.offsets[key + 1] - starts
+        offsets = np.zeros(len(key) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        rows = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return RaggedSequences(self.values[rows], offsets, self.demo[key])
+
+    def take(self, indices, axis=0):
+        return self[np.asarray(indices)]
+
+    def timesteps(self, i):
+        sequence = np.zeros((self.offsets[i + 1] - self.offsets[i] + 1, self.vector_size), dtype=self.values.dtype)
+        sequence[0, self.values.shape[1]:] = self.demo[i]
+        sequence[1:, :self.values.shape[1]] = self.values[self.offsets[i]:self.offsets[i + 1]]
+        return sequence
+
+    def pad(self, maxlen=None, dtype=np.float32, padding='pre', truncating='post'):
+        """
+        The (sequences, maxlen, vector_size) LSTM input, allocated once (same semantics as
+        classification.lstm.pad_sequences on the timesteps). maxlen None pads to the longest sequence.
+        """
+        lengths = self.lengths()
+        num_values = self.offsets[-1]
+        # 1 + row in values for the code timesteps, 1 + num_values + sequence for the demographic timesteps
+        timestep_ids = np.empty(num_values + len(self), dtype=np.int64)
+        demo_positions = self.offsets[:-1] + np.arange(len(self))
+        is_demo = np.zeros(len(timestep_ids), dtype=bool)
+        is_demo[demo_positions] = True
+        timestep_ids[is_demo] = 1 + num_values + np.arange(len(self))
+        timestep_ids[~is_demo] = 1 + np.arange(num_values)
+        ids = pad_flat_sequences(timestep_ids, lengths, maxlen, padding, truncating, dtype=np.int64)
+
+        x = np.zeros(ids.shape + (self.vector_size,), dtype=dtype)
+        dims = self.values.shape[1]
+        codes = (ids > 0) & (ids <= num_values)
+        x[codes, :dims] = self.values[ids[codes] - 1]
+        demos = ids > num_values
+        x[demos, dims:] = self.demo[ids[demos] - 1 - num_values]
+        return x
@@ -0,0 +1,33 @@
+import unittest
+import numpy as np
+from reader.sequencevectors.raggedsequences import RaggedSequences
+
+class TestRaggedSequences(unittest.TestCase):
+    def setUp(self):
+        code_vectors = np.arange(10, dtype=np.float32).reshape((5, 2))
+        demo = np.array([[0.5], [1.0], [-1.0]], dtype=np.float32)
+        self.sequences = RaggedSequences.from_code_ids(code_vectors, [[1, 4], [], [2, 0, 3]], demo)
+    
+    def test_timesteps(self):
+        self.assertEqual(len(self.sequences), 3)
+        self.assertListEqual(self.sequences.lengths().tolist(), [3, 1, 4])
+        np.testing.assert_array_equal(self.sequences[0], [[0, 0, 0.5], [2, 3, 0], [8, 9, 0]])
+        np.testing.assert_array_equal(self.sequences[1], [[0, 0, 1.0]])
+    
+    def test_pad(self):
+        x = self.sequences.pad(3)
+        self.assertEqual(x.shape, (3, 3, 3))
+        self.assertEqual(x.dtype, np.float32)
+        np.testing.assert_array_equal(x[0], self.sequences[0])
+        np.testing.assert_array_equal(x[1], [[0, 0, 0], [0, 0, 0], [0, 0, 1.0]])
+        # truncated at the end
+        np.testing.assert_array_equal(x[2], self.sequences[2][:3])
+        
+    def test_select(self):
+        np.testing.assert_array_equal(self.sequences[[2, 0]].pad(4), self.sequences.pad(4)[[2, 0]])
+        view = self.sequences[1:]
+        self.assertTrue(np.shares_memory(view.values, self.sequences.values))
+        np.testing.assert_array_equal(view.pad(4), self.sequences.pad(4)[1:])
+
+if __name__ == '__main__':
+    unittest.main()
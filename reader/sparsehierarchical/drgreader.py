@@ -16,20 +16,79 @@ class DRGReader:
         self.drg_trainingset = DRGTrainingSet()
 
     def read_from_file(self):
+        for instance in self.read_instances():
+            self.drg_trainingset.add_drg_training_instance(instance)
+        return self.drg_trainingset
+    
+    def read_instances(self, cases=None):
+        """ 
+        Streams the instances of the CSV file without keeping them in memory. 
+        With cases, a function of the case index, only the cases it is true for are read.
+        """
         with open(self.filename, 'r') as csvFile:
             reader = csv.DictReader(csvFile, fieldnames=self.FIELDNAMES, restkey=self.RESTKEY, delimiter=';')
-            for row in reader:
-                for instance in self.get_drg_instances_from_row(row):
-                    self.drg_trainingset.add_drg_training_instance(instance)
-        return self.drg_trainingset
+            for i, row in enumerate(reader):
+                if cases == None or cases(i):
+                    for instance in self.get_drg_instances_from_row(row):
+                        yield instance
+    
+    def read_batches(self, batch_size, cases=None):
+        """ lists of at most batch_size instances, see read_instances """
+        batch = []
+        for instance in self.read_instances(cases):
+            batch.append(instance)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if len(batch) > 0:
+            yield batch
     
+    def parse_codes(self, row):
+        diagproc = row[self.RESTKEY] or []
+        diags = [d.replace('.', '').upper() for d in diagproc[0:self.MAX_ADDITIONAL_DIAGNOSES] if d != '']
+        procs = [p.split(':')[0].replace('.', '').upper() for p in diagproc[self.MAX_ADDITIONAL_DIAGNOSES:self.MAX_ADDITIONAL_DIAGNOSES+self.MAX_PROCEDURES]]
+        procs = [p for p in procs if p != '']
+        return row['pdx'].replace('.', '').upper(), diags, procs
           
 
+class DRGTaskReader(DRGReader):
+    """
+    The instances of the classification tasks (same as FlatVectorizedPCReader.get_instances): 
+    "pdx" one per case with the PDX as target, "sdx"/"srg" one per secondary diagnosis/procedure 
+    which is left out and is the target (all occurrences of a repeated code are left out, 
+    each occurrence gives an instance), "drg" one per case with the DRG (drg_by_id) as target.
+    Cases without PDX are skipped.
+    """
+    def __init__(self, filename, code_type, drg_by_id=None):
+        super().__init__(filename)
+        if code_type not in ['pdx', 'sdx', 'srg', 'drg']:
+            raise ValueError('code_type should be one of "drg", "pdx", "sdx" or "srg" but was ' + code_type)
+        if code_type == 'drg' and drg_by_id == None:
+            raise ValueError('You must specify the DRGs of the cases for the "drg" classification task')
+        self.code_type = code_type
+        self.drg_by_id = drg_by_id
+        
+    def get_drg_instances_from_row(self, row):
+        pdx, diags, procs = self.parse_codes(row)
+        if pdx == '':
+            return []
+        infos = [row[fieldname] for fieldname in self.FIELDNAMES]
+        if self.code_type == 'pdx':
+            return [DRGTrainingInstance(infos, diags, procs, pdx)]
+        elif self.code_type == 'sdx':
+            return [DRGTrainingInstance(infos, [diag for diag in diags if diag != gt] + [pdx], procs, gt) for gt in diags]
+        elif self.code_type == 'srg':
+            return [DRGTrainingInstance(infos, diags + [pdx], [proc for proc in procs if proc != gt], gt) for gt in procs]
+        return [DRGTrainingInstance(infos, diags + [pdx], procs, self.drg_by_id[row['id']])]
+
+
 class DRGCodeProposalReader(DRGReader):
     def get_drg_instances_from_row(self, row):
         diagproc = row[self.RESTKEY]
-        diags = diagproc[0:self.MAX_ADDITIONAL_DIAGNOSES] + row['pdx']
-        procs = diagproc[self.MAX_ADDITIONAL_DIAGNOSES:self.MAX_ADDITIONAL_DIAGNOSES+self.MAX_PROCEDURES]
+        diags = diagproc[0:self.MAX_ADDITIONAL_DIAGNOSES] + [row['pdx']]
+        procs = [p.split(':')[0] for p in diagproc[self.MAX_ADDITIONAL_DIAGNOSES:self.MAX_ADDITIONAL_DIAGNOSES+self.MAX_PROCEDURES]]
+        diags = [d for d in diags if d != '']
+        procs = [p for p in procs if p != '']
         infos = [row[fieldname] for fieldname in self.FIELDNAMES]        
         #print(' '.join([row['id'],row['sex'],diags[0],procs[0]])) # TODO: Delete this line.
         
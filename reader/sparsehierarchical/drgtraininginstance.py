@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+from reader.sparsehierarchical.prefixfeatures import code_prefixes
+
 class DRGTrainingInstance:
     def __init__(self, infos, diags, procs, gt=None):
         self.diags = diags
@@ -6,14 +8,15 @@ class DRGTrainingInstance:
         self.gt = gt
         
         self.sparse_hierarchically_coded_features = None
-        self.contained_hierarchically_coded_feature_names = None
+    
+    def codes(self):
+        return self.diags + self.procs
                     
     def get_sparse_hierarchically_coded_features(self):
         if self.sparse_hierarchically_coded_features:
             return self.sparse_hierarchically_coded_features
         
         self.sparse_hierarchically_coded_features = {}
-        self.contained_hierarchically_coded_feature_names =  []
         for diag in self.diags:
             self.add_code(diag, 1)
             
@@ -23,32 +26,16 @@ class DRGTrainingInstance:
         return self.sparse_hierarchically_coded_features
         
     def get_contained_hierarchically_coded_feature_names(self):
-        if not self.contained_hierarchically_coded_feature_names:
-            self.get_contained_hierarchically_coded_feature_names
-        return self.contained_hierarchically_coded_feature_names
+        return list(self.get_sparse_hierarchically_coded_features().keys())
 
     def get_hierarchically_coded_features_and_targets(self, all_hierarchically_coded_feature_names):
-        return (self.get_full_hierarchically_coded_features, self.gt)
-
+        return (self.get_full_hierarchically_coded_features(all_hierarchically_coded_feature_names), self.gt)
 
     def get_full_hierarchically_coded_features(self, all_hierarchically_coded_feature_names):
-        full_hierarchically_coded_features = dict(self.sparse_hierarchically_coded_features)
-        for code in all_hierarchically_coded_feature_names:
-            if code not in self.contained_hierarchically_coded_feature_names:
-                full_hierarchically_coded_features[code] = 0
-        return full_hierarchically_coded_features                    
+        """ dense features, use DRGTrainingSet.get_hierarchically_coded_features_and_targets for many instances """
+        sparse_features = self.get_sparse_hierarchically_coded_features()
+        return {code : sparse_features.get(code, 0) for code in all_hierarchically_coded_feature_names}
             
     def add_code(self, code, weight):
-        code = code.upper().replace(' ', '')
-        for i in range(0,len(code)+1):
-            subcode = code[:i]
-            if len(subcode) == 0:
-                continue
-            if subcode in self.sparse_hierarchically_coded_features:
-                self.sparse_hierarchically_coded_features[subcode] += weight
-            else:
-                self.sparse_hierarchically_coded_features[subcode] = weight
-            if subcode not in self.contained_hierarchically_coded_feature_names:
-                self.contained_hierarchically_coded_feature_names.append(subcode)
-    
-
+        for subcode in code_prefixes(code):
+            self.sparse_hierarchically_coded_features[subcode] = self.sparse_hierarchically_coded_features.get(subcode, 0) + weight
@@ -1,19 +1,27 @@
 # -*- coding: utf-8 -*-
+from reader.sparsehierarchical.prefixfeatures import PrefixFeatureVocabulary
+
 class DRGTrainingSet():
     def __init__(self):
         self.instances = []
-        
+        self.feature_vocabulary = PrefixFeatureVocabulary()
     
     def add_drg_training_instance(self, instance):
         self.instances.append(instance)
+        
+    def get_hierarchically_coded_features_and_targets(self):
+        """ 
+        Sparse CSR matrix of the hierarchically coded features (instances x features, 
+        see PrefixFeatureVocabulary) and the targets. The feature names are 
+        self.feature_vocabulary.feature_names().
+        """
+        data = self.feature_vocabulary.fit_transform([instance.codes() for instance in self.instances])
+        return data, [instance.gt for instance in self.instances]
 
     def get_hierarchically_coded_feature_vectors_and_targets(self):
+        """ dense feature dicts, only for small training sets """
         all_hierarchically_coded_feature_names = self.get_all_hierarchically_coded_feature_names() 
-        return [instance.get_full_hierarchically_coded_feature_vectors_and_targets(all_hierarchically_coded_feature_names) for instance in self.instances]
-        
-    def get_all_hierarachically_coded_feature_names(self):
-        all_hierarchically_coded_feature_names = [feature_name for feature_name in [instance.get_contained_hierarchically_coded_feature_names() for instance in self.instances]]
-        all_hierarchically_coded_feature_names = list(set(all_hierarchically_coded_feature_names))
-        return all_hierarchically_coded_feature_names
+        return [instance.get_hierarchically_coded_features_and_targets(all_hierarchically_coded_feature_names) for instance in self.instances]
         
-    
\ No newline at end of file
+    def get_all_hierarchically_coded_feature_names(self):
+        return self.feature_vocabulary.fit([instance.codes() for instance in self.instances]).feature_names()
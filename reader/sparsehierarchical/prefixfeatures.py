@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import scipy.sparse
+from reader.vocabulary import Vocabulary
+
+def normalize_code(code):
+    return code.upper().replace(' ', '')
+
+def code_prefixes(code):
+    """ all prefixes of a code, e.g. 'A01' -> ['A', 'A0', 'A01'] """
+    code = normalize_code(code)
+    return [code[:i] for i in range(1, len(code) + 1)]
+
+class PrefixFeatureVocabulary:
+    """
+    Hierarchically coded features: a code counts for each of its prefixes.
+    The prefixes (feature names) get integer ids, the prefix ids of each code are 
+    computed once and cached. Instances are turned into a sparse CSR matrix
+    (instances x features) holding the number of codes of the instance with each prefix.
+    """
+    def __init__(self):
+        self.features = Vocabulary(reserved=[])
+        self.prefix_ids_by_code = {}
+        
+    def __len__(self):
+        return len(self.features)
+    
+    def feature_names(self):
+        return list(self.features)
+    
+    def prefix_ids(self, code, grow=True):
+        ids = self.prefix_ids_by_code.get(code)
+        if ids is None:
+            if not grow:
+                # prefixes of an unknown code that were not seen in fit are left out
+                return [self.features.id(p) for p in code_prefixes(code) if p in self.features]
+            ids = [self.features.add(p) for p in code_prefixes(code)]
+            self.prefix_ids_by_code[code] = ids
+        return ids
+    
+    def fit(self, code_lists):
+        for codes in code_lists:
+            for code in codes:
+                self.prefix_ids(code)
+        return self
+    
+    def transform(self, code_lists, grow=False, dtype=np.float32):
+        """ CSR matrix with one row per list of codes """
+        indptr = [0]
+        indices = []
+        for codes in code_lists:
+            for code in codes:
+                indices.extend(self.prefix_ids(code, grow))
+            indptr.append(len(indices))
+        matrix = scipy.sparse.csr_matrix((np.ones(len(indices), dtype=dtype), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+                                         shape=(len(code_lists), len(self.features)))
+        # codes with common prefixes add up
+        matrix.sum_duplicates()
+        return matrix
+    
+    def fit_transform(self, code_lists, dtype=np.float32):
+        return self.transform(code_lists, grow=True, dtype=dtype)
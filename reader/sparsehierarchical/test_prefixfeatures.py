@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+import unittest
+from reader.sparsehierarchical.prefixfeatures import PrefixFeatureVocabulary
+from reader.sparsehierarchical.drgtraininginstance import DRGTrainingInstance
+from reader.sparsehierarchical.drgtrainingset import DRGTrainingSet
+
+class TestPrefixFeatures(unittest.TestCase):        
+    def test_same_as_sparse_dicts(self):
+        training_set = DRGTrainingSet()
+        training_set.add_drg_training_instance(DRGTrainingInstance(None, ['AAA', 'aab', 'ABA'], ['000', '001'], 'BAA'))
+        training_set.add_drg_training_instance(DRGTrainingInstance(None, ['BAA'], [], 'AAA'))
+        data, target = training_set.get_hierarchically_coded_features_and_targets()
+        names = training_set.feature_vocabulary.feature_names()
+        
+        self.assertEqual(target, ['BAA', 'AAA'])
+        self.assertEqual(data.shape, (2, len(names)))
+        for row, instance in enumerate(training_set.instances):
+            dense = data[row].toarray()[0]
+            self.assertDictEqual({name : value for name, value in zip(names, dense) if value != 0}, 
+                                 instance.get_sparse_hierarchically_coded_features())
+            
+    def test_unknown_prefixes(self):
+        vocabulary = PrefixFeatureVocabulary().fit([['A01']])
+        data = vocabulary.transform([['A02', 'B'], []])
+        self.assertEqual(data.shape, (2, 3))
+        self.assertListEqual(data.toarray().tolist(), [[1, 1, 0], [0, 0, 0]])
+        self.assertEqual(len(vocabulary), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import unittest
+import tempfile
+import os
+import numpy as np
+from reader.casestore import CaseStore
+from reader.flatvectors.pcreaderflatvectorized import FlatVectorizedPCReader
+
+def write_cases(filename):
+    rows = [['1', '32', '0', '2400', 'W', '99', '04', '51', '0', '0', 'A00', 'D40', '', 'C.30'],
+            ['2', '67', '0', '900', 'M', '01', '07', '2', '0', '0', 'ZZZ', 'A00'],
+            ['3', '45', '0', '3000', 'M', '11', '00', '7', '0', '0', 'D40', 'A00', 'A00']]
+    with open(filename, 'w') as out_file:
+        for row in rows:
+            # 99 secondary diagnoses and 100 procedures
+            row = row + [''] * (10 + 1 + 99 + 100 - len(row))
+            print(';'.join(row), file=out_file)
+
+class TestCaseStore(unittest.TestCase):
+    def setUp(self):
+        self.filename = os.path.join(tempfile.mkdtemp(), 'cases.csv')
+        write_cases(self.filename)
+        self.vectors_by_code = {'ICD_A00' : [np.ones(2)], 'ICD_D40' : [np.array([1.0, -1.0])]}
+        
+    def test_columns(self):
+        store = CaseStore.from_csv(self.filename, self.vectors_by_code)
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.invalid_pdx, 1)
+        self.assertListEqual(store.ids.tolist(), ['1', '3'])
+        self.assertListEqual(store.demographics['sex'].tolist(), ['W', 'M'])
+        self.assertListEqual(store.names, ['A00', 'D40'])
+        np.testing.assert_array_equal(store.diags, [[1, -1], [0, 0]])
+        self.assertEqual(store.procs.shape, (2, 0))
+        
+    def test_same_instances_as_csv(self):
+        store = CaseStore.from_csv(self.filename, self.vectors_by_code)
+        readers = [FlatVectorizedPCReader(self.filename), FlatVectorizedPCReader(self.filename)]
+        readers[1].case_store = store
+        for reader in readers:
+            reader.read_from_file(self.vectors_by_code, 'sdx', demo_variables_to_use=['sex', 'adm-normal'])
+        self.assertListEqual(readers[0].targets, readers[1].targets)
+        self.assertListEqual(readers[0].excludes, readers[1].excludes)
+        np.testing.assert_array_equal(readers[0].data, readers[1].data)
+        self.assertEqual(readers[1].invalid_pdx, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy as np
+from reader.demographics import DemographicColumns
+
+class TestDemographics(unittest.TestCase):
+    def setUp(self):
+        self.rows = [{'ageYears' : '37', 'ageDays' : '0', 'admWeight' : '0', 'sex' : 'M', 'adm' : '11', 'sep' : '07', 'los' : '63', 'hmv' : '0'},
+                     {'ageYears' : '0', 'ageDays' : '45', 'admWeight' : '1000', 'sex' : 'W', 'adm' : '01', 'sep' : '00', 'los' : '4', 'hmv' : '500'}]
+        self.columns = DemographicColumns.from_rows(self.rows)
+        
+    def test_features(self):
+        features = self.columns.features(['sex', 'adm-transfer', 'adm-normal', 'sep-dead', 'los', 'ageDays'])
+        self.assertEqual(features.dtype, np.float32)
+        np.testing.assert_array_equal(features, [[1, 1, 0, 1, 63, 0], [-1, 0, 1, 0, 4, 45]])
+        
+    def test_tokens(self):
+        self.assertListEqual(self.columns.tokens(), [['ADM_11', 'SEX_M', 'AGE_YEARS_37', 'AGE_DECADE_30', 'SEP_07', 'LOS_50'],
+                                                     ['ADM_01', 'SEX_W', 'AGE_DAYS_40', 'SEP_00', 'LOS_4', 'WEIGHT_LT_1250', 'HMV_GT_500']])
+        tokens, ids = self.columns.token_ids(skip_exit_data=True)
+        self.assertEqual(ids.shape, (2, 7))
+        self.assertListEqual([tokens[i] for i in ids[1] if i >= 0], ['ADM_01', 'SEX_W', 'AGE_DAYS_40', 'WEIGHT_LT_1250', 'HMV_GT_500'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import unittest
+import tempfile
+import os
+import numpy as np
+from reader.vocabulary import Vocabulary, LabelEncoder
+
+class TestVocabulary(unittest.TestCase):
+    def test_ids(self):
+        vocab = Vocabulary(['b', 'a', 'b'])
+        self.assertListEqual(list(vocab), ['mask', 'b', 'a'])
+        self.assertEqual(vocab.id('a'), 2)
+        self.assertEqual(vocab[1], 'b')
+        self.assertTrue('a' in vocab)
+        
+    def test_encode(self):
+        vocab = Vocabulary(['a', 'b', 'c'])
+        sequences = [['a', 'b', 'c', 'a'], ['c'], []]
+        np.testing.assert_array_equal(vocab.encode(sequences, maxlen=3), [[2, 3, 1], [0, 0, 3], [0, 0, 0]])
+        np.testing.assert_array_equal(vocab.encode(sequences, maxlen=3, padding='post', truncating='post'), [[1, 2, 3], [3, 0, 0], [0, 0, 0]])
+        self.assertEqual(vocab.encode(sequences).shape, (3, 4))
+        
+    def test_save_and_load(self):
+        filename = os.path.join(tempfile.mkdtemp(), 'vocab.txt')
+        vocab = Vocabulary(['x', 'y'])
+        vocab.save(filename)
+        self.assertListEqual(list(Vocabulary.load(filename)), ['mask', 'x', 'y'])
+        
+    def test_label_encoder(self):
+        filename = os.path.join(tempfile.mkdtemp(), 'classes.txt')
+        classes = LabelEncoder(['I10', 'E11', 'I10'])
+        np.testing.assert_array_equal(classes.transform(['E11', 'I10', 'E11']), [1, 0, 1])
+        classes.save(filename)
+        loaded = LabelEncoder.load(filename)
+        self.assertListEqual(list(loaded), ['I10', 'E11'])
+        self.assertEqual(loaded[1], 'E11')
+
+if __name__ == '__main__':
+    unittest.main()
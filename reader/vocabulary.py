@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+class Vocabulary:
+    """
+    Maps tokens to integer ids with O(1) lookup. The ids follow the order in which
+    the tokens were added (reserved tokens first, by default 'mask' gets the id 0).
+    Iterating, indexing and len() behave like the plain token list used before.
+    """
+    def __init__(self, tokens=[], reserved=['mask']):
+        self.tokens = []
+        self.ids = {}
+        for token in reserved:
+            self.add(token)
+        for token in tokens:
+            self.add(token)
+    
+    def add(self, token):
+        if token not in self.ids:
+            self.ids[token] = len(self.tokens)
+            self.tokens.append(token)
+        return self.ids[token]
+    
+    def id(self, token):
+        return self.ids[token]
+    
+    def __getitem__(self, i):
+        return self.tokens[i]
+    
+    def __contains__(self, token):
+        return token in self.ids
+    
+    def __iter__(self):
+        return iter(self.tokens)
+    
+    def __len__(self):
+        return len(self.tokens)
+    
+    def encode(self, sequences, maxlen=None, padding='pre', truncating='pre', dtype=np.int32):
+        """
+        Token sequences to a padded id matrix (padding value 0), same semantics as
+        keras.preprocessing.sequence.pad_sequences.
+        """
+        lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+        flat_ids = np.fromiter((self.ids[token] for sequence in sequences for token in sequence), 
+                               dtype=dtype, count=lengths.sum())
+        return pad_flat_sequences(flat_ids, lengths, maxlen, padding, truncating, dtype)
+    
+    def save(self, filename):
+        with open(filename, 'w', encoding='utf-8') as out_file:
+            for token in self.tokens:
+                print(token, file=out_file)
+    
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'r', encoding='utf-8') as in_file:
+            return cls([line.rstrip('\n') for line in in_file], reserved=[])
+
+        
+class LabelEncoder(Vocabulary):
+    """
+    The classes of a task in the order of the model outputs (no reserved tokens):
+    transform maps targets to integer class ids with O(1) lookups, e.g. for a sparse 
+    categorical cross-entropy, indexing maps class ids back to classes.
+    """
+    def __init__(self, tokens=[], reserved=[]):
+        super().__init__(tokens, reserved)
+    
+    def transform(self, targets, dtype=np.int32):
+        return np.fromiter((self.ids[target] for target in targets), dtype=dtype, count=len(targets))
+        
+        
+def pad_flat_sequences(flat_values, lengths, maxlen=None, padding='pre', truncating='pre', dtype=np.int32):
+    """
+    Pads sequences that are stored back to back in flat_values (the sequence i
+    has lengths[i] values) into a (number of sequences, maxlen) matrix without a Python loop.
+    """
+    if padding not in ['pre', 'post']:
+        raise ValueError("Padding type '%s' not understood" % padding)
+    if truncating not in ['pre', 'post']:
+        raise ValueError("Truncating type '%s' not understood" % truncating)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    if maxlen is None:
+        maxlen = int(lengths.max()) if len(lengths) > 0 else 0
+    kept = np.minimum(lengths, maxlen)
+    
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    starts = np.zeros(len(lengths), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    # position of each value within its sequence
+    positions = np.arange(len(flat_values)) - np.repeat(starts, lengths)
+    first_kept = (lengths - kept) if truncating == 'pre' else np.zeros(len(lengths), dtype=np.int64)
+    first_kept = np.repeat(first_kept, lengths)
+    keep = (positions >= first_kept) & (positions < first_kept + np.repeat(kept, lengths))
+    columns = positions - first_kept
+    if padding == 'pre':
+        columns += maxlen - np.repeat(kept, lengths)
+    
+    x = np.zeros((len(lengths), maxlen), dtype=dtype)
+    x[rows[keep], columns[keep]] = flat_values[keep]
+    return x
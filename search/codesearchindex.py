@@ -0,0 +1,101 @@
+import os
+import numpy as np
+from numpy import linalg as LA
+from vectorize import unitvecs
+
+class CodeSearchIndex:
+    """
+    All normalized code vectors of one code type (ICD, CHOP or DRG) in one
+    contiguous float32 matrix. A query is answered with one matrix product
+    and an argpartition top-k instead of one cosine distance per code.
+    """
+    CODE_TYPES = ['ICD', 'CHOP', 'DRG']
+    
+    def __init__(self, codes, vectors):
+        self.codes = codes
+        self.vectors = vectors
+        self.vector_size = vectors.shape[1]
+        
+    @classmethod
+    def from_code_vectors(cls, vector_by_code, code_type):
+        """
+        Build the index from the normalized code vectors as returned by
+        vectorize.read_code_vectors (key 'vector_by_code').
+        """
+        codes = sorted([code for code in vector_by_code.keys() if code.startswith(code_type + '_')])
+        if len(codes) == 0:
+            raise ValueError('No codes of type ' + code_type + ' in the code vectors')
+        vectors = np.empty((len(codes), len(vector_by_code[codes[0]])), dtype=np.float32)
+        for i, code in enumerate(codes):
+            vectors[i] = vector_by_code[code]
+        return cls(codes, unitvecs(vectors))
+    
+    def search(self, query, k=5):
+        """
+        Returns the k codes most similar to the query vector together
+        with their cosine similarities, most similar first.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        norm = LA.norm(query)
+        if norm > 0:
+            query = query / norm
+        similarities = self.vectors.dot(query)
+        best = top_k(similarities[np.newaxis, :], k)[0]
+        return [self.codes[i] for i in best], similarities[best]
+    
+    def search_batch(self, queries, k=5):
+        """
+        Answers one query per row of the queries matrix.
+        Returns the indices into self.codes and the cosine similarities,
+        both of shape (number of queries, k).
+        """
+        queries = unitvecs(np.asarray(queries, dtype=np.float32))
+        similarities = queries.dot(self.vectors.T)
+        best = top_k(similarities, k)
+        rows = np.arange(best.shape[0])[:, np.newaxis]
+        return best, similarities[rows, best]
+    
+    def save(self, filename_prefix):
+        np.save(filename_prefix + '.npy', self.vectors)
+        with open(filename_prefix + '.codes', 'w') as out_file:
+            for code in self.codes:
+                print(code, file=out_file)
+    
+    @classmethod
+    def load(cls, filename_prefix, mmap_mode='r'):
+        vectors = np.load(filename_prefix + '.npy', mmap_mode=mmap_mode)
+        with open(filename_prefix + '.codes', 'r') as in_file:
+            codes = [line.strip() for line in in_file]
+        return cls(codes, vectors)
+    
+    @classmethod
+    def exists(cls, filename_prefix):
+        return os.path.exists(filename_prefix + '.npy') and os.path.exists(filename_prefix + '.codes')
+    
+
+def build_code_search_indexes(vector_by_code, filename_prefix=None):
+    """
+    Builds one index per code type. If a filename prefix is given the indexes
+    are stored as filename_prefix + '.' + code_type + '.npy|.codes'.
+    """
+    indexes = {}
+    for code_type in CodeSearchIndex.CODE_TYPES:
+        try:
+            index = CodeSearchIndex.from_code_vectors(vector_by_code, code_type)
+        except ValueError:
+            continue
+        if filename_prefix != None:
+            index.save(filename_prefix + '.' + code_type)
+        indexes[code_type] = index
+    return indexes
+
+def top_k(scores, k):
+    """
+    Column indices of the k highest scores in each row, sorted descending.
+    Only the k candidates per row are sorted.
+    """
+    k = min(k, scores.shape[1])
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    rows = np.arange(scores.shape[0])[:, np.newaxis]
+    order = np.argsort(-scores[rows, candidates], axis=1)
+    return candidates[rows, order]
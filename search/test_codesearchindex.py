@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import unittest
+import tempfile
+import os
+import numpy as np
+from search.codesearchindex import CodeSearchIndex, build_code_search_indexes
+
+class TestCodeSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.vector_by_code = {'ICD_A': np.array([1.0, 0.0, 0.0], dtype=np.float32),
+                               'ICD_B': np.array([0.0, 2.0, 0.0], dtype=np.float32),
+                               'ICD_C': np.array([1.0, 1.0, 0.0], dtype=np.float32),
+                               'CHOP_A': np.array([0.0, 0.0, 1.0], dtype=np.float32)}
+        
+    def test_search(self):
+        index = CodeSearchIndex.from_code_vectors(self.vector_by_code, 'ICD')
+        codes, similarities = index.search(np.array([0.9, 0.1, 0.0]), k=2)
+        self.assertListEqual(codes, ['ICD_A', 'ICD_C'])
+        self.assertTrue(similarities[0] > similarities[1])
+        
+    def test_search_batch(self):
+        index = CodeSearchIndex.from_code_vectors(self.vector_by_code, 'ICD')
+        best, similarities = index.search_batch(np.array([[0.0, 1.0, 0.0], [1.0, 0.0, 0.0]]), k=5)
+        self.assertEqual(best.shape, (2, 3))
+        self.assertEqual(index.codes[best[0][0]], 'ICD_B')
+        self.assertEqual(index.codes[best[1][0]], 'ICD_A')
+        self.assertAlmostEqual(similarities[1][0], 1.0, places=5)
+        
+    def test_save_and_load(self):
+        folder = tempfile.mkdtemp()
+        prefix = os.path.join(folder, 'index')
+        indexes = build_code_search_indexes(self.vector_by_code, prefix)
+        self.assertListEqual(sorted(indexes.keys()), ['CHOP', 'ICD'])
+        index = CodeSearchIndex.load(prefix + '.ICD')
+        self.assertListEqual(index.codes, indexes['ICD'].codes)
+        np.testing.assert_array_equal(index.vectors, indexes['ICD'].vectors)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,13 @@
 import sys
+import os
 import numpy as np
-import time
 
-from vectorize import read_code_vectors, read_vectors, unitvec
+from vectorize import unitvec
+from embedding.embeddingstore import open_embedding_store
 from tokenization.tokenizer import GermanTokenizer
-from scipy.spatial.distance import cosine
 from reader.csvreader import CSVReader
+from search.codesearchindex import CodeSearchIndex, build_code_search_indexes
+from instrumentation import start_tracer, span
 
 if __name__ == '__main__':
     if len(sys.argv) != 6:
@@ -19,79 +21,75 @@ if __name__ == '__main__':
     catalog = sys.argv[4]
     phrase = sys.argv[5]
     
-    start = time.clock()
-    
     if code_type not in ['ICD', 'CHOP', 'DRG']:
         print("Code type has to be one of ICD|DRG|CHOP")
         exit(-2)
+    
+    # the trace is written next to the embedding store and the search index
+    if not os.path.exists(vector_file + '.store/'):
+        os.makedirs(vector_file + '.store/')
+    tracer = start_tracer('search', vector_file + '.store/trace_search.json')
+    try:
+        with span('load') as load_span:
+            print("Reading catalog")
+            with span('catalog') as catalog_span:
+                reader = CSVReader(catalog, ',')
+                descriptions_de = {}
+                dataset = reader.read_from_file()
+                for record in dataset:
+                    descriptions_de[code_type + '_' + record['code'].replace('.', '').upper()] = record['text_de']
+                catalog_span.set('rows-parsed', len(dataset))
+                
+            print("Reading vectors and tokens..")
+            
+            with span('embedding-store'):
+                store = open_embedding_store(vector_file, token_file, vector_file + '.store/')
+                vector_by_token = store.vector_by_token
+            
+            # the code vectors are stored next to the embedding store and rebuilt only if the store changed
+            with span('index') as index_span:
+                index_prefix = vector_file + '.store/index'
+                index_file = index_prefix + '.' + code_type
+                if CodeSearchIndex.exists(index_file) and os.path.getmtime(index_file + '.npy') >= os.path.getmtime(vector_file + '.store/code_sums.npy'):
+                    index = CodeSearchIndex.load(index_file)
+                else:
+                    print("Building code search index..")
+                    index = build_code_search_indexes(store.vector_by_code, index_prefix)[code_type]
+                    index_span.set('built', True)
+            
+            vector_size = index.vector_size
+            
+            print("Vector size is " + str(vector_size))
+                
+            tokenizer = GermanTokenizer()
         
-    print("Reading catalog")
-    reader = CSVReader(catalog, ',')
-    descriptions_de = {}
-    dataset = reader.read_from_file()
-    for record in dataset:
-        descriptions_de[code_type + '_' + record['code'].replace('.', '').upper()] = record['text_de']
+        print('Loading vectors took ' + str(load_span.wall) + ' seconds')
         
-    print("Reading vectors and tokens..")
-    
-    vector_by_token = read_vectors(vector_file)
-    res = read_code_vectors(vector_by_token, token_file)
-    vectors_by_codes = res['vectors']
-    tokens_by_codes = res['tokens']
-    
-    code_vocab = []
-    for code in vectors_by_codes.keys():
-        if(code.startswith(code_type)):
-            code_vocab.append(code)
-    
-    vector_size = vectors_by_codes[code_vocab[0]][0].shape[0]
-    
-    print("Vector size is " + str(vector_size))
-    
-    average_vector_by_code = np.zeros((len(code_vocab), vector_size), dtype=np.float32)
-    
-    for i, code in enumerate(code_vocab):
-        vectors = vectors_by_codes[code]
-        data = np.zeros(vector_size, dtype=np.float32)
-        # sum over all vectors (first vector is the code token)
-        for v in vectors:
-            data += v
-        data = unitvec(data)
-        average_vector_by_code[i] = data
+        with span('search') as search_span:
+            print("Search..")
+            
+            tokens = tokenizer.tokenize(phrase)
+            print(tokens)
+            average_phrase = np.zeros(vector_size, dtype=np.float32)
+            for token in tokens:
+                if token in vector_by_token:
+                    print("Found " + token)
+                    average_phrase += vector_by_token[token]
+                    search_span.count('tokens-found')
+                elif token.upper() in vector_by_token:
+                    print("Found upper case " + token)
+                    average_phrase += vector_by_token[token.upper()]
+                    search_span.count('tokens-found')
+            average_phrase = unitvec(average_phrase)
+            search_span.set('tokens', len(tokens))
+            
+            most_similar_codes, similarities = index.search(average_phrase, k=5)
         
-    tokenizer = GermanTokenizer()
-    
-    load_time = time.clock() - start
-    print('Loading vectors took ' + str(load_time) + ' seconds')
-    start = time.clock()
-    
-    print("Search..")
-    
-    tokens = tokenizer.tokenize(phrase)
-    print(tokens)
-    average_phrase = np.zeros(vector_size, dtype=np.float32)
-    for token in tokens:
-        if token in vector_by_token.keys():
-            print("Found " + token)
-            average_phrase += vector_by_token[token]
-        elif token.upper() in vector_by_token.keys():
-            print("Found upper case " + token)
-            average_phrase += vector_by_token[token.upper()]
-    average_phrase = unitvec(average_phrase)
-    
-    distances = np.ones(len(code_vocab), dtype=np.float32)
-    # TODO remove this for loop with more efficient numpy computation
-    for i, code in enumerate(code_vocab):
-        distances[i] = cosine(average_phrase, average_vector_by_code[i])
-    
-    most_similar_codes = distances.argsort()[:5]
-    
-    load_time = time.clock() - start
-    print('Search took ' + str(load_time) + ' seconds')
+        print('Search took ' + str(search_span.wall) + ' seconds')
+    finally:
+        tracer.finish()
     
     print("\nSearch Results")
-    for rank, i in enumerate(most_similar_codes):
-        desc = descriptions_de[code_vocab[i]] if code_vocab[i] in descriptions_de.keys() else ''
-        print(str(rank) + '. ' + code_vocab[i] + ' ' + desc)
-    
-    
\ No newline at end of file
+    for rank, code in enumerate(most_similar_codes):
+        desc = descriptions_de[code] if code in descriptions_de else ''
+        print(str(rank) + '. ' + code + ' ' + desc)
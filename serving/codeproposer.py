@@ -0,0 +1,80 @@
+import csv
+
+from embedding.embeddingstore import EmbeddingStore
+from reader.sparsehierarchical.drgreader import DRGReader
+from reader.flatvectors.pcreaderflatvectorized import FlatVectorizedPCReader
+from reader.sequencevectors.pcreadersequencevectorized import SequenceVectorizedPCReader
+from reader.sequence.pcreadersequence import SequencePCReader
+from classification.evaluationengine import propose
+from classification.modelbundle import ModelBundle, bundle_folder
+
+TASKS = ['pdx', 'sdx', 'srg', 'drg']
+
+def parse_rows(lines):
+    """ patient cases in the CSV format of the training set to row dicts (see FlatVectorizedPCReader.rows) """
+    rows = list(csv.DictReader(lines, fieldnames=DRGReader.FIELDNAMES, restkey=DRGReader.RESTKEY, restval='', delimiter=';'))
+    for row in rows:
+        row.setdefault(DRGReader.RESTKEY, [])
+    return rows
+
+class CodeProposer:
+    """
+    Proposes PDX, SDX, SRG and DRG codes for patient cases with the model bundles the 
+    pipeline stored for each task (store-everything). The embedding store and the models
+    are loaded once. The input is built with the reader of the classifier, the codes of a case are
+    never proposed for it (as in the evaluation).
+    """
+    def __init__(self, config, tasks=TASKS):
+        self.config = config
+        self.store = EmbeddingStore.open(config['embedding-store'])
+        self.models = {}
+        self.readers = {}
+        for task in tasks:
+            self.models[task] = ModelBundle.load(bundle_folder(config, task))
+            if self.models[task].embedding_version != self.store.version:
+                print('Warning: the ' + task + ' model was trained with version ' + str(self.models[task].embedding_version) + 
+                      ' of the embedding store, not with version ' + str(self.store.version))
+            self.readers[task] = self.create_reader(self.models[task])
+            
+    def create_reader(self, bundle):
+        if bundle.classifier == 'ffnn':
+            reader = FlatVectorizedPCReader(None)
+        elif bundle.classifier == 'lstm':
+            reader = SequenceVectorizedPCReader(None)
+        elif bundle.classifier == 'lstm-embedding':
+            reader = SequencePCReader(None)
+            reader.tokens_by_code = self.store.tokens_by_code
+            # the vocabulary of the training sequences, it defines the embedding rows of the model
+            reader.vocab = bundle.vocab
+            reader.fixed_vocab = True
+            reader.use_demographic_tokens = self.config['use_demographic_tokens']
+            reader.use_all_tokens = self.config['use-all-tokens-in-embedding']
+            reader.maxlen = self.config['maxlen']
+        else:
+            raise ValueError('Codes can only be proposed with the "ffnn", "lstm" and "lstm-embedding" classifiers, not ' + bundle.classifier)
+        reader.demo_scaler = bundle.demo_scaler
+        return reader
+    
+    def model_input(self, bundle, reader):
+        if bundle.classifier == 'ffnn':
+            return bundle.scaler.transform(reader.data)
+        elif bundle.classifier == 'lstm':
+            return reader.data.pad(self.config['maxlen'])
+        return {'codes_input' : reader.data, 'demo_input' : reader.demo_data}
+    
+    def propose(self, rows, k=5):
+        """ 
+        For each row (see parse_rows) a dict with the id of the case and the 
+        k best (code, probability) proposals of each task.
+        """
+        results = [{'id' : row['id']} for row in rows]
+        if len(rows) == 0:
+            return results
+        for task, reader in self.readers.items():
+            bundle = self.models[task]
+            reader.read_rows(rows, self.store.vectors_by_code, task, self.config['demo-variables'])
+            # adapt here if the model has multiple outputs. Append '[0]'
+            probabs = bundle.model.predict(self.model_input(bundle, reader), verbose=0)
+            for result, proposals in zip(results, propose(probabs, bundle.classes, reader.excludes, k)):
+                result[task] = proposals
+        return results
@@ -0,0 +1,55 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+class MicroBatcher:
+    """
+    Collects the requests of many threads into batches for one worker thread, so the
+    model predicts many cases at once. A batch is run as soon as max_batch_size items are
+    waiting or the first request of the batch waited max_delay seconds.
+    fn maps a list of items to a list of results of the same length.
+    """
+    def __init__(self, fn, max_batch_size=256, max_delay=0.005):
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.requests = queue.Queue()
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+        
+    def submit(self, items):
+        """ a Future of the results for the items """
+        future = Future()
+        self.requests.put((items, future))
+        return future
+    
+    def run(self):
+        while True:
+            batch = [self.requests.get()]
+            size = len(batch[0][0])
+            deadline = time.time() + self.max_delay
+            while size < self.max_batch_size:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self.requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request[0])
+            self.run_batch(batch)
+            
+    def run_batch(self, batch):
+        items = [item for request_items, _ in batch for item in request_items]
+        try:
+            results = self.fn(items)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        start = 0
+        for request_items, future in batch:
+            future.set_result(results[start:start + len(request_items)])
+            start += len(request_items)
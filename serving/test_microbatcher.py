@@ -0,0 +1,24 @@
+import unittest
+from serving.microbatcher import MicroBatcher
+
+class TestMicroBatcher(unittest.TestCase):
+    def test_batches(self):
+        batches = []
+        def square(items):
+            batches.append(len(items))
+            return [item * item for item in items]
+        batcher = MicroBatcher(square, max_batch_size=4, max_delay=0.05)
+        futures = [batcher.submit([i, i + 1]) for i in range(0, 10, 2)]
+        self.assertListEqual([f.result(timeout=5) for f in futures], [[i * i, (i + 1) * (i + 1)] for i in range(0, 10, 2)])
+        self.assertTrue(max(batches) <= 4 + 1)
+        self.assertTrue(len(batches) < 5)
+        
+    def test_error(self):
+        def fail(items):
+            raise ValueError('invalid case')
+        batcher = MicroBatcher(fail)
+        with self.assertRaises(ValueError):
+            batcher.submit([1]).result(timeout=5)
+
+if __name__ == '__main__':
+    unittest.main()
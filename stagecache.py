@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+
+class StageCache:
+    """
+    Content addressed cache for the artifacts of the pipeline stages.
+    The key of a stage is a hash over the stage name, the values of the config keys
+    the stage depends on, the contents of its input files and further values
+    (e.g. the task). The artifacts are stored in <folder>/<stage>/<key>/.
+    Output files are copied back to their configured paths on a hit.
+    """
+    def __init__(self, folder, enabled=True):
+        self.folder = folder
+        self.enabled = enabled
+        # file hashes by (path, size, modification time), files are hashed once per process
+        self.file_hashes = {}
+
+    def key(self, stage, config, config_keys, input_files=[], values=[]):
+        digest = hashlib.sha1()
+        digest.update(stage.encode('utf-8'))
+        digest.update(json.dumps([[k, config[k]] for k in sorted(config_keys)], sort_keys=True).encode('utf-8'))
+        for filename in input_files:
+            digest.update(self.file_hash(filename).encode('utf-8'))
+        digest.update(json.dumps(values, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def file_hash(self, filename):
+        stat = os.stat(filename)
+        file_id = (os.path.abspath(filename), stat.st_size, stat.st_mtime)
+        if file_id not in self.file_hashes:
+            digest = hashlib.sha1()
+            with open(filename, 'rb') as in_file:
+                for block in iter(lambda: in_file.read(1 << 20), b''):
+                    digest.update(block)
+            self.file_hashes[file_id] = digest.hexdigest()
+        return self.file_hashes[file_id]
+
+    def path(self, stage, key):
+        return os.path.join(self.folder, stage, key)
+
+    def run(self, stage, key, outputs, fn):
+        """
+        Restores the output files of the stage if they are cached for this key.
+        Otherwise executes fn and caches the output files afterwards.
+        Returns True if the stage was skipped.
+        """
+        if self.restore(stage, key, outputs):
+            print("Skip " + stage + ", using cached artifacts " + key)
+            return True
+        fn()
+        self.store(stage, key, outputs)
+        return False
+
+    def restore(self, stage, key, outputs):
+        if not self.enabled:
+            return False
+        folder = self.path(stage, key)
+        names = [str(i) for i in range(len(outputs))]
+        if not all([os.path.exists(os.path.join(folder, name)) for name in names]):
+            return False
+        for name, output in zip(names, outputs):
+            output_folder = os.path.dirname(output)
+            if output_folder != '' and not os.path.exists(output_folder):
+                os.makedirs(output_folder)
+            shutil.copyfile(os.path.join(folder, name), output + '.tmp')
+            os.replace(output + '.tmp', output)
+        return True
+
+    def store(self, stage, key, outputs):
+        if not self.enabled:
+            return
+        self.commit(stage, key, lambda folder: [shutil.copyfile(output, os.path.join(folder, str(i))) for i, output in enumerate(outputs)])
+
+    def load(self, stage, key):
+        """ cached Python object of the stage (e.g. reader output or scores), None on a miss """
+        filename = os.path.join(self.path(stage, key), 'object.pkl')
+        if not self.enabled or not os.path.exists(filename):
+            return None
+        with open(filename, 'rb') as in_file:
+            return pickle.load(in_file)
+
+    def save(self, stage, key, obj):
+        if not self.enabled:
+            return
+        def dump(folder):
+            with open(os.path.join(folder, 'object.pkl'), 'wb') as out_file:
+                pickle.dump(obj, out_file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.commit(stage, key, dump)
+
+    def commit(self, stage, key, write):
+        # artifacts are written to a temporary folder and renamed,
+        # so processes sharing the cache never see partial artifacts
+        folder = self.path(stage, key)
+        temp_folder = folder + '.tmp' + str(os.getpid())
+        # left behind by a crashed run with the same process id
+        shutil.rmtree(temp_folder, ignore_errors=True)
+        os.makedirs(temp_folder)
+        try:
+            write(temp_folder)
+            if os.path.exists(folder):
+                shutil.rmtree(folder)
+            try:
+                os.rename(temp_folder, folder)
+            except OSError:
+                # another process has cached the same artifacts in the meantime
+                pass
+        finally:
+            # nothing is left if write fails or the artifacts were cached by another process
+            shutil.rmtree(temp_folder, ignore_errors=True)
@@ -1,30 +1,28 @@
 # -*- coding: utf-8 -*-
-import numpy as np
-from sklearn import datasets
-from sklearn import svm
-from sklearn import cross_validation
-import sklearn.metrics as metrics
-
-from reader.sparsehierarchical.drgreader import DRGCodeProposalReader 
-
-r = DRGCodeProposalReader('data/2015/trainingData2015_20151001.csv')
-training_set = r.read_from_file()
-
-d = training_set.get_hierarchically_coded_feature_vectors_and_targets()
-
-data = []
-target = []
-
-for elem in d:
-    data.append(elem[0])
-    target.append(elem[1])
-
-data = np.array(data)
-target = np.array(target)
-
-# TODO: Normalization
-
-svc = svm.SVC(kernel='linear', C=1)
-scores = cross_validation.cross_val_score(svc, data, target, cv=5, scoring='f1_macro')
-
-print(scores)
\ No newline at end of file
+import json
+from optparse import OptionParser
+
+from classification.linearbaseline import cross_validate_linear_model
+from reader.casestore import read_drg_output
+from reader.sparsehierarchical.drgreader import DRGTaskReader
+
+if __name__ == '__main__':
+    parser = OptionParser(usage="Usage: python svm_experiment.py [-c configuration.json] [-t pdx] [-f 5]\n" +
+                          "   Linear baseline on the hierarchically coded features of the training set,\n" +
+                          "   trained out-of-core with mini-batches.")
+    parser.add_option("-c", "--config", dest="config", default='configuration.json', help="specify configuration file")
+    parser.add_option("-t", "--task", dest="task", default='pdx', help="one of pdx, sdx, srg, drg")
+    parser.add_option("-f", "--folds", dest="folds", type="int", default=5, help="number of folds")
+    parser.add_option("-l", "--loss", dest="loss", default='hinge', help="hinge (linear SVM) or log (logistic regression)")
+    parser.add_option("-a", "--alpha", dest="alpha", type="float", default=1e-5, help="regularization")
+    parser.add_option("-b", "--batch-size", dest="batch_size", type="int", default=10000, help="instances per mini-batch")
+    parser.add_option("-e", "--epochs", dest="epochs", type="int", default=3, help="passes over the training set")
+    (options, args) = parser.parse_args()
+
+    config = json.load(open(options.config, 'r'))
+    drg_by_id = read_drg_output(config['training-set-drgs']) if options.task == 'drg' else None
+    reader = DRGTaskReader(config['training-set'], options.task, drg_by_id)
+    scores = cross_validate_linear_model(reader, options.folds, config['num-cores'], options.loss, options.alpha,
+                                         options.batch_size, options.epochs)
+    for score in scores:
+        print(json.dumps(score, sort_keys=True))
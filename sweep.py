@@ -0,0 +1,125 @@
+import copy
+import hashlib
+import itertools
+import json
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# paths that are shared by all trials of a sweep, the stage cache and the stem cache
+# are safe for concurrent use. All other paths in the base folder are per trial.
+SHARED_CONFIG_KEYS = ['cache-folder', 'stem-cache']
+# files and folders the pipeline writes. They are per trial even if they are not in the base folder.
+OUTPUT_CONFIG_KEYS = ['code-tokens', 'code-vectors']
+# files and folders written by tokenization and word2vec. With 'skip-word2vec' they are
+# inputs of the trials and shared (the embedding store is compiled once before the trials).
+WORD2VEC_OUTPUT_CONFIG_KEYS = ['all-tokens', 'all-vectors', 'all-vocab', 'chop-tokenizations', 'drg-tokenizations', 
+                               'icd-tokenizations', 'embedding-store', 'word2vec-vocab']
+
+def grid(**values_by_key):
+    """ config overrides for all combinations of the values, e.g. grid(optimizer=['adam', 'rmsprop']) """
+    keys = sorted(values_by_key.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*[values_by_key[k] for k in keys])]
+
+def trial_key(config):
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
+
+def trial_config(config, overrides, num_cores):
+    """ 
+    The config of a trial: the overrides applied to a copy of the config and all
+    paths in the base folder and all output paths moved to a folder of its own 
+    (base_folder/trials/<key>/). Output paths outside of the base folder are moved
+    to base_folder/trials/<key>/external/<path>.
+    """
+    trial = copy.deepcopy(config)
+    trial.update(copy.deepcopy(overrides))
+    key = trial_key(trial)
+    base_folder = config['base_folder']
+    trial_folder = base_folder + 'trials/' + key + '/'
+    output_keys = OUTPUT_CONFIG_KEYS + ([] if trial['skip-word2vec'] else WORD2VEC_OUTPUT_CONFIG_KEYS)
+    for k, value in trial.items():
+        if not isinstance(value, str) or k in SHARED_CONFIG_KEYS:
+            continue
+        if value.startswith(base_folder):
+            trial[k] = trial_folder + value[len(base_folder):]
+        elif k in output_keys:
+            trial[k] = trial_folder + 'external/' + external_path(value)
+    trial['num-cores'] = num_cores
+    return key, trial
+
+def external_path(path):
+    """ a relative path below the working directory, e.g. 'data/pipelinetest/store/' (else the absolute path without root) """
+    normalized = os.path.normpath(path)
+    if os.path.isabs(normalized) or normalized.startswith('..'):
+        normalized = os.path.splitdrive(os.path.abspath(normalized))[1].lstrip(os.sep)
+    # normpath drops the trailing separator of folders
+    return normalized + '/' if path.endswith('/') or path.endswith(os.sep) else normalized
+
+def run_trial(task):
+    """ runs the pipeline (or run) for one trial in a worker process, returns (key, score or None, error) """
+    key, name, trial, run = task
+    if run == None:
+        # import in the worker, so each trial has its own Keras/Theano state
+        from medcodelearn_pipeline import run
+    try:
+        if not os.path.exists(trial['base_folder']):
+            os.makedirs(trial['base_folder'])
+        json.dump(trial, open(trial['base_folder'] + 'configuration.json','w'), indent=4, sort_keys=True)
+        return key, run(trial), None
+    except Exception:
+        return key, None, traceback.format_exc()
+
+def read_results(results_file):
+    results = {}
+    if os.path.exists(results_file):
+        with open(results_file, 'r') as in_file:
+            for line in in_file:
+                if line.strip() != '':
+                    result = json.loads(line)
+                    results[result['key']] = result
+    return results
+
+def run_sweep(config, trials, results_file, num_workers=None, run=None):
+    """
+    Runs the pipeline for each trial, a (name, config overrides) pair, in parallel worker
+    processes. At most num_workers trials (default: one per core) run at the same time,
+    the cores are divided between them. Each finished trial is appended to the
+    results_file (JSON lines) and skipped when the sweep is run again.
+    run(config) replaces medcodelearn_pipeline.run (a module level function, e.g. for tests).
+    Returns the scores in the order of the trials (None for failed trials).
+    """
+    num_workers = num_workers or os.cpu_count()
+    num_workers = max(1, min(num_workers, len(trials)))
+    num_cores = max(1, os.cpu_count() // num_workers)
+    tasks = []
+    for name, overrides in trials:
+        key, trial = trial_config(config, overrides, num_cores)
+        tasks.append((key, name, trial, run))
+    
+    if config['skip-word2vec']:
+        from embedding.embeddingstore import open_embedding_store
+        # the trials share the store, compile it (if needed) before they read it
+        open_embedding_store(config['all-vectors'], config['all-tokens'], config['embedding-store'])
+    
+    results = read_results(results_file)
+    pending = [task for task in tasks if task[0] not in results]
+    # the same trial may be listed twice
+    pending = list({task[0] : task for task in pending}.values())
+    print('Sweep: ' + str(len(tasks) - len(pending)) + ' trials finished, ' + str(len(pending)) + ' to run')
+    
+    names = {key : name for key, name, _, _ in tasks}
+    overrides_by_key = {task[0] : overrides for task, (_, overrides) in zip(tasks, trials)}
+    if len(pending) > 0:
+        # a fresh process for each trial, nothing leaks from one trial to the next. The workers are
+        # not daemonic (unlike multiprocessing.Pool), so a trial with num-cores > 1 can start its own pool.
+        with ProcessPoolExecutor(min(num_workers, len(pending)), max_tasks_per_child=1) as executor, open(results_file, 'a') as out_file:
+            for future in as_completed([executor.submit(run_trial, task) for task in pending]):
+                key, score, error = future.result()
+                if error != None:
+                    print('Trial ' + names[key] + ' failed:\n' + error)
+                    continue
+                results[key] = {'key' : key, 'name' : names[key], 'overrides' : overrides_by_key[key], 'score' : score}
+                print(json.dumps(results[key], sort_keys=True), file=out_file, flush=True)
+                print('Trial ' + names[key] + ': ' + str(score))
+    
+    return [results[key]['score'] if key in results else None for key, _, _, _ in tasks]
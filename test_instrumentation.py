@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import unittest
+import json
+import os
+import tempfile
+import instrumentation
+from instrumentation import span, current_span, traced, start_tracer
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp() + '/'
+        self.config = {'base_folder' : self.folder, 'trace' : True, 'profile' : False, 'trace-memory' : False}
+        
+    def test_nested_spans(self):
+        @traced('test')
+        def run(config):
+            with span('read') as read_span:
+                read_span.set('instances', 3)
+                current_span().count('rows-parsed', 2)
+                current_span().count('rows-parsed', 2)
+            with span('train'):
+                raise ValueError('fails')
+        
+        with self.assertRaises(ValueError):
+            run(self.config)
+        trace = json.load(open(self.folder + 'trace_test.json'))['trace']
+        self.assertEqual(trace['name'], 'test')
+        self.assertListEqual([child['name'] for child in trace['children']], ['read', 'train'])
+        read = trace['children'][0]
+        self.assertDictEqual(read['counts'], {'instances' : 3, 'rows-parsed' : 4})
+        self.assertGreaterEqual(read['wall-seconds'], 0)
+        self.assertGreaterEqual(trace['wall-seconds'], read['wall-seconds'])
+        
+    def test_profile_and_memory(self):
+        self.config.update({'profile' : True, 'trace-memory' : True})
+        
+        @traced('test')
+        def run(config):
+            with span('allocate'):
+                return [0] * 100000
+        
+        run(self.config)
+        self.assertTrue(os.path.exists(self.folder + 'profile_test.prof'))
+        trace = json.load(open(self.folder + 'trace_test.json'))
+        self.assertIn('traced-peak-bytes', trace['trace']['children'][0])
+        self.assertGreater(len(trace['top-allocations']), 0)
+        self.assertIs(instrumentation.current_span(), instrumentation.tracer.root)
+
+    def test_tracer_without_config(self):
+        tracer = start_tracer('search', self.folder + 'trace_search.json')
+        with span('load') as load_span:
+            load_span.set('rows-parsed', 2)
+        trace = tracer.finish()
+        self.assertGreaterEqual(load_span.wall, 0)
+        self.assertDictEqual(json.load(open(self.folder + 'trace_search.json')), json.loads(json.dumps(trace)))
+        self.assertEqual(trace['trace']['children'][0]['counts']['rows-parsed'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import unittest
+import tempfile
+import os
+from stagecache import StageCache
+
+class TestStageCache(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cache = StageCache(os.path.join(self.folder, 'cache'))
+        self.input_file = os.path.join(self.folder, 'input.csv')
+        self.output_file = os.path.join(self.folder, 'out', 'output.csv')
+        self.write(self.input_file, 'a;b\n')
+        self.config = {'maxlen' : 32, 'optimizer' : 'adam'}
+        
+    def write(self, filename, text):
+        with open(filename, 'w') as out_file:
+            out_file.write(text)
+            
+    def read(self, filename):
+        with open(filename, 'r') as in_file:
+            return in_file.read()
+        
+    def key(self, cache=None):
+        return (cache or self.cache).key('stage', self.config, ['maxlen'], [self.input_file], ['pdx'])
+        
+    def test_key(self):
+        key = self.key()
+        self.assertEqual(self.key(), key)
+        self.config['optimizer'] = 'sgd'
+        self.assertEqual(self.key(), key)
+        self.assertNotEqual(self.cache.key('other', self.config, ['maxlen'], [self.input_file], ['pdx']), key)
+        self.assertNotEqual(self.cache.key('stage', self.config, ['maxlen'], [self.input_file], ['sdx']), key)
+        self.config['maxlen'] = 64
+        self.assertNotEqual(self.key(), key)
+        self.config['maxlen'] = 32
+        # the file content counts, not the path or modification time
+        self.write(self.input_file, 'a;c\n')
+        self.assertNotEqual(self.key(StageCache(self.cache.folder)), key)
+        self.write(self.input_file, 'a;b\n')
+        self.assertEqual(self.key(StageCache(self.cache.folder)), key)
+        
+    def test_run(self):
+        calls = []
+        def stage():
+            calls.append(1)
+            os.makedirs(os.path.dirname(self.output_file), exist_ok=True)
+            self.write(self.output_file, 'result ' + str(len(calls)))
+        
+        key = self.key()
+        self.assertFalse(self.cache.run('stage', key, [self.output_file], stage))
+        os.remove(self.output_file)
+        self.assertTrue(self.cache.run('stage', key, [self.output_file], stage))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.read(self.output_file), 'result 1')
+        
+        disabled = StageCache(self.cache.folder, enabled=False)
+        self.assertFalse(disabled.run('stage', key, [self.output_file], stage))
+        self.assertEqual(len(calls), 2)
+        
+    def test_load_and_save(self):
+        key = self.key()
+        self.assertIsNone(self.cache.load('model', key))
+        self.cache.save('model', key, {'score' : 0.5, 'classes' : ['A00', 'D40']})
+        self.assertDictEqual(self.cache.load('model', key), {'score' : 0.5, 'classes' : ['A00', 'D40']})
+        self.assertIsNone(StageCache(self.cache.folder, enabled=False).load('model', key))
+        
+    def test_commit_twice(self):
+        key = self.key()
+        self.cache.save('model', key, {'score' : 0.5})
+        self.cache.save('model', key, {'score' : 0.75})
+        self.assertDictEqual(self.cache.load('model', key), {'score' : 0.75})
+        self.assertListEqual(os.listdir(os.path.join(self.cache.folder, 'model')), [key])
+        
+    def test_failed_write(self):
+        key = self.key()
+        # left behind by a crashed run with the same process id
+        os.makedirs(self.cache.path('model', key) + '.tmp' + str(os.getpid()))
+        def write(folder):
+            raise IOError('disk full')
+        with self.assertRaises(IOError):
+            self.cache.commit('model', key, write)
+        self.assertListEqual(os.listdir(os.path.join(self.cache.folder, 'model')), [])
+        self.cache.save('model', key, {'score' : 0.5})
+        self.assertDictEqual(self.cache.load('model', key), {'score' : 0.5})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import unittest
+import tempfile
+import os
+from unittest import mock
+from multiprocessing import Pool
+from sweep import trial_config, run_sweep
+
+def pooled_trial(config):
+    """ a trial that starts its own pool like tokenization and the word2vec corpus do """
+    with Pool(config['num-cores']) as pool:
+        return sum(pool.map(abs, [-config['num-cores'], config['weight']]))
+
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        self.config = {'base_folder' : 'data/los-prediction/', 'skip-word2vec' : False, 'optimizer' : 'adam',
+                       'all-vectors' : 'data/pipelinetest/vectorization/vectors.csv',
+                       'embedding-store' : 'data/pipelinetest/vectorization/store/',
+                       'code-tokens' : 'data/los-prediction/tokens_by_code.json',
+                       'stem-cache' : 'data/los-prediction/stem_cache.json',
+                       'training-set' : 'data/2015/trainingData2015_20151001.csv.small'}
+        
+    def test_outputs_per_trial(self):
+        key, trial = trial_config(self.config, {'optimizer' : 'sgd'}, 2)
+        other_key, other = trial_config(self.config, {'optimizer' : 'rmsprop'}, 2)
+        self.assertNotEqual(key, other_key)
+        folder = 'data/los-prediction/trials/' + key + '/'
+        self.assertEqual(trial['base_folder'], folder)
+        self.assertEqual(trial['code-tokens'], folder + 'tokens_by_code.json')
+        self.assertEqual(trial['all-vectors'], folder + 'external/data/pipelinetest/vectorization/vectors.csv')
+        self.assertEqual(trial['embedding-store'], folder + 'external/data/pipelinetest/vectorization/store/')
+        self.assertEqual(trial['stem-cache'], self.config['stem-cache'])
+        self.assertEqual(trial['training-set'], self.config['training-set'])
+        self.assertEqual(trial['num-cores'], 2)
+        for k in ['all-vectors', 'embedding-store', 'code-tokens']:
+            self.assertNotEqual(trial[k], other[k])
+        
+    def test_shared_word2vec_inputs(self):
+        self.config['skip-word2vec'] = True
+        _, trial = trial_config(self.config, {'optimizer' : 'sgd'}, 2)
+        self.assertEqual(trial['all-vectors'], self.config['all-vectors'])
+        self.assertEqual(trial['embedding-store'], self.config['embedding-store'])
+
+    def test_trial_with_own_pool(self):
+        self.config['base_folder'] = tempfile.mkdtemp() + '/'
+        results_file = self.config['base_folder'] + 'results.jsonl'
+        trials = [('one', {'weight' : 1}), ('two', {'weight' : 2})]
+        with mock.patch('sweep.os.cpu_count', return_value=4):
+            scores = run_sweep(self.config, trials, results_file, num_workers=2, run=pooled_trial)
+        self.assertListEqual(scores, [3, 4])
+        # finished trials are not run again
+        self.assertListEqual(run_sweep(self.config, trials, results_file, num_workers=2, run=None), [3, 4])
+        self.assertTrue(os.path.exists(self.config['base_folder'] + 'trials/'))
+
+if __name__ == '__main__':
+    unittest.main()
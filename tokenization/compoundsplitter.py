@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import csv
+import os
+import tempfile
+from subprocess import check_output
+
+JWORDSPLITTER_JAR = 'java/lib/jwordsplitter-4.1.jar'
+
+class CompoundSplitter:
+    """
+    Splits German compound words with jwordsplitter (Java). All words that have not
+    been split before are passed to one JVM at once (unique temporary files, so
+    several splitters can run concurrently) and the parts are memoized per word.
+    """
+    def __init__(self, jar=JWORDSPLITTER_JAR):
+        self.jar = jar
+        self.parts_by_word = {}
+        
+    def prepare(self, words):
+        """ splits all given words that are not cached yet in one batch """
+        missing = sorted(set([word for word in words if word != '' and word not in self.parts_by_word]))
+        if len(missing) == 0:
+            return
+        handle, filename = tempfile.mkstemp(prefix='compound_words', suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'w', encoding='utf-8') as file:
+                for word in missing:
+                    file.write("%s\n" % word)
+            output = check_output(["java", "-Dfile.encoding=UTF-8", "-jar", self.jar, filename]).decode('utf-8')
+        finally:
+            os.remove(filename)
+        lines = output.splitlines()
+        if len(lines) != len(missing):
+            raise ValueError('jwordsplitter returned ' + str(len(lines)) + ' lines for ' + str(len(missing)) + ' words')
+        for word, row in zip(missing, csv.reader(lines, delimiter=',')):
+            self.parts_by_word[word] = [part.strip() for part in row if part.strip() != '']
+            
+    def split(self, words):
+        self.prepare(words)
+        split_words = []
+        for word in words:
+            # empty words have no parts
+            split_words.extend(self.parts_by_word.get(word, []))
+        return split_words
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+class StemCache:
+    """
+    word -> stem for each language, persisted as JSON between runs so
+    that re-tokenizing a catalog only stems words that have not been seen before.
+    """
+    def __init__(self, stems_by_language=None):
+        self.stems_by_language = stems_by_language if stems_by_language != None else {}
+        
+    def stems(self, language):
+        if language not in self.stems_by_language:
+            self.stems_by_language[language] = {}
+        return self.stems_by_language[language]
+    
+    def update(self, language, new_stems):
+        self.stems(language).update(new_stems)
+    
+    @classmethod
+    def load(cls, filename):
+        if not os.path.exists(filename):
+            return cls()
+        with open(filename, 'r', encoding='utf-8') as in_file:
+            return cls(json.load(in_file))
+        
+    def save(self, filename):
+        # write to a temporary file of this process first, so an interrupted run does not leave
+        # a broken cache and processes sharing the cache (e.g. the trials of a sweep) never mix their writes
+        temp_file = filename + '.tmp' + str(os.getpid())
+        with open(temp_file, 'w', encoding='utf-8') as out_file:
+            json.dump(self.stems_by_language, out_file, ensure_ascii=False, sort_keys=True)
+        os.replace(temp_file, filename)
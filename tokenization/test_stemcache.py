@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+import unittest
+import tempfile
+import os
+from tokenization.stemcache import StemCache
+
+class TestStemCache(unittest.TestCase):
+    def test_save_and_load(self):
+        filename = os.path.join(tempfile.mkdtemp(), 'stem_cache.json')
+        self.assertDictEqual(StemCache.load(filename).stems_by_language, {})
+        cache = StemCache()
+        cache.update('german', {'Krankheiten' : 'krankheit', 'Füße' : 'fuss'})
+        cache.stems('french')['maladies'] = 'malad'
+        cache.save(filename)
+        
+        loaded = StemCache.load(filename)
+        self.assertDictEqual(loaded.stems_by_language, cache.stems_by_language)
+        self.assertEqual(loaded.stems('german')['Füße'], 'fuss')
+        self.assertDictEqual(loaded.stems('italian'), {})
+        self.assertListEqual(os.listdir(os.path.dirname(filename)), ['stem_cache.json'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import unittest
+try:
+    # the tokenizers need nltk and textblob
+    from tokenization.tokenize_codes import chunk_records, tokenize_chunks
+except ImportError:
+    tokenize_chunks = None
+from tokenization.stemcache import StemCache
+
+RECORDS = [{'code' : 'A0' + str(i), 'text_fr' : text_fr, 'text_it' : text_it} for i, (text_fr, text_it) in 
+           enumerate([('Maladies infectieuses intestinales', 'Malattie infettive intestinali'),
+                      ('Choléra', 'Colera'),
+                      ('Fièvres typhoïde et paratyphoïde', 'Febbri tifoide e paratifoide'),
+                      ('Autres infections intestinales à Salmonella', 'Altre infezioni da Salmonella'),
+                      ('Maladies intestinales', 'Malattie intestinali')])]
+
+@unittest.skipIf(tokenize_chunks == None, 'nltk or textblob is not installed')
+class TestTokenizeCodes(unittest.TestCase):
+    def tokenize(self, num_cores):
+        config = {'num-cores' : num_cores, 'use-descriptions' : True, 'use-textblob-de' : False, 
+                  'tokenizer-german-split-compound-words' : False, 'only-fr-descriptions' : False, 
+                  'only-it-descriptions' : False, 'only-de-fr-descriptions' : False, 'only-de-it-descriptions' : False,
+                  'only-fr-it-descriptions' : True, 'only-de-fr-it-descriptions' : False}
+        stem_cache = StemCache()
+        results = tokenize_chunks(config, chunk_records('ICD', RECORDS, chunk_size=2), stem_cache, set(['et', 'e']))
+        for _, new_stems in results:
+            for language, stems in new_stems.items():
+                stem_cache.update(language, stems)
+        return [record for tokenized_chunk, _ in results for record in tokenized_chunk], stem_cache
+        
+    def test_pool_as_single_process(self):
+        tokenized, stem_cache = self.tokenize(1)
+        pool_tokenized, pool_stem_cache = self.tokenize(3)
+        self.assertListEqual(pool_tokenized, tokenized)
+        for language in ['french', 'italian']:
+            self.assertGreater(len(stem_cache.stems(language)), 0)
+            self.assertDictEqual(pool_stem_cache.stems(language), stem_cache.stems(language))
+        self.assertEqual(len(tokenized), len(RECORDS))
+        self.assertListEqual(tokenized[1][:2], ['ICD_A01', 'ICD_A0'])
+        self.assertNotIn('et', tokenized[2])
+
+if __name__ == '__main__':
+    unittest.main()
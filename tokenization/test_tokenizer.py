@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import unittest
+from unittest import mock
+try:
+    # the tokenizers need nltk and textblob
+    from tokenization.tokenizer import SimpleGermanTokenizer
+    from tokenization.tokenize_codes import tokenize_records, tokenize_code
+except ImportError:
+    SimpleGermanTokenizer = None
+
+def fake_jwordsplitter(args):
+    """ splits after 'haus' and before 'abteilung', one line of comma separated parts per word """
+    with open(args[-1], 'r', encoding='utf-8') as in_file:
+        words = [line.rstrip('\n') for line in in_file]
+    lines = [word.replace('haus', 'haus,').replace('abteilung', ',abteilung').strip(',') for word in words]
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+RECORDS = [{'code' : 'A00', 'text_de' : 'Krankenhausabteilung für Kinder'},
+           {'code' : 'A01', 'text_de' : 'Kinderkrankenhaus, Abteilung'},
+           {'code' : 'B02', 'text_de' : 'Krankenhausabteilung'}]
+
+@unittest.skipIf(SimpleGermanTokenizer == None, 'nltk or textblob is not installed')
+class TestSimpleGermanTokenizer(unittest.TestCase):
+    def tokenize(self, do_split_compound_words, batched):
+        tokenizer = SimpleGermanTokenizer(do_split_compound_words)
+        with mock.patch('tokenization.compoundsplitter.check_output', side_effect=fake_jwordsplitter) as jar:
+            if batched:
+                tokenized = tokenize_records(RECORDS, {'text_de' : tokenizer}, 'code', ['text_de'], 'ICD')
+            else:
+                # one row at a time, each with a new tokenizer (as before the batching)
+                tokenized = [tokenize_code(record['code'], 'ICD') + SimpleGermanTokenizer(do_split_compound_words).tokenize(record['text_de']) 
+                             for record in RECORDS]
+            return tokenized, jar.call_count
+        
+    def test_batched_as_per_row(self):
+        for do_split_compound_words in [False, True]:
+            batched, batched_calls = self.tokenize(do_split_compound_words, True)
+            per_row, per_row_calls = self.tokenize(do_split_compound_words, False)
+            self.assertListEqual(batched, per_row)
+            self.assertEqual(batched_calls, 2 if do_split_compound_words else 1)
+            self.assertGreater(per_row_calls, batched_calls)
+        
+    def test_always_splits_once(self):
+        tokenizer = SimpleGermanTokenizer(False)
+        with mock.patch('tokenization.compoundsplitter.check_output', side_effect=fake_jwordsplitter):
+            self.assertListEqual(tokenizer.tokenize('Krankenhausabteilung'), tokenizer.stem_words(['Krankenhaus', 'abteilung']))
+
+if __name__ == '__main__':
+    unittest.main()
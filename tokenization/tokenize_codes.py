@@ -4,82 +4,146 @@ from tokenization.tokenizer import SimpleGermanTokenizer
 from tokenization.tokenizer import SimpleFrenchTokenizer
 from tokenization.tokenizer import SimpleItalianTokenizer
 from tokenization.tokenizer import TextBlobDeTokenizer
+from tokenization.stemcache import StemCache
 from nltk.corpus import stopwords
+from multiprocessing import Pool
 
 import re
 
+# number of catalog records tokenized by one worker task
+CHUNK_SIZE = 2000
+
 def tokenize_code(code, prefix):
     code = re.sub(r'[^\w\s]','',code)
     return [prefix + '_' + code[0:x] for x in reversed(range(1,len(code)+1))]
 
-def tokenize_and_output(csv_filename, tokenizers_by_key_of_description, output_filename, key_of_code,
-                         keys_of_descriptions, vocab, delimiter, code_prefix,
-                          use_descriptions=True, stop_words=None):
-    reader = CSVReader(csv_filename, delimiter)
-    dataset = reader.read_from_file()
-    try:
-        #os.remove(output_filename)
-        pass
-    except OSError:
-        pass  
+def tokenize_records(records, tokenizers_by_key_of_description, key_of_code,
+                     keys_of_descriptions, code_prefix,
+                     use_descriptions=True, stop_words=None):
+    if use_descriptions:
+        for key_of_description in keys_of_descriptions:
+            tokenizer = tokenizers_by_key_of_description[key_of_description]
+            # e.g. split the compound words of all records in one batch
+            if hasattr(tokenizer, 'prepare'):
+                tokenizer.prepare([record[key_of_description] for record in records])
     
+    tokenized_records = []
+    for record in records:
+        tokenized_record = []
+        if use_descriptions:
+            for key_of_description in keys_of_descriptions:
+                tokenizer = tokenizers_by_key_of_description[key_of_description]
+                tokenized_record.extend(tokenizer.tokenize(record[key_of_description]))
+        if stop_words != None:
+            tokenized_record = [w for w in tokenized_record if w.lower() not in stop_words]
+
+        tokenized_record = tokenize_code(record[key_of_code], code_prefix) + tokenized_record
+        tokenized_records.append(tokenized_record)
+    return tokenized_records
+
+def output_tokenized_records(tokenized_records, output_filename, vocab):
     with open(output_filename, 'w+') as out_file:
-        for record in dataset:
-            tokenized_record = []
-            if use_descriptions:
-                for key_of_description in keys_of_descriptions:
-                    tokenizer = tokenizers_by_key_of_description[key_of_description]    
-                    tokenized_record.extend(tokenizer.tokenize(record[key_of_description])) 
-            if stop_words != None:
-                tokenized_record = [w for w in tokenized_record if w.lower() not in stop_words]
-                
-            tokenized_record = tokenize_code(record[key_of_code], code_prefix) + tokenized_record 
-            output_line = " ".join(tokenized_record)
+        for tokenized_record in tokenized_records:
             vocab.update(tokenized_record)
-            print(output_line, file=out_file) 
-            #print(output_line)
-    
-    
+            print(" ".join(tokenized_record), file=out_file)
+
 def combine_files(files, big_file):
     with open(big_file, 'w+') as big_file:
         for file_name in files:
             big_file.write(open(file_name).read())
-            
+
 def output_vocab(vocab_filename, vocab):
     with open(vocab_filename, 'w+') as out_file:
         for word in vocab:
             print(word, file=out_file)
-    
-def tokenize_catalogs(config):
-    keys_of_descriptions = []
-    tokenizers_by_key_of_description = {'text_de': TextBlobDeTokenizer() if config['use-textblob-de'] else SimpleGermanTokenizer(config['tokenizer-german-split-compound-words']), 'text_fr': SimpleFrenchTokenizer(), 'text_it': SimpleItalianTokenizer()}
+
+def get_keys_of_descriptions(config):
     if config["only-fr-descriptions"]:
-        keys_of_descriptions = ['text_fr']
+        return ['text_fr']
     elif config["only-it-descriptions"]:
-        keys_of_descriptions = ['text_it']
+        return ['text_it']
     elif config["only-de-fr-descriptions"]:
-        keys_of_descriptions = ['text_de', 'text_fr']
+        return ['text_de', 'text_fr']
     elif config["only-de-it-descriptions"]:
-        keys_of_descriptions = ['text_de', 'text_it']
+        return ['text_de', 'text_it']
     elif config["only-fr-it-descriptions"]:
-        keys_of_descriptions = ['text_fr', 'text_it']
+        return ['text_fr', 'text_it']
     elif config["only-de-fr-it-descriptions"]:
-        keys_of_descriptions = ['text_de', 'text_fr', 'text_it']
-    else:
-        keys_of_descriptions = ['text_de']
-        
-    vocab = set()
+        return ['text_de', 'text_fr', 'text_it']
+    return ['text_de']
+
+def create_tokenizers(config, stem_cache):
+    return {'text_de': TextBlobDeTokenizer() if config['use-textblob-de'] else SimpleGermanTokenizer(config['tokenizer-german-split-compound-words'], stem_cache.stems('german')),
+            'text_fr': SimpleFrenchTokenizer(stem_cache.stems('french')),
+            'text_it': SimpleItalianTokenizer(stem_cache.stems('italian'))}
+
+# state of a tokenization worker process (see init_worker)
+worker = {}
+
+def init_worker(config, stem_cache, stop_words):
+    worker['config'] = config
+    worker['tokenizers'] = create_tokenizers(config, stem_cache)
+    worker['keys_of_descriptions'] = get_keys_of_descriptions(config)
+    worker['stop_words'] = stop_words
+
+def tokenize_chunk(task):
+    """
+    Tokenizes one chunk of catalog records in a worker.
+    Returns the tokenized records and the stems that were not in the cache yet.
+    """
+    code_prefix, records = task
+    tokenized_records = tokenize_records(records, worker['tokenizers'], 'code', worker['keys_of_descriptions'],
+                                         code_prefix, worker['config']['use-descriptions'], worker['stop_words'])
+    new_stems = {}
+    for tokenizer in worker['tokenizers'].values():
+        if getattr(tokenizer, 'new_stems', None):
+            new_stems[tokenizer.language] = tokenizer.new_stems
+            tokenizer.new_stems = {}
+    return tokenized_records, new_stems
+
+def chunk_records(code_prefix, records, chunk_size=CHUNK_SIZE):
+    return [(code_prefix, records[i:i + chunk_size]) for i in range(0, len(records), chunk_size)]
+
+def tokenize_chunks(config, tasks, stem_cache, stop_words):
+    """ (tokenized records, new stems) of each chunk (see tokenize_chunk) """
+    # all catalogs and chunks are tokenized in parallel, each worker has its own tokenizers and stemmers
+    num_workers = min(config['num-cores'], len(tasks))
+    if num_workers > 1:
+        with Pool(num_workers, initializer=init_worker, initargs=(config, stem_cache, stop_words)) as pool:
+            return pool.map(tokenize_chunk, tasks)
+    init_worker(config, stem_cache, stop_words)
+    return [tokenize_chunk(task) for task in tasks]
+
+def tokenize_catalogs(config):
+    stem_cache = StemCache.load(config['stem-cache'])
     # You have to install the stopwords corpus by executing nltk.download()
     # and install Corpora -> stopwords
-    stop_words = stopwords.words('german')
-    tokenize_and_output(config['drg-catalog'], tokenizers_by_key_of_description, config['drg-tokenizations'],
-                         'code', keys_of_descriptions, vocab, ',', 'DRG',
-                          config['use-descriptions'], stop_words)
-    tokenize_and_output(config['chop-catalog'], tokenizers_by_key_of_description, config['chop-tokenizations'], 
-                        'code', keys_of_descriptions, vocab, ',', 'CHOP',
-                         config['use-descriptions'], stop_words)
-    tokenize_and_output(config['icd-catalog'], tokenizers_by_key_of_description, config['icd-tokenizations'], 
-                        'code', keys_of_descriptions, vocab, ',', 
-                        'ICD', config['use-descriptions'], stop_words)
+    stop_words = set(stopwords.words('german'))
+
+    catalogs = [(config['drg-catalog'], config['drg-tokenizations'], 'DRG'),
+                (config['chop-catalog'], config['chop-tokenizations'], 'CHOP'),
+                (config['icd-catalog'], config['icd-tokenizations'], 'ICD')]
+    tasks = []
+    chunks_by_catalog = []
+    for catalog, _, code_prefix in catalogs:
+        dataset = CSVReader(catalog, ',').read_from_file()
+        chunks = chunk_records(code_prefix, dataset)
+        chunks_by_catalog.append(len(chunks))
+        tasks.extend(chunks)
+
+    results = tokenize_chunks(config, tasks, stem_cache, stop_words)
+
+    vocab = set()
+    start = 0
+    for (_, output_filename, _), num_chunks in zip(catalogs, chunks_by_catalog):
+        tokenized_records = []
+        for tokenized_chunk, new_stems in results[start:start + num_chunks]:
+            tokenized_records.extend(tokenized_chunk)
+            for language, stems in new_stems.items():
+                stem_cache.update(language, stems)
+        output_tokenized_records(tokenized_records, output_filename, vocab)
+        start += num_chunks
+
     combine_files([config['drg-tokenizations'], config['chop-tokenizations'], config['icd-tokenizations']],  config['all-tokens'])
     output_vocab(config['all-vocab'], vocab)
+    stem_cache.save(config['stem-cache'])
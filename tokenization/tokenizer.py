@@ -6,57 +6,65 @@ from nltk.stem.snowball import ItalianStemmer
 from textblob_de.lemmatizers import PatternParserLemmatizer
 from textblob import TextBlob
 import textblob_fr
-import os
-import csv
+from tokenization.compoundsplitter import CompoundSplitter, JWORDSPLITTER_JAR
 
 class SimpleTokenizer():
+    language = None
+    stemmer_class = None
+    
+    def __init__(self, stems=None):
+        # one stemmer per tokenizer and a word -> stem cache (see tokenization.stemcache)
+        self.stemmer = self.stemmer_class()
+        self.stems = stems if stems != None else {}
+        self.new_stems = {}
+        
     def split_to_words(self, s, delimiter=' '):
         s = re.sub(r'[^\w\s]','',s)
         return s.split(delimiter)
+    
+    def stem_words(self, words):
+        stemmed_words = []        
+        for word in words:
+            stem = self.stems.get(word)
+            if stem == None:
+                stem = self.stemmer.stem(word)
+                self.stems[word] = stem
+                self.new_stems[word] = stem
+            stemmed_words.append(stem)
+        return stemmed_words
 
 class SimpleGermanTokenizer(SimpleTokenizer):
-    def __init__(self, do_split_compound_words=False):
-        super()
+    language = 'german'
+    stemmer_class = GermanStemmer
+    
+    def __init__(self, do_split_compound_words=False, stems=None):
+        super().__init__(stems)
         self.do_split_compound_words = do_split_compound_words
-# Hack (Using a Java library). This is only a prototype. Should choose one language later.    
+        self.compound_splitter = CompoundSplitter()
+    
     def split_compound_words(self, words, basepath=''): 
-        try:
-            os.remove('/tmp/compound_words.tmp')
-            os.remove('/tmp/split_compound_words.tmp')
-        except OSError:
-            pass        
-        with open('/tmp/compound_words.tmp', 'w') as file:        
-            for word in words:
-                file.write("%s\n" % word)        
-        os.system("java -jar "+basepath+"java/lib/jwordsplitter-4.1.jar /tmp/compound_words.tmp > /tmp/split_compound_words.tmp")
-        split_compound_words = []        
-        with open('/tmp/split_compound_words.tmp', 'r') as csvFile:
-            reader = csv.reader(csvFile, delimiter=',')
-            for row in reader:
-                split_compound_words += row
-        try:
-            os.remove('/tmp/compound_words.tmp')
-            os.remove('/tmp/split_compound_words.tmp')
-        except OSError:
-            pass  
-        return split_compound_words
+        if basepath != '' and self.compound_splitter.jar != basepath + JWORDSPLITTER_JAR:
+            self.compound_splitter = CompoundSplitter(basepath + JWORDSPLITTER_JAR)
+        return self.compound_splitter.split(words)
+    
+    def prepare(self, texts):
+        """ splits the compound words of all texts at once (and their parts again if set), e.g. of a whole catalog """
+        words = []
+        for s in texts:
+            words.extend(self.split_to_words(s))
+        self.compound_splitter.prepare(words)
+        if self.do_split_compound_words:
+            self.compound_splitter.prepare(self.compound_splitter.split(words))
     
     def tokenize(self, s):
         words = self.split_to_words(s)
         words = self.split_compound_words(words)
         if self.do_split_compound_words:
-            words  = self.split_compound_words(words) 
+            words = self.split_compound_words(words) 
     
         stemmed_words = self.stem_words(words)
         
         return stemmed_words
-        
-    def stem_words(self, words):
-        stemmer = GermanStemmer()
-        stemmed_words = []        
-        for word in words:
-            stemmed_words.append(stemmer.stem(word))
-        return stemmed_words
 
 class TextBlobDeTokenizer():
     def __init__(self):
@@ -66,12 +74,8 @@ class TextBlobDeTokenizer():
         return [lemma[0] for lemma in self.lemmatizer.lemmatize(s)]    
     
 class SimpleFrenchTokenizer(SimpleTokenizer):
-        def stem_words(self, words):
-            stemmer = FrenchStemmer()
-            stemmed_words = []        
-            for word in words:
-                stemmed_words.append(stemmer.stem(word))
-            return stemmed_words
+        language = 'french'
+        stemmer_class = FrenchStemmer
         
         def tokenize(self, s):
             words = self.split_to_words(s)
@@ -79,12 +83,8 @@ class SimpleFrenchTokenizer(SimpleTokenizer):
             return stemmed_words
     
 class SimpleItalianTokenizer(SimpleTokenizer):
-        def stem_words(self, words):
-            stemmer = ItalianStemmer()
-            stemmed_words = []        
-            for word in words:
-                stemmed_words.append(stemmer.stem(word))
-            return stemmed_words
+        language = 'italian'
+        stemmer_class = ItalianStemmer
         
         def tokenize(self, s):
             words = self.split_to_words(s)
@@ -1,4 +1,4 @@
-from medcodelearn_pipeline import run
+from sweep import run_sweep
 import json
 import os
 import numpy as np
@@ -8,14 +8,22 @@ import matplotlib.pyplot as plt
 from load_config import load_config
 
 
-def validate_bool_var(bool_var, scores, options, baseline):
-    temp = config[bool_var]
-    config[bool_var] = not temp
-    score = run(config)
-    config[bool_var] = temp
-    diff = (baseline - score) if temp else (score - baseline)
-    scores.append(diff)
-    options.append(bool_var)
+def validate_bool_vars(bool_vars):
+    # the baseline and each toggled option run in parallel (see sweep.run_sweep)
+    trials = [('baseline', {})] + [(bool_var, {bool_var : not config[bool_var]}) for bool_var in bool_vars]
+    results = run_sweep(config, trials, base_folder + 'validate_options.jsonl')
+    baseline = results[0]
+    if baseline == None:
+        print('The baseline failed.')
+        return
+    scores = []
+    options = []
+    for bool_var, score in zip(bool_vars, results[1:]):
+        if score == None:
+            continue
+        diff = (baseline - score) if config[bool_var] else (score - baseline)
+        scores.append(diff)
+        options.append(bool_var)
     visualize(scores, options)
 
 def visualize(scores, options):
@@ -43,11 +51,6 @@ if __name__ == '__main__':
     
     json.dump(config, open(base_folder + 'configuration.json','w'), indent=4, sort_keys=True)    
     
-    scores = []
-    options = []
-    
-    baseline = run(config)
-    
 #     inits = ['zero', 'glorot_uniform', 'glorot_normal', 'he_normal', 'he_uniform', 'uniform', 'lecun_uniform', 'normal', ]
 #     init_inner = ['identity', 'orthogonal']
 #     activations = ['linear', 'tanh', 'sigmoid', 'hard_sigmoid', 'relu', 'softplus']
@@ -59,8 +62,7 @@ if __name__ == '__main__':
 #         options.append('lstm-activation-' + activation)
 #         visualize(scores, options)
         
-    for bool_var in ['tokenizer-german-split-compound-words', 'use-textblob-de', "only-fr-descriptions", "only-it-descriptions", "only-de-fr-descriptions", "only-de-it-descriptions", "only-fr-it-descriptions", "only-de-fr-it-descriptions"]: 
-        validate_bool_var(bool_var, scores, options, baseline)
+    validate_bool_vars(['tokenizer-german-split-compound-words', 'use-textblob-de', "only-fr-descriptions", "only-it-descriptions", "only-de-fr-descriptions", "only-de-it-descriptions", "only-fr-it-descriptions", "only-de-fr-it-descriptions"])
         
     
     
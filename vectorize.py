@@ -1,9 +1,15 @@
 # -*- coding: utf-8 -*-
 import numpy as np
 from numpy import linalg as LA
+from scipy import sparse
+from itertools import chain
 from reader.sparsehierarchical.drgreader import DRGReader
 import csv
-import random
+import os
+import shutil
+from multiprocessing import Pool
+from reader.vocabulary import Vocabulary
+from reader.demographics import DemographicColumns, DEMOGRAPHIC_COLUMNS
 
 def read_vectors(fname, vocabUnicodeSize=78, desired_vocab=None, encoding="utf-8"):
     """
@@ -34,6 +40,43 @@ def unitvec(vec):
     norm = LA.norm(vec, ord=2)
     return vec if norm == 0 else (1.0 / norm) * vec
 
+def unitvecs(matrix):
+    """ unitvec for each row of the matrix """
+    norms = LA.norm(matrix, ord=2, axis=1)
+    norms[norms == 0] = 1.0
+    return matrix / norms[:, np.newaxis]
+
+def summed_code_vectors(vectors_by_code):
+    """
+    Returns a dict code -> row and a float32 matrix with the (unnormalized) sum 
+    of all token vectors of each code. Uses the precomputed sums if vectors_by_code
+    is a view on an embedding store.
+    """
+    if hasattr(vectors_by_code, 'code_sums'):
+        return vectors_by_code.code_index, vectors_by_code.code_sums
+    code_index = {}
+    code_sums = None
+    for i, (code, vectors) in enumerate(vectors_by_code.items()):
+        if code_sums is None:
+            code_sums = np.zeros((len(vectors_by_code), len(vectors[0])), dtype=np.float32)
+        code_index[code] = i
+        for v in vectors:
+            code_sums[i] += v
+    return code_index, code_sums
+
+def sum_code_vectors(code_sums, code_ids):
+    """ 
+    Sums the code vectors for many instances at once.
+    code_ids holds one list of code rows per instance (codes may repeat).
+    Returns a matrix with one summed vector per instance.
+    """
+    indptr = np.zeros(len(code_ids) + 1, dtype=np.int64)
+    np.cumsum([len(ids) for ids in code_ids], out=indptr[1:])
+    indices = np.fromiter(chain.from_iterable(code_ids), dtype=np.int32, count=indptr[-1])
+    selection = sparse.csr_matrix((np.ones(len(indices), dtype=np.float32), indices, indptr), 
+                                  shape=(len(code_ids), code_sums.shape[0]))
+    return np.asarray(selection.dot(code_sums), dtype=np.float32)
+
 def read_code_vectors(vector_by_token, code_token_file, encoding="utf-8"): 
     with open(code_token_file, 'rb') as fin:
         vector_by_code = {}
@@ -54,79 +97,187 @@ def read_code_vectors(vector_by_token, code_token_file, encoding="utf-8"):
             vector_by_code[ts[0]] = unitvec(v)
     return {'vectors' : vectors, 'tokens' : tokens, 'vector_by_code' : vector_by_code} 
 
-def create_word2vec_training_data(train_file, token_by_code_file, out_file_name, encoding="utf-8", do_shuffle=False, use_n_times=1, use_demographic_tokens=False):
-    tokens_by_code = {}
-    out_file = open(out_file_name, 'w')
+# number of patient cases written as one block of the word2vec corpus
+CORPUS_BLOCK_SIZE = 1000
 
+def create_word2vec_training_data(train_file, token_by_code_file, out_file_name, encoding="utf-8", do_shuffle=False, use_n_times=1, use_demographic_tokens=False,
+                                  seed=0, num_workers=1):
+    """
+    Writes the word2vec training corpus: the tokens of each code once and the tokens of the
+    codes (and demographic tokens) of each patient case use_n_times, in random order if do_shuffle.
+    The cases are mapped to item ids (codes and demographic tokens) once, the repetitions
+    are shuffled with NumPy and written in blocks. With num_workers > 1 the blocks are written
+    to shards by worker processes and concatenated. The output does not depend on num_workers,
+    the random state of each block is seeded with (seed, block number).
+    """
+    code_lines, corpus, blocks = read_corpus(train_file, token_by_code_file, encoding, do_shuffle, use_n_times, use_demographic_tokens, seed)
+    with open(out_file_name, 'w') as out_file:
+        for line in code_lines:
+            # Use each code at least once
+            out_file.write(line + "\n")
+    
+    if num_workers > 1 and len(blocks) > 1:
+        blocks = [(number, items, lengths, out_file_name + '.shard' + str(number)) for number, items, lengths, _ in blocks]
+        with Pool(min(num_workers, len(blocks)), initializer=init_corpus_worker, initargs=(corpus,)) as pool:
+            shards = pool.map(write_corpus_block, blocks)
+        with open(out_file_name, 'a') as out_file:
+            for shard in shards:
+                with open(shard, 'r') as in_file:
+                    shutil.copyfileobj(in_file, out_file, 1 << 24)
+                os.remove(shard)
+    else:
+        init_corpus_worker(corpus)
+        with open(out_file_name, 'a') as out_file:
+            for block in blocks:
+                out_file.write(write_corpus_block(block))
+
+def read_corpus(train_file, token_by_code_file, encoding="utf-8", do_shuffle=False, use_n_times=1, use_demographic_tokens=False, seed=0,
+                only_codes=None):
+    """
+    Reads the code tokenizations and the patient cases (none if train_file is None) of the corpus.
+    If only_codes is given, only the tokenizations of these codes are part of the corpus.
+    Returns the lines of the code tokenizations, the tables of the corpus (see expand_corpus_block)
+    and the blocks of cases (block number, item ids, number of items per case, shard file).
+    """
+    items = Vocabulary(reserved=[])
+    token_ids = Vocabulary(reserved=[])
+    item_tokens = []
+    code_lines = []
     with open(token_by_code_file, 'rb') as fin:
         for line in fin:
             line = line.decode(encoding).strip()
             ts = line.split(' ')
-            tokens_by_code[ts[0]] = ts
-            # Use each code at least once
-            for t in ts:
-                out_file.write(t + ' ')
-            out_file.write("\n")
+            if ts[0] not in items:
+                items.add(ts[0])
+                item_tokens.append([token_ids.add(t) for t in ts])
+            if only_codes == None or ts[0] in only_codes:
+                code_lines.append(line)
     
-    with open(train_file, 'r') as csvFile:
-        reader = csv.DictReader(csvFile, fieldnames=DRGReader.FIELDNAMES, restkey=DRGReader.RESTKEY, delimiter=';')
-        for row in reader:
-            diagproc = row[DRGReader.RESTKEY]
-            diags = [row['pdx']] + diagproc[0:DRGReader.MAX_ADDITIONAL_DIAGNOSES]
-            procs = map(lambda x: x.split(':')[0], diagproc[DRGReader.MAX_ADDITIONAL_DIAGNOSES:DRGReader.MAX_ADDITIONAL_DIAGNOSES+DRGReader.MAX_PROCEDURES])
-            procs = list(map(lambda x: 'CHOP_' + x.replace('.', '').upper(), procs))
-            diags = list(map(lambda x: 'ICD_' + x.replace('.', '').upper(), diags))
-            diagproc = diags + procs
-            diagproc = [p for p in diagproc if p in tokens_by_code]
-            alltokens = diagproc + demographic_tokens(row) if use_demographic_tokens else diagproc
-            
-            for i in range(use_n_times):
-                random.seed(i)
-                r = random.random()
-                if do_shuffle:
-                    random.shuffle(alltokens, lambda: r)
-                for d in alltokens:
-                    if d in tokens_by_code:
-                        for t in tokens_by_code[d]:
-                            out_file.write(t + ' ') 
-                    else:
-                        out_file.write(d + ' ')        
-                out_file.write("\n")
-
-    out_file.close()
-    
-
-def demographic_tokens(row, skip_exit_data=False):
-    tokens = []  
-    tokens.append('ADM_' + row['adm'])
-    tokens.append('SEX_' + row['sex'])
-    days = int(row['ageDays'])
-    if days > 0:
-        tokens.append('AGE_DAYS_' + str(days if days < 30 else days - (days % 10)))
+    lengths = []
+    case_items = []
+    if train_file != None:
+        code_ids_by_case = []
+        columns = {field : [] for field in DEMOGRAPHIC_COLUMNS}
+        with open(train_file, 'r') as csvFile:
+            reader = csv.DictReader(csvFile, fieldnames=DRGReader.FIELDNAMES, restkey=DRGReader.RESTKEY, delimiter=';')
+            for row in reader:
+                diagproc = row[DRGReader.RESTKEY]
+                diags = [row['pdx']] + diagproc[0:DRGReader.MAX_ADDITIONAL_DIAGNOSES]
+                procs = [x.split(':')[0] for x in diagproc[DRGReader.MAX_ADDITIONAL_DIAGNOSES:DRGReader.MAX_ADDITIONAL_DIAGNOSES+DRGReader.MAX_PROCEDURES]]
+                codes = ['ICD_' + x.replace('.', '').upper() for x in diags] + ['CHOP_' + x.replace('.', '').upper() for x in procs]
+                code_ids_by_case.append([items.id(code) for code in codes if code in items])
+                if use_demographic_tokens:
+                    for field in DEMOGRAPHIC_COLUMNS:
+                        columns[field].append(row[field])
         
-    years = int(row['ageYears'])
-    if years > 0:
-        tokens.append('AGE_YEARS_' + str(years))
-        tokens.append('AGE_DECADE_' + str(years - (years % 10)))
+        if use_demographic_tokens:
+            # the demographic tokens of all cases at once, they are items with themselves as the only token
+            tokens, token_ids_by_case = DemographicColumns(columns).token_ids()
+            present = token_ids_by_case.ravel()
+            present = present[present >= 0]
+            _, first = np.unique(present, return_index=True)
+            item_of_token = np.zeros(len(tokens), dtype=np.int64)
+            # items in the order the tokens appear first
+            for t in present[np.sort(first)].tolist():
+                if tokens[t] not in items:
+                    items.add(tokens[t])
+                    item_tokens.append([token_ids.add(tokens[t])])
+                item_of_token[t] = items.id(tokens[t])
+            for ids, demographic_ids in zip(code_ids_by_case, token_ids_by_case):
+                ids.extend(item_of_token[demographic_ids[demographic_ids >= 0]].tolist())
         
-    if not skip_exit_data:
-        tokens.append('SEP_' + row['sep'])
-        los = int(row['los'])
-        tokens.append('LOS_' + str(min(los, 50)))
+        for ids in code_ids_by_case:
+            case_items.extend(ids)
+            lengths.append(len(ids))
     
-    weight = int(row['admWeight'])
-    if weight > 0:
-        for t in [750, 1000, 1250, 1500, 2000, 2500, 10000]:
-            if weight < t:
-                tokens.append('WEIGHT_LT_' + str(t))
-                break
-                
-    hmv = int(row['hmv'])
-    if hmv > 0:
-        for t in [500, 480, 240, 180, 95, 60, 48, 0]:
-            if hmv >= t:
-                tokens.append('HMV_GT_' + str(t))
-                break
+    corpus = {'item_offsets' : np.concatenate([[0], np.cumsum([len(ts) for ts in item_tokens], dtype=np.int64)]),
+              'item_token_ids' : np.fromiter(chain.from_iterable(item_tokens), dtype=np.int64),
+              'words' : list(token_ids),
+              'do_shuffle' : do_shuffle, 'use_n_times' : use_n_times, 'seed' : seed}
+    case_offsets = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+    case_items = np.array(case_items, dtype=np.int64)
+    blocks = []
+    for number, start in enumerate(range(0, len(lengths), CORPUS_BLOCK_SIZE)):
+        end = min(start + CORPUS_BLOCK_SIZE, len(lengths))
+        blocks.append((number, case_items[case_offsets[start]:case_offsets[end]], np.array(lengths[start:end], dtype=np.int64), None))
+    return code_lines, corpus, blocks
+
+def expand_corpus_block(corpus, block):
+    """ 
+    The token ids of a block of patient cases (repeated and shuffled) and a boolean 
+    array that marks the last token of each sequence. Sequences without tokens are left out.
+    """
+    number, case_items, lengths, _ = block
+    n = corpus['use_n_times']
+    # the cases are repeated n times, the repetitions of a case are consecutive
+    sequence_lengths = np.repeat(lengths, n)
+    sequence_starts = np.repeat(np.cumsum(lengths) - lengths, n)
+    sequence_of_item = np.repeat(np.arange(len(sequence_lengths)), sequence_lengths)
+    item_starts = np.cumsum(sequence_lengths) - sequence_lengths
+    items = case_items[sequence_starts[sequence_of_item] + np.arange(len(sequence_of_item)) - item_starts[sequence_of_item]]
+    if corpus['do_shuffle']:
+        random_state = np.random.RandomState([corpus['seed'], number])
+        # a random permutation within each repetition
+        order = np.lexsort((random_state.random_sample(len(items)), sequence_of_item))
+        items = items[order]
+    
+    # expand the items to their tokens
+    item_offsets = corpus['item_offsets']
+    token_counts = item_offsets[items + 1] - item_offsets[items]
+    item_of_token = np.repeat(np.arange(len(items)), token_counts)
+    token_starts = np.cumsum(token_counts) - token_counts
+    tokens = corpus['item_token_ids'][item_offsets[items][item_of_token] + np.arange(len(item_of_token)) - token_starts[item_of_token]]
+    tokens_per_sequence = np.bincount(sequence_of_item[item_of_token], minlength=len(sequence_lengths))
+    end_of_line = np.zeros(len(tokens), dtype=bool)
+    end_of_line[np.cumsum(tokens_per_sequence)[tokens_per_sequence > 0] - 1] = True
+    return tokens, end_of_line
+
+# tables of the corpus in a worker process (see init_corpus_worker)
+corpus_worker = {}
+
+def init_corpus_worker(corpus):
+    corpus_worker.update(corpus)
+    # each token followed by a space and followed by the end of the line
+    corpus_worker['words_space'] = np.array([w + ' ' for w in corpus['words']], dtype=object)
+    corpus_worker['words_eol'] = np.array([w + '\n' for w in corpus['words']], dtype=object)
     
-    return tokens
+def write_corpus_block(block):
+    """ the text of a block of patient cases, written to the shard file if there is one """
+    tokens, end_of_line = expand_corpus_block(corpus_worker, block)
+    text = ''.join(np.where(end_of_line, corpus_worker['words_eol'][tokens], corpus_worker['words_space'][tokens]).tolist())
+    shard = block[3]
+    if shard == None:
+        return text
+    with open(shard, 'w') as out_file:
+        out_file.write(text)
+    return shard
+
+class Word2VecSentences:
+    """
+    The word2vec training corpus (see create_word2vec_training_data) as token lists 
+    instead of a file, e.g. for an in-process word2vec trainer. The cases are read once,
+    each iteration yields the same sentences. Empty tokens are replaced by '</s>' like 
+    the word2vec binary does.
+    """
+    def __init__(self, train_file, token_by_code_file, encoding="utf-8", do_shuffle=False, use_n_times=1, use_demographic_tokens=False, seed=0,
+                 only_codes=None):
+        code_lines, self.corpus, self.blocks = read_corpus(train_file, token_by_code_file, encoding, do_shuffle, use_n_times, use_demographic_tokens, seed,
+                                                           only_codes)
+        self.code_sentences = [['</s>' if t == '' else t for t in line.split(' ')] for line in code_lines]
+        self.words = np.array(['</s>' if w == '' else w for w in self.corpus['words']], dtype=object)
+        
+    def __iter__(self):
+        for sentence in self.code_sentences:
+            yield sentence
+        for block in self.blocks:
+            tokens, end_of_line = expand_corpus_block(self.corpus, block)
+            words = self.words[tokens].tolist()
+            start = 0
+            for end in np.flatnonzero(end_of_line).tolist():
+                yield words[start:end + 1]
+                start = end + 1
+
+def demographic_tokens(row, skip_exit_data=False):
+    """ the demographic tokens of one case, see reader.demographics.DemographicColumns.tokens for many cases """
+    return DemographicColumns.from_rows([row]).tokens(skip_exit_data)[0]
 